@@ -0,0 +1,367 @@
+#!/usr/bin/env python3
+"""Run several agent sessions at once, each in its own git worktree.
+
+Jobs are (branch, prompt) pairs read from a JSON file: a list of objects, or
+one object per line, with "branch" and "prompt" (or "prompt_file"), and
+optionally "base". Each job gets the worktree `-ai -n <branch>` would use
+(<main repo>-worktrees/<branch>), reused if it exists. Sessions run
+concurrently up to --max-concurrency. Each writes its rendered transcript
+to its own log file, and a status table shows all jobs. Tool approvals from
+every session go through one queue and are asked one at a time on this
+terminal. Run it through -ai-batch, which passes the current repo and the
+jobs file's absolute path (the tommyx runner changes directory).
+
+    -run-tommyx-python-script agent_batch.py /path/to/jobs.json --repo "$PWD" --max-concurrency 4 -e
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from typing import Optional
+
+import pydantic
+
+from tommyx.utils.ai import AgentConfig, ask_tool_approval, run_agent
+from tommyx.utils.git import get_common_dir, get_git_dir
+
+# maximum number of agent sessions running at once, controlled via command-line
+MAX_CONCURRENCY = 4
+# where per-job logs go (a timestamped directory is created inside), controlled via command-line
+LOG_DIR = os.path.expanduser("~/.cache/tommyx/agent_batch")
+
+
+class Job(pydantic.BaseModel):
+    branch: str
+    prompt: str
+    # start point for a new branch; default is main or master on the first remote that has one
+    base: Optional[str] = None
+
+
+def load_jobs(path):
+    """Read jobs from a JSON list or JSON lines; a prompt_file is read relative to the jobs file."""
+    with open(path, "r") as f:
+        text = f.read()
+    try:
+        items = json.loads(text)
+    except ValueError:
+        items = [json.loads(line) for line in text.splitlines() if line.strip()]
+    if isinstance(items, dict):
+        items = [items]
+
+    jobs = []
+    for item in items:
+        if "prompt_file" in item:
+            with open(os.path.join(os.path.dirname(os.path.abspath(path)), os.path.expanduser(item.pop("prompt_file"))), "r") as f:
+                item["prompt"] = f.read()
+        jobs.append(Job(**item))
+
+    branches = [job.branch for job in jobs]
+    duplicates = sorted({branch for branch in branches if branches.count(branch) > 1})
+    if duplicates:
+        raise ValueError(f"more than one job for branch {', '.join(duplicates)}")
+
+    return jobs
+
+
+class JobState:
+    """Progress of one job, shown in the status table."""
+
+    def __init__(self, job: Job, log_path: str):
+        self.job = job
+        self.log_path = log_path
+        self.status = "queued"
+        self.worktree = None
+        self.started_at = None
+        self.finished_at = None
+        self.tool_calls = 0
+        self.approvals = 0
+        self.activity = ""
+        self.cost = None
+        self.error = None
+
+    def elapsed(self):
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.monotonic()) - self.started_at
+
+    def on_message(self, message):
+        for block in getattr(message, "content", None) or []:
+            block_type = type(block).__name__
+            if block_type == "ToolUseBlock":
+                self.tool_calls += 1
+                self.activity = f"🔧 {getattr(block, 'name', '?')}"
+            elif block_type == "TextBlock" and getattr(block, "text", "").strip():
+                self.activity = block.text.strip().splitlines()[0]
+        if type(message).__name__ == "ResultMessage":
+            self.cost = getattr(message, "total_cost_usd", None)
+            if getattr(message, "is_error", False):
+                self.error = getattr(message, "subtype", None) or "error"
+
+
+class StatusView:
+    """Live status table of all jobs, paused while an approval is asked on the terminal.
+
+    Without a terminal, prints a line whenever a job changes status instead.
+    """
+
+    def __init__(self, states: list[JobState]):
+        from rich.console import Console
+
+        self.states = states
+        self.console = Console()
+        self.live = None
+        self.printed_status = {}
+
+    def render(self):
+        from rich.table import Table
+
+        table = Table(expand=True)
+        table.add_column("branch", no_wrap=True)
+        table.add_column("status", no_wrap=True)
+        table.add_column("time", justify="right")
+        table.add_column("tools", justify="right")
+        table.add_column("activity", overflow="ellipsis", no_wrap=True, ratio=1)
+        for state in self.states:
+            status = state.status
+            if state.status == "failed":
+                status = f"[red]{status}[/red]"
+            elif state.status == "done":
+                status = f"[green]{status}[/green]"
+            elif state.status == "waiting for approval":
+                status = f"[yellow]{status}[/yellow]"
+            table.add_row(state.job.branch, status, f"{state.elapsed():.0f}s", str(state.tool_calls), state.error or state.activity)
+        return table
+
+    def start(self):
+        from rich.live import Live
+
+        if self.console.is_terminal:
+            self.live = Live(self.render(), console=self.console, refresh_per_second=2, transient=True)
+            self.live.start()
+
+    def refresh(self):
+        if self.live is not None:
+            self.live.update(self.render())
+            return
+        for state in self.states:
+            if self.printed_status.get(state.job.branch) != state.status:
+                self.printed_status[state.job.branch] = state.status
+                print(f"[{time.strftime('%H:%M:%S')}] {state.job.branch}: {state.status}" + (f" ({state.error})" if state.error else ""))
+
+    def pause(self):
+        if self.live is not None:
+            self.live.stop()
+
+    def resume(self):
+        if self.live is not None:
+            self.live.start()
+
+    def stop(self):
+        if self.live is not None:
+            self.live.stop()
+            self.live = None
+        self.console.print(self.render())
+
+
+class ApprovalQueue:
+    """Tool approvals from all sessions, asked one at a time on the terminal."""
+
+    def __init__(self, view: StatusView, config: AgentConfig):
+        self.view = view
+        self.config = config
+        self.queue = asyncio.Queue()
+
+    async def ask(self, state: JobState, tool_name: str, input_params: dict, log):
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((state, tool_name, input_params, future))
+        state.status = "waiting for approval"
+        try:
+            answer = await future
+        finally:
+            state.status = "running"
+
+        log.print(f"[dim]{tool_name}: {'approved' if answer.lower() in ('y', 'a') else f'denied: {answer}'}[/dim]")
+        return answer
+
+    async def serve(self):
+        while True:
+            state, tool_name, input_params, future = await self.queue.get()
+            if future.cancelled():
+                # the session ended while the request was queued
+                continue
+            self.view.pause()
+            waiting = self.queue.qsize()
+            print(f"\n===== {state.job.branch}" + (f" ({waiting} more waiting)" if waiting else ""))
+            try:
+                # in a thread, so the other sessions keep running while we wait for an answer
+                answer = await asyncio.to_thread(ask_tool_approval, tool_name, input_params, self.config, self.config.tool_policy)
+            except EOFError:
+                answer = "no answer (stdin closed)"
+            finally:
+                self.view.resume()
+            state.approvals += 1
+            if not future.done():
+                future.set_result(answer)
+
+
+async def git(args, cwd):
+    proc = await asyncio.create_subprocess_exec(
+        "git", *args, cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, stdin=subprocess.DEVNULL
+    )
+    stdout, stderr = await proc.communicate()
+    if proc.returncode != 0:
+        raise subprocess.CalledProcessError(proc.returncode, ["git", *args], stdout.decode(), stderr.decode())
+    return stdout.decode()
+
+
+class Worktrees:
+    """Creates worktrees like `-ai -n <branch>`, one `git worktree add` at a time."""
+
+    def __init__(self, repo: str):
+        common_dir = get_common_dir(get_git_dir(repo))
+        # the main repo is the one whose .git is the common dir
+        self.main_repo = os.path.dirname(common_dir) if os.path.basename(common_dir) == ".git" else repo
+        self.dir = f"{self.main_repo}-worktrees"
+        self.lock = asyncio.Lock()
+        self.default_base = None
+
+    async def find_default_base(self):
+        """Return <remote>/main or <remote>/master from the first remote that has one, fetched."""
+        if self.default_base is None:
+            for remote in (await git(["remote"], self.main_repo)).split():
+                for branch in ["main", "master"]:
+                    try:
+                        await git(["ls-remote", "--exit-code", "--heads", remote, branch], self.main_repo)
+                    except subprocess.CalledProcessError:
+                        continue
+                    await git(["fetch", remote, branch, "--prune"], self.main_repo)
+                    self.default_base = f"{remote}/{branch}"
+                    return self.default_base
+            raise RuntimeError("could not find main or master on any remote")
+
+        return self.default_base
+
+    async def ensure(self, job: Job):
+        path = os.path.join(self.dir, job.branch)
+        async with self.lock:
+            if os.path.isdir(path):
+                return path
+
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            try:
+                await git(["show-ref", "--verify", "--quiet", f"refs/heads/{job.branch}"], self.main_repo)
+                branch_exists = True
+            except subprocess.CalledProcessError:
+                branch_exists = False
+
+            if branch_exists:
+                await git(["worktree", "add", path, job.branch], self.main_repo)
+            else:
+                base = job.base or await self.find_default_base()
+                await git(["worktree", "add", "-b", job.branch, path, base], self.main_repo)
+
+        return path
+
+
+async def run_job(state: JobState, worktrees: Worktrees, approvals: ApprovalQueue, semaphore, config: AgentConfig):
+    from rich.console import Console
+
+    with open(state.log_path, "w") as f:
+        log = Console(file=f, width=120, force_terminal=False)
+        log.print(f"branch: {state.job.branch}\n\n{state.job.prompt}\n")
+        try:
+            state.status = "creating worktree"
+            state.worktree = await worktrees.ensure(state.job)
+            log.print(f"worktree: {state.worktree}\n")
+
+            state.status = "queued"
+            async with semaphore:
+                state.status = "running"
+                state.started_at = time.monotonic()
+
+                async def approve(tool_name, input_params):
+                    return await approvals.ask(state, tool_name, input_params, log)
+
+                await run_agent(state.worktree, state.job.prompt, config, console=log, approve=approve, on_message=state.on_message)
+
+        except subprocess.CalledProcessError as e:
+            state.error = f"{subprocess.list2cmdline(e.cmd)} failed: {(e.stderr.strip().splitlines() or [''])[-1]}"
+        except Exception as e:
+            state.error = f"{type(e).__name__}: {e}"
+
+        if state.started_at is not None:
+            state.finished_at = time.monotonic()
+        state.status = "failed" if state.error else "done"
+        if state.error:
+            log.print(f"[red]{state.error}[/red]")
+        f.flush()
+
+
+async def refresh_view(view: StatusView):
+    while True:
+        view.refresh()
+        await asyncio.sleep(0.5)
+
+
+async def main(jobs: list[Job], repo: str, config: AgentConfig):
+    log_dir = os.path.join(LOG_DIR, time.strftime("%Y-%m-%d_%H-%M-%S"))
+    os.makedirs(log_dir, exist_ok=True)
+    states = [JobState(job, os.path.join(log_dir, f"{job.branch.replace('/', '_')}.log")) for job in jobs]
+    print(f"{len(jobs)} jobs, logs in {log_dir}")
+
+    view = StatusView(states)
+    approvals = ApprovalQueue(view, config)
+    worktrees = Worktrees(repo)
+    semaphore = asyncio.Semaphore(MAX_CONCURRENCY)
+
+    view.start()
+    background = [asyncio.create_task(approvals.serve()), asyncio.create_task(refresh_view(view))]
+    try:
+        await asyncio.gather(*(run_job(state, worktrees, approvals, semaphore, config) for state in states))
+
+    finally:
+        for task in background:
+            task.cancel()
+        view.refresh()
+        view.stop()
+
+    total_cost = sum(state.cost or 0 for state in states)
+    failed = [state for state in states if state.status == "failed"]
+    print(f"{len(states) - len(failed)}/{len(states)} jobs done, cost ${total_cost:.4f}, logs in {log_dir}")
+    return not failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run agent sessions for several branches in parallel worktrees")
+    parser.add_argument("jobs", help="JSON list or JSON lines of {\"branch\", \"prompt\" or \"prompt_file\", \"base\"}")
+    # no default: -run-tommyx-python-script runs in its own directory, not the caller's (see -ai-batch)
+    parser.add_argument("--repo", required=True, help="repo (or any of its worktrees) to create the worktrees for")
+    parser.add_argument("--max-concurrency", type=int, default=MAX_CONCURRENCY, help="agent sessions running at once")
+    parser.add_argument("--log-dir", default=LOG_DIR, help="directory for the per-job logs")
+    parser.add_argument("-e", "--accept-edits", action="store_true", help="use the acceptEdits permission mode, like -ai -e")
+    parser.add_argument("--permission-mode", default=None, help="permission mode for every session")
+    parser.add_argument("--diff-backend", default="histogram", help="diff shown for Edit approvals")
+    args = parser.parse_args()
+    # set global flags
+    MAX_CONCURRENCY = args.max_concurrency
+    LOG_DIR = args.log_dir
+
+    try:
+        jobs = load_jobs(args.jobs)
+    except (OSError, ValueError, pydantic.ValidationError) as e:
+        print(f"Error: could not load jobs from {args.jobs}: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    config = AgentConfig(
+        permission_mode=args.permission_mode or ("acceptEdits" if args.accept_edits else "default"),
+        diff_backend=args.diff_backend,
+    )
+    try:
+        ok = asyncio.run(main(jobs, os.path.abspath(args.repo), config))
+    except KeyboardInterrupt:
+        sys.exit(130)
+    sys.exit(0 if ok else 1)
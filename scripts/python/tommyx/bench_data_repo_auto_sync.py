@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""Offline benchmark for data_repo_auto_sync over a synthetic fleet of local repos.
+
+Builds N working clones of local bare repos (file:// remotes) with a mix of
+clean, dirty, ahead, behind and large-worktree repos, points the tool at them
+by overriding REPOS_TO_CHECK, and times full runs across fleet sizes and
+--max-workers values. Every trial starts from a pristine copy of the fleet.
+
+    -run-tommyx-python-script bench_data_repo_auto_sync.py --sizes 20,100 --max-workers 1,8,16 --json
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import tommyx.data_repo_auto_sync as sync
+
+KINDS = ["clean", "dirty", "ahead", "behind", "large"]
+
+DEFAULT_MIX = "clean=0.6,dirty=0.1,ahead=0.1,behind=0.1,large=0.1"
+
+# the tool commits when it pushes dirty repos; keep that independent of the user's git config
+GIT_ENV = {
+    "GIT_AUTHOR_NAME": "bench",
+    "GIT_AUTHOR_EMAIL": "bench@localhost",
+    "GIT_COMMITTER_NAME": "bench",
+    "GIT_COMMITTER_EMAIL": "bench@localhost",
+}
+
+# every repo syncs without asking, so the action phase can run unattended
+AUTO_CONFIG = {"auto_pull": True, "auto_push": True, "auto_rebase_on_failed_push": True}
+
+
+def git(*args, cwd=None):
+    subprocess.run(["git", *args], cwd=cwd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def parse_mix(text):
+    weights = {}
+    for part in text.split(","):
+        kind, _, weight = part.partition("=")
+        if kind not in KINDS:
+            raise ValueError(f"unknown repo kind {kind!r}, expected one of {KINDS}")
+        weights[kind] = float(weight)
+
+    return weights
+
+
+def assign_kinds(size, mix, seed):
+    """Deterministically spread the mix over size repos (largest remainder, then shuffled)."""
+    total = sum(mix.values())
+    exact = {kind: size * weight / total for kind, weight in mix.items()}
+    counts = {kind: int(value) for kind, value in exact.items()}
+    for kind in sorted(exact, key=lambda k: exact[k] - counts[k], reverse=True)[:size - sum(counts.values())]:
+        counts[kind] += 1
+
+    kinds = [kind for kind, count in counts.items() for _ in range(count)]
+    random.Random(seed).shuffle(kinds)
+    return kinds
+
+
+def write_file(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(content)
+
+
+def create_repo(fleet_dir, index, kind, large_files):
+    remote = os.path.join(fleet_dir, "remotes", f"repo{index:04d}.git")
+    work = os.path.join(fleet_dir, "work", f"repo{index:04d}")
+    git("init", "-q", "--bare", "-b", "main", remote)
+    git("clone", "-q", f"file://{remote}", work)
+    git("symbolic-ref", "HEAD", "refs/heads/main", cwd=work)
+
+    write_file(os.path.join(work, "README.md"), f"repo {index}\n")
+    write_file(os.path.join(work, sync.REPO_CONFIG_FILE), json.dumps(AUTO_CONFIG))
+    if kind == "large":
+        for i in range(large_files):
+            write_file(os.path.join(work, "data", f"d{i // 100:03d}", f"f{i:05d}.txt"), f"{i}\n")
+    git("add", "-A", cwd=work)
+    git("commit", "-q", "-m", "initial", cwd=work)
+    git("push", "-q", "-u", "origin", "main", cwd=work)
+
+    if kind == "dirty":
+        write_file(os.path.join(work, "README.md"), f"repo {index}, edited\n")
+        write_file(os.path.join(work, "notes.txt"), "untracked\n")
+    elif kind == "ahead":
+        write_file(os.path.join(work, "ahead.txt"), "local commit\n")
+        git("add", "-A", cwd=work)
+        git("commit", "-q", "-m", "ahead", cwd=work)
+    elif kind == "behind":
+        other = os.path.join(fleet_dir, "scratch", f"repo{index:04d}")
+        git("clone", "-q", f"file://{remote}", other)
+        write_file(os.path.join(other, "upstream.txt"), "upstream commit\n")
+        git("add", "-A", cwd=other)
+        git("commit", "-q", "-m", "upstream", cwd=other)
+        git("push", "-q", "origin", "main", cwd=other)
+
+
+def create_fleet(fleet_dir, kinds, large_files):
+    for index, kind in enumerate(kinds):
+        create_repo(fleet_dir, index, kind, large_files)
+
+
+def restore_fleet(pristine_dir, fleet_dir):
+    shutil.rmtree(fleet_dir, ignore_errors=True)
+    shutil.copytree(pristine_dir, fleet_dir, symlinks=True)
+
+
+def run_tool(fleet_dir, state_dir, max_workers):
+    """Run one full sync over the fleet in-process and return its timings."""
+    sync.REPOS_TO_CHECK = [os.path.join(fleet_dir, "work", "*")]
+    sync.MAX_WORKERS = max_workers
+    sync.REMOTE_REFS_STATE_FILE = os.path.join(state_dir, "remote_refs.json")
+    sync.SCAN_INDEX_STATE_FILE = os.path.join(state_dir, "scan_index.json")
+    sync.REPO_MANIFEST_STATE_FILE = os.path.join(state_dir, "repo_manifest.json")
+    sync.FLEET_CONFIG_FILE = None
+    sync.SSH_MULTIPLEX = False
+    sync.PROFILE = "json"
+    sync.PROFILE_HISTORY_FILE = None
+    sync._profiler = None
+
+    started_at = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        asyncio.run(sync.main())
+    wall = time.perf_counter() - started_at
+
+    summary = sync._profiler.summary()
+    return {
+        "wall": wall,
+        "scan": summary["phases"].get("scan"),
+        "action": summary["phases"].get("action"),
+        "commands": summary["command_count"],
+    }
+
+
+def aggregate(values):
+    return {
+        "median": statistics.median(values),
+        "min": min(values),
+        "max": max(values),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark data_repo_auto_sync on a synthetic local fleet")
+    parser.add_argument("--sizes", default="20,100", help="comma-separated fleet sizes")
+    parser.add_argument("--max-workers", default="1,4,16", help="comma-separated --max-workers values")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"repo kind weights (kinds: {', '.join(KINDS)})")
+    parser.add_argument("--large-files", type=int, default=2000, help="number of files in each large repo")
+    parser.add_argument("--repeat", type=int, default=3, help="trials per configuration")
+    parser.add_argument("--seed", type=int, default=0, help="seed for assigning kinds to repos")
+    parser.add_argument("--dir", default=None, help="work directory (default: a temp dir, removed afterwards)")
+    parser.add_argument("--json", action="store_true", help="print results as JSON instead of a table")
+    parser.add_argument("--output", default=None, help="also write the JSON results to this file")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    worker_counts = [int(workers) for workers in args.max_workers.split(",")]
+    mix = parse_mix(args.mix)
+    os.environ.update(GIT_ENV)
+
+    root = args.dir or tempfile.mkdtemp(prefix="bench-data-repo-auto-sync-")
+    results = []
+    try:
+        for size in sizes:
+            pristine_dir = os.path.join(root, f"pristine-{size}")
+            fleet_dir = os.path.join(root, "fleet")
+            kinds = assign_kinds(size, mix, args.seed)
+            print(f"Generating fleet of {size} repos...", file=sys.stderr)
+            # generated in place so file:// remotes resolve after every restore
+            shutil.rmtree(fleet_dir, ignore_errors=True)
+            create_fleet(fleet_dir, kinds, args.large_files)
+            shutil.rmtree(pristine_dir, ignore_errors=True)
+            shutil.copytree(fleet_dir, pristine_dir, symlinks=True)
+
+            for max_workers in worker_counts:
+                trials = {"cold": [], "warm": []}
+                for _ in range(args.repeat):
+                    restore_fleet(pristine_dir, fleet_dir)
+                    state_dir = os.path.join(root, "state")
+                    shutil.rmtree(state_dir, ignore_errors=True)
+                    # cold: no cached state, every repo has its pending change
+                    trials["cold"].append(run_tool(fleet_dir, state_dir, max_workers))
+                    # warm: everything was just synced and the caches are filled
+                    trials["warm"].append(run_tool(fleet_dir, state_dir, max_workers))
+
+                for run, runs in trials.items():
+                    result = {
+                        "fleet_size": size,
+                        "max_workers": max_workers,
+                        "run": run,
+                        "repeat": args.repeat,
+                        "commands": statistics.median(r["commands"] for r in runs),
+                    }
+                    for key in ("wall", "scan", "action"):
+                        result[key] = aggregate([r[key] for r in runs])
+                    results.append(result)
+                    print(f"  size={size} max_workers={max_workers} {run}: {result['wall']['median']:.3f}s", file=sys.stderr)
+
+    finally:
+        if args.dir is None:
+            shutil.rmtree(root, ignore_errors=True)
+
+    document = {
+        "mix": mix,
+        "large_files": args.large_files,
+        "seed": args.seed,
+        "git_version": subprocess.run(["git", "version"], stdout=subprocess.PIPE, universal_newlines=True).stdout.strip(),
+        "python_version": sys.version.split()[0],
+        "cpu_count": os.cpu_count(),
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(document, f, indent=2)
+
+    if args.json:
+        print(json.dumps(document, indent=2))
+        return
+
+    print(f"{'size':>6}{'workers':>9}{'run':>6}{'wall (med)':>12}{'scan':>10}{'action':>10}{'cmds':>7}")
+    for r in results:
+        print(
+            f"{r['fleet_size']:>6}{r['max_workers']:>9}{r['run']:>6}{r['wall']['median']:>11.3f}s"
+            f"{r['scan']['median']:>9.3f}s{r['action']['median']:>9.3f}s{r['commands']:>7.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
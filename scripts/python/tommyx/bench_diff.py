@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""Benchmark the diff backends behind visualize_diff on large synthetic edits.
+
+Each case builds an old and a new file, then times diff.diff_sequences per
+backend (median of a few runs) and reports the size of the edit it found, so
+a backend that is fast only because it gave up (DIFF_TIMEOUT) shows up as a
+bigger edit. Also times a full visualize_diff with output discarded.
+
+    -run-tommyx-python-script bench_diff.py --scale 2 --backends histogram myers
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import random
+import statistics
+import time
+
+from tommyx.utils import diff
+from tommyx.utils.ai import visualize_diff
+
+
+def generated_code(n, rnd):
+    """Lines that look like a generated source file: mostly unique, with repeated braces and blanks."""
+    lines = []
+    for i in range(n):
+        if i % 7 == 6:
+            lines.append("}\n")
+        elif i % 7 == 0:
+            lines.append("\n")
+        else:
+            lines.append(f"    field_{i} = compute({rnd.randrange(1000)}, \"{rnd.randrange(10**6):06d}\");\n")
+    return lines
+
+
+def scattered_edits(n, rnd):
+    old = generated_code(n, rnd)
+    new = list(old)
+    for _ in range(n // 100):
+        i = rnd.randrange(len(new))
+        if new[i].startswith("    "):
+            new[i] = new[i].replace("compute", "compute_cached")
+    for _ in range(n // 500):
+        new.insert(rnd.randrange(len(new)), f"    extra = {rnd.randrange(1000)};\n")
+    return old, new
+
+
+def repetitive(n, rnd):
+    """Few distinct lines, the case where difflib's matching degrades badly."""
+    choices = ["\n", "}\n", "{\n", "    return 0;\n", "    break;\n", "    i++;\n"]
+    old = [rnd.choice(choices) for _ in range(n)]
+    new = list(old)
+    for _ in range(n // 50):
+        i = rnd.randrange(len(new))
+        new[i:i + 1] = [rnd.choice(choices)] * rnd.randint(0, 3)
+    return old, new
+
+
+def block_rewrite(n, rnd):
+    old = generated_code(n, rnd)
+    start = n // 3
+    new = old[:start] + generated_code(n // 5, rnd) + old[start + n // 5:]
+    return old, new
+
+
+def full_rewrite(n, rnd):
+    """Every line differs: worst case for Myers, bounded by DIFF_TIMEOUT."""
+    return generated_code(n, rnd), generated_code(n, rnd)
+
+
+# name -> (function(n, rnd) -> (old lines, new lines), base line count)
+CASES = {
+    "scattered_edits": (scattered_edits, 20000),
+    "repetitive": (repetitive, 10000),
+    "block_rewrite": (block_rewrite, 20000),
+    "full_rewrite": (full_rewrite, 5000),
+}
+
+
+def edit_size(opcodes):
+    return sum((i2 - i1) + (j2 - j1) for tag, i1, i2, j1, j2 in opcodes if tag != "equal")
+
+
+def time_call(fn, repeat):
+    times = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the diff backends on large synthetic edits")
+    parser.add_argument("--cases", nargs="*", default=list(CASES), choices=list(CASES), help="cases to run")
+    parser.add_argument("--backends", nargs="*", default=list(diff.DIFF_BACKENDS), choices=list(diff.DIFF_BACKENDS))
+    parser.add_argument("--scale", type=float, default=1.0, help="multiply the line count of every case")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per measurement")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="print results as JSON instead of a table")
+    args = parser.parse_args()
+
+    results = []
+    for case in args.cases:
+        make, n = CASES[case]
+        old, new = make(int(n * args.scale), random.Random(args.seed))
+        old_string, new_string = "".join(old), "".join(new)
+        for backend in args.backends:
+            diff_s, opcodes = time_call(lambda: diff.diff_sequences(old, new, backend), args.repeat)
+            with contextlib.redirect_stdout(io.StringIO()):
+                render_s, _ = time_call(lambda: visualize_diff(old_string, new_string, "bench", backend), args.repeat)
+            results.append({
+                "case": case,
+                "backend": backend,
+                "old_lines": len(old),
+                "new_lines": len(new),
+                "diff_ms": diff_s * 1000,
+                "visualize_ms": render_s * 1000,
+                "edit_lines": edit_size(opcodes),
+            })
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"{'case':<18}{'backend':<11}{'lines':>13}{'diff':>11}{'visualize':>12}{'edit lines':>12}")
+        for r in results:
+            lines = f"{r['old_lines']}/{r['new_lines']}"
+            print(f"{r['case']:<18}{r['backend']:<11}{lines:>13}{r['diff_ms']:>9.1f}ms{r['visualize_ms']:>10.1f}ms{r['edit_lines']:>12}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""Offline benchmark for git_worktrees_cleanup over a synthetic repo with many worktrees.
+
+Builds a repo with a local bare remote (file://) and N agent worktrees under
+<repo>-worktrees: most with their remote branch deleted, some still active,
+some with uncommitted changes, without upstream, merged into main, or with
+their directory gone. Times the previous per-worktree shell loop (replayed
+git call for git call) against the batched cleanup, each on a freshly built
+repo, and checks both leave the same branches behind, apart from those of
+missing worktrees, which only the batched cleanup finds.
+
+    -run-tommyx-python-script bench_git_worktrees_cleanup.py --sizes 20,100 --repeat 3 --json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import tommyx.git_worktrees_cleanup as cleanup
+
+KINDS = ["gone", "active", "dirty", "no_upstream", "merged", "missing"]
+
+DEFAULT_MIX = "gone=0.6,active=0.15,dirty=0.05,no_upstream=0.05,merged=0.1,missing=0.05"
+
+GIT_ENV = {
+    "GIT_AUTHOR_NAME": "bench",
+    "GIT_AUTHOR_EMAIL": "bench@localhost",
+    "GIT_COMMITTER_NAME": "bench",
+    "GIT_COMMITTER_EMAIL": "bench@localhost",
+}
+
+
+def git(*args, cwd=None):
+    return subprocess.run(
+        ["git", *args], cwd=cwd, check=True, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True
+    ).stdout
+
+
+def parse_mix(text):
+    weights = {}
+    for part in text.split(","):
+        kind, _, weight = part.partition("=")
+        if kind not in KINDS:
+            raise ValueError(f"unknown worktree kind {kind!r}, expected one of {KINDS}")
+        weights[kind] = float(weight)
+
+    return weights
+
+
+def assign_kinds(size, mix, seed):
+    """Deterministically spread the mix over size worktrees (largest remainder, then shuffled)."""
+    total = sum(mix.values())
+    exact = {kind: size * weight / total for kind, weight in mix.items()}
+    counts = {kind: int(value) for kind, value in exact.items()}
+    for kind in sorted(exact, key=lambda k: exact[k] - counts[k], reverse=True)[:size - sum(counts.values())]:
+        counts[kind] += 1
+
+    kinds = [kind for kind, count in counts.items() for _ in range(count)]
+    random.Random(seed).shuffle(kinds)
+    return kinds
+
+
+def build_repo(root, kinds, files):
+    """Create root/remote.git, root/repo and one worktree per kind; returns the repo path."""
+    remote = os.path.join(root, "remote.git")
+    repo = os.path.join(root, "repo")
+    worktrees_dir = f"{repo}-worktrees"
+    git("init", "-q", "--bare", "-b", "main", remote)
+    git("init", "-q", "-b", "main", repo)
+    for i in range(files):
+        path = os.path.join(repo, "src", f"file{i:04d}.txt")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(f"line {i}\n" * 50)
+    git("add", "-A", cwd=repo)
+    git("commit", "-q", "-m", "initial", cwd=repo)
+    git("remote", "add", "origin", f"file://{remote}", cwd=repo)
+    git("push", "-q", "-u", "origin", "main", cwd=repo)
+
+    branches = []
+    for i, kind in enumerate(kinds):
+        branch = f"agent-{i:04d}-{kind}"
+        path = os.path.join(worktrees_dir, branch)
+        git("worktree", "add", "-q", "-b", branch, path, "main", cwd=repo)
+        if kind != "merged":
+            with open(os.path.join(path, "src", f"work-{branch}.txt"), "w") as f:
+                f.write(f"{branch}\n")
+            git("add", "-A", cwd=path)
+            git("commit", "-q", "-m", branch, cwd=path)
+        branches.append((branch, kind, path))
+
+    # one push for every branch with an upstream
+    pushed = [branch for branch, kind, _ in branches if kind != "no_upstream"]
+    if pushed:
+        git("push", "-q", "-u", "origin", *pushed, cwd=repo)
+    # "merged and deleted on GitHub", without touching the local remote-tracking refs
+    deleted = [branch for branch, kind, _ in branches if kind in ("gone", "dirty", "missing")]
+    if deleted:
+        git("branch", "-q", "-D", *deleted, cwd=remote)
+
+    for branch, kind, path in branches:
+        if kind == "dirty":
+            with open(os.path.join(path, "notes.txt"), "w") as f:
+                f.write("not committed\n")
+        elif kind == "missing":
+            shutil.rmtree(path)
+
+    return repo
+
+
+def legacy_cleanup(repo):
+    """Replay the shell loop git_worktrees_cleanup replaced, one git call at a time (answering y)."""
+    worktrees_dir = f"{repo}-worktrees"
+    branches, upstreams, remotes = [], [], set()
+    for name in sorted(os.listdir(worktrees_dir)):
+        if not os.path.isdir(os.path.join(worktrees_dir, name)):
+            continue
+        remote = subprocess.run(["git", "-C", repo, "config", f"branch.{name}.remote"], capture_output=True, text=True).stdout.strip()
+        merge = subprocess.run(["git", "-C", repo, "config", f"branch.{name}.merge"], capture_output=True, text=True).stdout.strip()
+        upstream = f"{remote}/{merge[len('refs/heads/'):]}" if remote and merge else ""
+        branches.append(name)
+        upstreams.append(upstream)
+        if upstream:
+            remotes.add(remote)
+
+    for remote in sorted(remotes):
+        subprocess.run(["git", "-C", repo, "remote", "prune", remote], capture_output=True)
+
+    to_remove = []
+    for branch, upstream in zip(branches, upstreams):
+        if not upstream:
+            continue
+        if subprocess.run(["git", "-C", repo, "rev-parse", "--verify", f"refs/remotes/{upstream}"], capture_output=True).returncode == 0:
+            continue
+        to_remove.append(branch)
+
+    for branch in to_remove:
+        # the shell script stopped at the first failure (set -e); carry on so both runs do the same work
+        subprocess.run(["git", "-C", repo, "worktree", "remove", os.path.join(worktrees_dir, branch)], capture_output=True)
+        subprocess.run(["git", "-C", repo, "branch", "-D", branch], capture_output=True)
+    subprocess.run(["git", "-C", repo, "worktree", "prune"], capture_output=True)
+
+
+def remaining_branches(repo):
+    return sorted(git("for-each-ref", "--format=%(refname:short)", "refs/heads", cwd=repo).split())
+
+
+def run_trial(root, kinds, files, strategy):
+    """Build a fresh repo in root, clean it up with strategy and return (seconds, report or None, branches left)."""
+    repo = build_repo(root, kinds, files)
+    started_at = time.perf_counter()
+    report = None
+    if strategy == "legacy":
+        legacy_cleanup(repo)
+    else:
+        report = asyncio.run(cleanup.cleanup(repo, dry_run=strategy == "dry_run"))
+    seconds = time.perf_counter() - started_at
+    return seconds, report, remaining_branches(repo)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark git_worktrees_cleanup against the per-worktree shell loop")
+    parser.add_argument("--sizes", default="20,100", help="comma separated worktree counts")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"worktree kind weights, kinds: {', '.join(KINDS)}")
+    parser.add_argument("--files", type=int, default=200, help="files in the repo, so each worktree has some to delete")
+    parser.add_argument("--repeat", type=int, default=1, help="trials per size and strategy")
+    parser.add_argument("--max-workers", type=int, default=cleanup.MAX_WORKERS, help="cleanup's concurrent git processes")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--keep", action="store_true", help="keep the synthetic repos (path printed on stderr)")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    cleanup.MAX_WORKERS = args.max_workers
+    mix = parse_mix(args.mix)
+    sizes = [int(size) for size in args.sizes.split(",")]
+    os.environ.update(GIT_ENV)
+
+    base_dir = tempfile.mkdtemp(prefix="bench-worktrees-")
+    results = []
+    try:
+        for size in sizes:
+            kinds = assign_kinds(size, mix, args.seed)
+            left = {}
+            for strategy in ["legacy", "dry_run", "batched"]:
+                times, timings = [], []
+                for trial in range(args.repeat):
+                    root = os.path.join(base_dir, f"{size}-{strategy}-{trial}")
+                    print(f"size {size}, {strategy}, trial {trial + 1}/{args.repeat} ...", file=sys.stderr)
+                    seconds, report, branches = run_trial(root, kinds, args.files, strategy)
+                    times.append(seconds)
+                    if report is not None:
+                        timings.append(report["timings"])
+                    left[strategy] = branches
+                    if not args.keep:
+                        shutil.rmtree(root, ignore_errors=True)
+
+                phases = {phase: statistics.median(t[phase] for t in timings) for phase in timings[0]} if timings else {}
+                results.append({
+                    "size": size,
+                    "strategy": strategy,
+                    "median_s": statistics.median(times),
+                    "min_s": min(times),
+                    "phases_s": phases,
+                    "branches_left": len(left[strategy]),
+                })
+
+            # merged branches stay without --include-merged, and the dirty ones are kept by both (the
+            # legacy loop fails to remove them); only cleanup sees worktrees whose directory is gone
+            expected = {branch for branch in left["legacy"] if branch.endswith("-missing")}
+            if set(left["legacy"]) - set(left["batched"]) != expected or set(left["batched"]) - set(left["legacy"]):
+                print(f"Warning: size {size}: legacy and batched cleanup left unexpectedly different branches: "
+                      f"{sorted(set(left['legacy']) ^ set(left['batched']))}", file=sys.stderr)
+
+    finally:
+        if args.keep:
+            print(f"repos kept in {base_dir}", file=sys.stderr)
+        else:
+            shutil.rmtree(base_dir, ignore_errors=True)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'size':>6}  {'strategy':<8}  {'median':>9}  {'min':>9}  {'left':>5}  phases")
+    for r in results:
+        phases = " ".join(f"{phase}={seconds * 1000:.0f}ms" for phase, seconds in r["phases_s"].items())
+        print(f"{r['size']:>6}  {r['strategy']:<8}  {r['median_s'] * 1000:>7.0f}ms  {r['min_s'] * 1000:>7.0f}ms  {r['branches_left']:>5}  {phases}")
+
+
+if __name__ == "__main__":
+    main()
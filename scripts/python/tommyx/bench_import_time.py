@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""Cold import-time benchmark for the tommyx utils modules, failing past a budget.
+
+Imports each module in a fresh interpreter under `python -X importtime`, takes
+the median cumulative time over a few runs and compares it with the module's
+budget. Also fails if a module pulls in a heavy dependency it is supposed to
+import lazily, or cannot be imported without OPENAI_API_KEY.
+
+    -run-tommyx-python-script bench_import_time.py --repeat 7 --json
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# module -> cold import budget in milliseconds (roughly 3x a typical run, so only real regressions fail)
+BUDGETS_MS = {
+    "tommyx.utils.ai": 400,
+    "tommyx.utils.web": 60,
+    "tommyx.utils.llm_cache": 300,
+    "tommyx.utils.git": 30,
+    "tommyx.utils.git_status": 60,
+    "tommyx.utils.diff": 30,
+}
+
+# packages each module must only import on first use
+LAZY_IMPORTS = {
+    "tommyx.utils.ai": ["openai", "claude_agent_sdk", "rich", "jiter", "asyncio", "concurrent.futures"],
+    "tommyx.utils.web": ["requests", "bs4", "urllib.request"],
+}
+
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def parse_importtime(stderr):
+    """Return {module: (self_us, cumulative_us)} from `-X importtime` output."""
+    times = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        if not self_us.strip().isdigit():
+            # the header line
+            continue
+        times[name.strip()] = (int(self_us), int(cumulative_us))
+
+    return times
+
+
+def measure(module):
+    """Import module in a fresh interpreter and return its importtime table."""
+    env = dict(os.environ)
+    env.pop("OPENAI_API_KEY", None)
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=PACKAGE_DIR, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"importing {module} failed:\n{result.stderr.splitlines()[-1] if result.stderr else ''}")
+
+    return parse_importtime(result.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check cold import times of tommyx modules against their budgets")
+    parser.add_argument("modules", nargs="*", default=list(BUDGETS_MS), help="modules to check (default: all budgeted)")
+    parser.add_argument("--repeat", type=int, default=5, help="fresh interpreters per module")
+    parser.add_argument("--budget-scale", type=float, default=1.0, help="multiply every budget, e.g. for slow CI machines")
+    parser.add_argument("--top", type=int, default=5, help="slowest imports to list for a module over budget")
+    parser.add_argument("--json", action="store_true", help="print results as JSON instead of a table")
+    args = parser.parse_args()
+
+    results = []
+    for module in args.modules:
+        runs = []
+        eager = set()
+        error = None
+        for _ in range(args.repeat):
+            try:
+                times = measure(module)
+            except RuntimeError as e:
+                error = str(e)
+                break
+            runs.append(times)
+            eager.update(name for name in LAZY_IMPORTS.get(module, []) if name in times)
+
+        budget_ms = BUDGETS_MS.get(module)
+        result = {"module": module, "budget_ms": budget_ms * args.budget_scale if budget_ms else None, "error": error}
+        if runs:
+            cumulative_ms = [times[module][1] / 1000 for times in runs]
+            result["median_ms"] = statistics.median(cumulative_ms)
+            result["min_ms"] = min(cumulative_ms)
+            # biggest self times of the first run, to point at the culprit
+            slowest = sorted(runs[0].items(), key=lambda item: item[1][0], reverse=True)[:args.top]
+            result["slowest_self_ms"] = {name: self_us / 1000 for name, (self_us, _) in slowest}
+        result["eager_imports"] = sorted(eager)
+        result["ok"] = (
+            error is None and not eager
+            and (result["budget_ms"] is None or result["median_ms"] <= result["budget_ms"])
+        )
+        results.append(result)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"{'module':<28}{'median':>10}{'min':>10}{'budget':>10}  status")
+        for r in results:
+            if r["error"]:
+                print(f"{r['module']:<28}{'':>30}  FAIL: {r['error']}")
+                continue
+            budget = f"{r['budget_ms']:.0f}ms" if r["budget_ms"] else "-"
+            status = "ok" if r["ok"] else "FAIL"
+            if r["eager_imports"]:
+                status += f": imports {', '.join(r['eager_imports'])} eagerly"
+            print(f"{r['module']:<28}{r['median_ms']:>8.1f}ms{r['min_ms']:>8.1f}ms{budget:>10}  {status}")
+            if not r["ok"]:
+                for name, self_ms in r["slowest_self_ms"].items():
+                    print(f"    {self_ms:>8.1f}ms  {name}")
+
+    sys.exit(0 if all(r["ok"] for r in results) else 1)
+
+
+if __name__ == "__main__":
+    main()
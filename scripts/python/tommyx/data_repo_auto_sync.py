@@ -1,19 +1,56 @@
 #!/usr/bin/env python3
 
-import glob
+import asyncio
+import fnmatch
 import subprocess
 import os
 import argparse
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import shutil
+import signal
+import tempfile
+import hashlib
+import json
+import sys
+import time
+from collections import defaultdict
+from typing import Optional
 
 import pydantic
 
+from tommyx.utils.fs_watch import create_watcher
+from tommyx.utils.git import (
+    find_repos, get_config_files, get_git_dir, parse_ssh_remote, read_config_value, read_head, read_head_branch, read_ref,
+)
+from tommyx.utils.git_status import NeedsGitStatus, get_exclude_files, read_clean_status, walk_worktree
+
 # verbose flag, controlled via command-line
 VERBOSE = False
 # pull-only flag, controlled via command-line
 PULL_ONLY = False
-# max workers, controlled via command-line
+# max concurrent network operations (fetch/pull/push), controlled via command-line
 MAX_WORKERS = 16
+# max concurrent local git operations and worktree scans, controlled via command-line
+MAX_LOCAL_WORKERS = min(8, os.cpu_count() or 1)
+# per-command timeouts in seconds, controlled via command-line
+NETWORK_TIMEOUT = 120
+LOCAL_TIMEOUT = 60
+# force-fetch flag, controlled via command-line
+FORCE_FETCH = False
+# fsmonitor flag, controlled via command-line
+USE_FSMONITOR = False
+# opt-in in-process clean check before git status, controlled via command-line
+FAST_STATUS = False
+# watch mode timings in seconds, controlled via command-line
+WATCH_DEBOUNCE = 5
+UPSTREAM_CHECK_INTERVAL = 600
+# how often the watcher re-walks worktrees when inotify is unavailable
+WATCH_POLL_INTERVAL = 10
+# ssh connection sharing flag, controlled via command-line
+SSH_MULTIPLEX = True
+# profile report format ("table" or "json", None to disable), controlled via command-line
+PROFILE = None
+# append-only run history for --profile, None to disable, controlled via command-line
+PROFILE_HISTORY_FILE = None
 
 REPOS_TO_CHECK = [
     "~/data/*",
@@ -26,6 +63,17 @@ BLUE = '\033[34m'
 RESET = '\033[0m'
 
 REPO_CONFIG_FILE = ".repo_auto_sync.json"
+# fleet-wide settings (see FleetConfig), controlled via command-line; None or a missing file means defaults
+FLEET_CONFIG_FILE = os.path.expanduser("~/.config/tommyx/data_repo_auto_sync.json")
+
+STATE_DIR = os.path.expanduser("~/.cache/tommyx/data_repo_auto_sync")
+# remote ref sha of each repo's tracked branch as of its last fetch
+REMOTE_REFS_STATE_FILE = os.path.join(STATE_DIR, "remote_refs.json")
+# local fingerprint and status of each repo as of its last clean scan
+SCAN_INDEX_STATE_FILE = os.path.join(STATE_DIR, "scan_index.json")
+# discovered repos and their configs, revalidated by directory and config file mtimes
+REPO_MANIFEST_STATE_FILE = os.path.join(STATE_DIR, "repo_manifest.json")
+DEFAULT_PROFILE_HISTORY_FILE = os.path.join(STATE_DIR, "profile_history.jsonl")
 
 
 class RepoConfig(pydantic.BaseModel):
@@ -35,22 +83,138 @@ class RepoConfig(pydantic.BaseModel):
     auto_rebase_on_failed_push: bool = False
 
 
-def get_repo_config(repo):
-    config_file = os.path.join(repo, REPO_CONFIG_FILE)
-    if os.path.exists(config_file):
+class FleetConfig(pydantic.BaseModel):
+    # glob patterns of repos to check (`**` matches any depth), None for REPOS_TO_CHECK
+    repos: Optional[list[str]] = None
+    # whether `**` also looks for repos inside other repos' worktrees
+    nested_repos: bool = False
+    # path glob -> RepoConfig fields for matching repos; these win over the repo's own
+    # config file, and later patterns win over earlier ones
+    overrides: dict[str, dict] = {}
+
+    def get_patterns(self):
+        return self.repos if self.repos is not None else REPOS_TO_CHECK
+
+
+def load_fleet_config():
+    if FLEET_CONFIG_FILE and os.path.exists(FLEET_CONFIG_FILE):
         try:
-            with open(config_file, "r") as f:
-                if hasattr(RepoConfig, 'model_validate_json'):
-                    config = RepoConfig.model_validate_json(f.read())
+            with open(FLEET_CONFIG_FILE, "r") as f:
+                if hasattr(FleetConfig, 'model_validate_json'):
+                    return FleetConfig.model_validate_json(f.read())
                 else:
-                    config = RepoConfig.parse_raw(f.read())
-                return config
+                    return FleetConfig.parse_raw(f.read())
 
         except pydantic.ValidationError as e:
-            print(f"Invalid config file for repo {format_repo(repo)}: {e}")
-            return RepoConfig()
+            print(f"Invalid fleet config file {FLEET_CONFIG_FILE}: {e}")
+
+    return FleetConfig()
+
+
+def model_to_dict(model):
+    return model.model_dump() if hasattr(model, 'model_dump') else model.dict()
+
+
+def read_repo_config_fields(repo):
+    """Return the fields set in the repo's config file, {} without one, or None if it is not valid JSON."""
+    config_file = os.path.join(repo, REPO_CONFIG_FILE)
+    if not os.path.exists(config_file):
+        return {}
+
+    try:
+        with open(config_file, "r") as f:
+            fields = json.load(f)
+        if not isinstance(fields, dict):
+            raise ValueError("expected a JSON object")
+        return fields
+
+    except ValueError as e:
+        print(f"Invalid config file for repo {format_repo(repo)}: {e}")
+        return None
+
+
+def build_repo_config(repo, fields, fleet_config):
+    """Apply the fleet overrides matching repo on top of fields. Returns None if the result is invalid."""
+    fields = dict(fields)
+    for pattern, override in fleet_config.overrides.items():
+        if fnmatch.fnmatchcase(repo, os.path.abspath(os.path.expanduser(pattern))):
+            fields.update(override)
+
+    try:
+        return RepoConfig(**fields)
+
+    except pydantic.ValidationError as e:
+        print(f"Invalid config for repo {format_repo(repo)}: {e}")
+        return None
+
+
+def get_repo_config(repo, fleet_config=None):
+    fields = read_repo_config_fields(repo)
+    return build_repo_config(repo, fields or {}, fleet_config or FleetConfig()) or RepoConfig()
 
-    return RepoConfig()
+
+def dirs_unchanged(dir_mtimes):
+    for path, mtime in dir_mtimes.items():
+        try:
+            if os.stat(path).st_mtime_ns != mtime:
+                return False
+        except OSError:
+            if mtime is not None:
+                return False
+
+    return True
+
+
+def get_config_mtime(repo):
+    try:
+        return os.stat(os.path.join(repo, REPO_CONFIG_FILE)).st_mtime_ns
+    except OSError:
+        return None
+
+
+def discover_repos(fleet_config):
+    """Return (repos, {repo: RepoConfig}) for the fleet, reusing the cached manifest where still valid.
+
+    The repo list is reused while every directory it was derived from keeps its
+    mtime, and each repo's config while its config file does; a change to the
+    fleet config invalidates everything.
+    """
+    manifest = load_state(REPO_MANIFEST_STATE_FILE)
+    key = json.dumps([fleet_config.get_patterns(), fleet_config.nested_repos, fleet_config.overrides], sort_keys=True)
+    if manifest.get("key") != key:
+        manifest = {}
+
+    if manifest and dirs_unchanged(manifest.get("dirs", {})):
+        repos = manifest["repos"]
+        dir_mtimes = manifest["dirs"]
+    else:
+        repos = []
+        dir_mtimes = {}
+        for pattern in fleet_config.get_patterns():
+            for repo in find_repos(pattern, fleet_config.nested_repos, dir_mtimes):
+                if repo not in repos:
+                    repos.append(repo)
+
+    cached_configs = manifest.get("configs", {})
+    configs = {}
+    manifest_configs = {}
+    for repo in repos:
+        mtime = get_config_mtime(repo)
+        entry = cached_configs.get(repo)
+        if entry is not None and entry["mtime"] == mtime:
+            configs[repo] = RepoConfig(**entry["config"])
+            manifest_configs[repo] = entry
+            continue
+
+        fields = read_repo_config_fields(repo)
+        config = build_repo_config(repo, fields or {}, fleet_config)
+        configs[repo] = config or RepoConfig()
+        # invalid configs are not cached, so their warning shows on every run
+        if fields is not None and config is not None:
+            manifest_configs[repo] = {"mtime": mtime, "config": model_to_dict(config)}
+
+    save_state(REPO_MANIFEST_STATE_FILE, {"key": key, "dirs": dir_mtimes, "repos": repos, "configs": manifest_configs})
+    return repos, configs
 
 
 def red(text):
@@ -69,227 +233,1026 @@ def format_repo(repo):
     return f"{blue(f'[{repo}]')}"
 
 
-def run_command(command, shell=True, check=True, cwd=None):
-    if VERBOSE: print(f"Running command: {command}")
+# separate pools so network-bound fetches do not starve local status calls and vice versa
+_network_semaphore = None
+_local_semaphore = None
+
+
+def init_command_pools():
+    """Create the concurrency pools. Must be called from inside the running event loop."""
+    global _network_semaphore, _local_semaphore
+    _network_semaphore = asyncio.Semaphore(MAX_WORKERS)
+    _local_semaphore = asyncio.Semaphore(MAX_LOCAL_WORKERS)
+
+
+# commands run in a session of their own, so a kill also reaches the helpers git spawned (ssh,
+# credential helpers); off for the serial interactive pass, where they need the terminal to prompt
+_detach_commands = True
+
+
+def kill_command(proc, detached):
     try:
-        result = subprocess.run(
-            command, shell=shell, check=check, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True, cwd=cwd
+        if detached:
+            os.killpg(proc.pid, signal.SIGKILL)
+        else:
+            proc.kill()
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+class SshMultiplexer:
+    """Shares one SSH connection per remote host across all git network commands of a run.
+
+    start() opens a ControlMaster for every distinct SSH host among the repos'
+    origin remotes and points git at it through GIT_SSH_COMMAND; stop() closes
+    them and reports how many handshakes were saved. Left alone if the user
+    already set GIT_SSH_COMMAND.
+    """
+
+    def __init__(self):
+        self.control_dir = None
+        # repo path -> (user, host, port) of its origin remote
+        self.repo_hosts = {}
+        # hosts with an established master connection
+        self.masters = set()
+        self.ssh_commands = 0
+        self.previous_ssh_command = None
+
+    async def start(self, repos):
+        if "GIT_SSH_COMMAND" in os.environ:
+            if VERBOSE: print("GIT_SSH_COMMAND already set, not managing ssh connections")
+            return
+
+        for repo in repos:
+            host = parse_ssh_remote(read_config_value(get_git_dir(repo), "remote", "origin", "url"))
+            if host is not None:
+                self.repo_hosts[repo] = host
+
+        if not self.repo_hosts:
+            return
+
+        # unix socket paths are limited to ~100 bytes, so stay out of long $TMPDIRs
+        self.control_dir = tempfile.mkdtemp(prefix="tommyx-ssh-", dir="/tmp" if os.path.isdir("/tmp") else None)
+        control_options = ["-o", f"ControlPath={self.control_dir}/%C", "-o", "ControlPersist=yes"]
+        await asyncio.gather(*(self.open_master(host, control_options) for host in set(self.repo_hosts.values())))
+
+        # auto: hosts whose master could not be opened up front get one from their first git command
+        os.environ["GIT_SSH_COMMAND"] = subprocess.list2cmdline(["ssh", "-o", "ControlMaster=auto", *control_options])
+
+    async def open_master(self, host, control_options):
+        user, hostname, port = host
+        args = ["ssh", "-o", "ControlMaster=yes", "-o", "BatchMode=yes", *control_options, "-N", "-f"]
+        if port:
+            args += ["-p", port]
+        args.append(f"{user}@{hostname}" if user else hostname)
+        try:
+            await run_command(args, network=True)
+            self.masters.add(host)
+
+        except Exception as e:
+            print(f"Could not open shared ssh connection to {hostname}: {e}")
+
+    def record(self, cwd):
+        if self.repo_hosts.get(cwd) in self.masters:
+            self.ssh_commands += 1
+
+    async def stop(self):
+        if self.control_dir is None:
+            return
+
+        del os.environ["GIT_SSH_COMMAND"]
+        for name in os.listdir(self.control_dir):
+            await run_command(["ssh", "-S", os.path.join(self.control_dir, name), "-O", "exit", "_"], check=False)
+        shutil.rmtree(self.control_dir, ignore_errors=True)
+        self.control_dir = None
+
+        if self.masters:
+            print(
+                f"SSH: {self.ssh_commands} network commands over {len(self.masters)} shared connections, "
+                f"{max(0, self.ssh_commands - len(self.masters))} handshakes saved"
+            )
+
+
+_ssh_multiplexer = None
+
+
+def get_command_step(args):
+    """Classify a command for the profile report: the git subcommand, or the program name."""
+    if os.path.basename(args[0]) != "git":
+        return os.path.basename(args[0])
+
+    # skip global options such as `-c key=value`
+    i = 1
+    while i < len(args) and args[i].startswith("-"):
+        i += 2 if args[i] == "-c" else 1
+    return args[i] if i < len(args) else "git"
+
+
+class Profiler:
+    """Collects wall-clock timings of commands, per-repo phases and whole phases for --profile."""
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        # dicts with repo, step, pool, wait and duration (seconds)
+        self.commands = []
+        # repo -> phase -> seconds
+        self.repo_phases = defaultdict(lambda: defaultdict(float))
+        # phase -> wall seconds
+        self.phases = {}
+
+    def record_command(self, cwd, args, wait, duration, network):
+        self.commands.append({
+            "repo": cwd,
+            "step": get_command_step(args),
+            "pool": "network" if network else "local",
+            "wait": wait,
+            "duration": duration,
+        })
+
+    def record_repo_phase(self, repo, phase, duration):
+        self.repo_phases[repo][phase] += duration
+
+    def record_phase(self, phase, duration):
+        self.phases[phase] = duration
+
+    def summary(self, top=10):
+        by_step = defaultdict(lambda: {"count": 0, "total": 0.0, "max": 0.0})
+        repo_steps = defaultdict(lambda: defaultdict(float))
+        wait_by_pool = defaultdict(float)
+        for command in self.commands:
+            step = by_step[command["step"]]
+            step["count"] += 1
+            step["total"] += command["duration"]
+            step["max"] = max(step["max"], command["duration"])
+            wait_by_pool[command["pool"]] += command["wait"]
+            if command["repo"] is not None:
+                repo_steps[command["repo"]][command["step"]] += command["duration"]
+
+        repos = []
+        for repo, phases in self.repo_phases.items():
+            repos.append({
+                "repo": repo,
+                "total": sum(phases.values()),
+                "phases": dict(phases),
+                "steps": dict(repo_steps.get(repo, {})),
+            })
+        repos.sort(key=lambda r: r["total"], reverse=True)
+
+        return {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "wall": time.perf_counter() - self.started_at,
+            "phases": self.phases,
+            "repo_count": len(self.repo_phases),
+            "command_count": len(self.commands),
+            "by_step": dict(by_step),
+            "queue_wait": {
+                "by_pool": dict(wait_by_pool),
+                "max": max((c["wait"] for c in self.commands), default=0.0),
+            },
+            # repos run concurrently, so the run can be no shorter than its slowest repo
+            "critical_path": repos[0] if repos else None,
+            "slowest_repos": repos[:top],
+        }
+
+    def report(self, output_format, history_file=None):
+        summary = self.summary()
+        history = load_profile_history(history_file) if history_file else []
+        if history_file:
+            append_profile_history(history_file, summary)
+
+        if output_format == "json":
+            print(json.dumps(summary, indent=2))
+            return
+
+        print("------------------- profile -------------------")
+        phases = ", ".join(f"{name} {duration:.2f}s" for name, duration in summary["phases"].items())
+        print(f"Wall: {summary['wall']:.2f}s ({phases}), {summary['command_count']} commands over {summary['repo_count']} repos")
+        waits = ", ".join(f"{pool} {wait:.2f}s" for pool, wait in summary["queue_wait"]["by_pool"].items())
+        print(f"Queue wait: {waits or 'none'} (max single wait {summary['queue_wait']['max']:.2f}s)")
+        if summary["critical_path"]:
+            slowest = summary["critical_path"]
+            print(f"Critical path: {format_repo(slowest['repo'])} {slowest['total']:.2f}s")
+
+        print(f"{'step':<24}{'count':>7}{'total':>10}{'mean':>10}{'max':>10}")
+        for step, stats in sorted(summary["by_step"].items(), key=lambda item: item[1]["total"], reverse=True):
+            mean = stats["total"] / stats["count"]
+            print(f"{step:<24}{stats['count']:>7}{stats['total']:>9.2f}s{mean:>9.2f}s{stats['max']:>9.2f}s")
+
+        print("Slowest repos:")
+        for repo in summary["slowest_repos"]:
+            steps = ", ".join(f"{step} {duration:.2f}s" for step, duration in sorted(repo["steps"].items()))
+            print(f"  {repo['total']:>7.2f}s {format_repo(repo['repo'])} {steps}")
+
+        if history:
+            print("Previous runs:")
+            for run in history[-5:]:
+                phases = ", ".join(f"{name} {duration:.2f}s" for name, duration in run.get("phases", {}).items())
+                print(f"  {run.get('timestamp')}  wall {run.get('wall', 0):.2f}s ({phases}), {run.get('repo_count')} repos")
+
+
+def load_profile_history(path):
+    runs = []
+    try:
+        with open(path, "r") as f:
+            for line in f:
+                try:
+                    runs.append(json.loads(line))
+                except ValueError:
+                    pass
+
+    except OSError:
+        pass
+
+    return runs
+
+
+def append_profile_history(path, summary):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    # per-repo detail would make the history grow with the fleet; keep the aggregates
+    record = {k: v for k, v in summary.items() if k != "slowest_repos"}
+    with open(path, "a") as f:
+        f.write(json.dumps(record) + "\n")
+
+
+_profiler = None
+
+
+async def timed(repo, phase, coro):
+    """Await coro, recording its duration as a phase of repo when profiling."""
+    started_at = time.perf_counter()
+    try:
+        return await coro
+
+    finally:
+        if _profiler is not None:
+            _profiler.record_repo_phase(repo, phase, time.perf_counter() - started_at)
+
+
+async def start_ssh_multiplexer(repos):
+    global _ssh_multiplexer
+    if SSH_MULTIPLEX and _ssh_multiplexer is None:
+        _ssh_multiplexer = SshMultiplexer()
+        await _ssh_multiplexer.start(repos)
+
+
+async def stop_ssh_multiplexer():
+    global _ssh_multiplexer
+    if _ssh_multiplexer is not None:
+        await _ssh_multiplexer.stop()
+        _ssh_multiplexer = None
+
+
+async def run_command(args, check=True, cwd=None, network=False, timeout=None):
+    """Run a command (argv list, no shell) and return (stdout, stderr).
+
+    Waits for a slot in the network or local pool first. Raises
+    subprocess.CalledProcessError on a non-zero exit if check is set, and
+    subprocess.TimeoutExpired if the command outlives its timeout; in both
+    cases, and on cancellation, the process is killed rather than left behind
+    (with its helpers, unless it ran attached to the terminal, see _detach_commands).
+    """
+    if timeout is None:
+        timeout = NETWORK_TIMEOUT if network else LOCAL_TIMEOUT
+
+    queued_at = time.perf_counter()
+    async with (_network_semaphore if network else _local_semaphore):
+        started_at = time.perf_counter()
+        if VERBOSE: print(f"Running command: {subprocess.list2cmdline(args)}")
+        if network and _ssh_multiplexer is not None:
+            _ssh_multiplexer.record(cwd)
+        detached = _detach_commands
+        proc = await asyncio.create_subprocess_exec(
+            *args, stdout=subprocess.PIPE, stderr=subprocess.PIPE, cwd=cwd, start_new_session=detached
         )
-        outtext, outerr = result.stdout, result.stderr
-        out = outtext + outerr
-        if VERBOSE: print(out)
-        return outtext, outerr
+        try:
+            stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout)
 
-    except subprocess.CalledProcessError as e:
+        except asyncio.TimeoutError:
+            kill_command(proc, detached)
+            try:
+                # helpers of an attached command outlive it and may keep its pipes open
+                stdout, stderr = await asyncio.wait_for(proc.communicate(), None if detached else 1)
+            except asyncio.TimeoutError:
+                await proc.wait()
+                stdout, stderr = b"", b""
+            print(f"Command timed out after {timeout}s: {subprocess.list2cmdline(args)}")
+            raise subprocess.TimeoutExpired(args, timeout, stdout.decode(errors="replace"), stderr.decode(errors="replace"))
+
+        except asyncio.CancelledError:
+            kill_command(proc, detached)
+            await proc.wait()
+            raise
+
+        finally:
+            if _profiler is not None:
+                _profiler.record_command(cwd, args, started_at - queued_at, time.perf_counter() - started_at, network)
+
+    outtext, outerr = stdout.decode(errors="replace"), stderr.decode(errors="replace")
+    if VERBOSE: print(outtext + outerr)
+    if check and proc.returncode != 0:
         # always print errors
-        print(e.stdout, e.stderr)
-        raise e
+        print(outtext, outerr)
+        raise subprocess.CalledProcessError(proc.returncode, args, outtext, outerr)
 
+    return outtext, outerr
 
-def get_git_dirty_text(cwd=None):
-    outtext, outerr = run_command("git status", cwd=cwd)
-    out = outtext + (outerr if outerr else "")
-    out_lower = out.strip().lower()
-    if (
-        out_lower.find("nothing to commit") == -1
-        or out_lower.find("your branch is ahead of") != -1
-    ):
-        return out
+
+async def run_blocking(func, *args):
+    """Run blocking local work (e.g. a worktree walk) in a thread, under the local pool.
+
+    The first argument is taken to be the repo path for the profile report.
+    """
+    queued_at = time.perf_counter()
+    async with _local_semaphore:
+        started_at = time.perf_counter()
+        try:
+            return await asyncio.to_thread(func, *args)
+
+        finally:
+            if _profiler is not None:
+                wait, duration = started_at - queued_at, time.perf_counter() - started_at
+                _profiler.record_command(args[0] if args else None, [func.__name__], wait, duration, False)
+
+
+class RepoStatus(pydantic.BaseModel):
+    """Snapshot of a repo parsed from `git status --porcelain=v2 --branch`."""
+    head: Optional[str] = None
+    branch: Optional[str] = None
+    upstream: Optional[str] = None
+    ahead: int = 0
+    behind: int = 0
+    staged: int = 0
+    unstaged: int = 0
+    untracked: int = 0
+    unmerged: int = 0
+    # short-format lines ("XY path") kept for display in the action phase
+    changes: list[str] = []
+
+    @property
+    def has_upstream(self):
+        return self.upstream is not None
+
+    @property
+    def is_dirty(self):
+        return (self.staged + self.unstaged + self.untracked + self.unmerged) > 0
+
+    @property
+    def needs_push(self):
+        return self.is_dirty or self.ahead > 0
+
+    @property
+    def needs_action(self):
+        return self.needs_push or self.behind > 0
+
+    def describe(self):
+        parts = []
+        if self.branch:
+            parts.append(f"branch {self.branch}" + (f" -> {self.upstream}" if self.upstream else " (no upstream)"))
+        else:
+            parts.append("detached HEAD")
+        parts.append(f"ahead {self.ahead}, behind {self.behind}")
+        parts.append(
+            f"{self.staged} staged, {self.unstaged} unstaged, {self.untracked} untracked"
+            + (f", {self.unmerged} unmerged" if self.unmerged else "")
+        )
+        return "\n".join([", ".join(parts)] + [f"  {line}" for line in self.changes])
+
+
+def parse_porcelain_v2_status(text):
+    status = RepoStatus()
+    changes = []
+    for line in text.splitlines():
+        if line.startswith("# "):
+            key, _, value = line[2:].partition(" ")
+            if key == "branch.oid":
+                status.head = None if value == "(initial)" else value
+            elif key == "branch.head":
+                status.branch = None if value == "(detached)" else value
+            elif key == "branch.upstream":
+                status.upstream = value
+            elif key == "branch.ab":
+                ahead, behind = value.split()
+                status.ahead = int(ahead.lstrip("+"))
+                status.behind = int(behind.lstrip("-"))
+
+        elif line.startswith(("1 ", "2 ")):
+            fields = line.split(" ", 8 if line[0] == "1" else 9)
+            xy = fields[1]
+            if xy[0] != ".":
+                status.staged += 1
+            if xy[1] != ".":
+                status.unstaged += 1
+            path = fields[-1]
+            if line[0] == "2":
+                path, _, orig_path = path.partition("\t")
+                path = f"{orig_path} -> {path}"
+            changes.append(f"{xy.replace('.', ' ')} {path}")
+
+        elif line.startswith("u "):
+            fields = line.split(" ", 10)
+            status.unmerged += 1
+            changes.append(f"{fields[1]} {fields[-1]}")
+
+        elif line.startswith("? "):
+            status.untracked += 1
+            changes.append(f"?? {line[2:]}")
+
+    status.changes = changes
+    return status
+
+
+_git_version = None
+
+
+async def get_git_version():
+    global _git_version
+    if _git_version is None:
+        outtext, _ = await run_command(["git", "version"])
+        numbers = outtext.split()[2].split(".")[:2] if len(outtext.split()) > 2 else []
+        _git_version = tuple(int(n) for n in numbers if n.isdigit())
+
+    return _git_version
+
+
+async def get_status_config_args():
+    """Extra `-c` options for git status when fsmonitor mode is enabled.
+
+    The builtin fsmonitor daemon only exists on macOS and Windows (git >= 2.36); the
+    untracked cache works everywhere and is always turned on in this mode.
+    """
+    if not USE_FSMONITOR:
+        return []
+
+    args = ["-c", "core.untrackedCache=true"]
+    if sys.platform in ("darwin", "win32") and await get_git_version() >= (2, 36):
+        args += ["-c", "core.fsmonitor=true"]
+
+    return args
+
+
+async def get_repo_status(repo_path):
+    outtext, _ = await run_command(
+        ["git", *await get_status_config_args(), "status", "--porcelain=v2", "--branch"], cwd=repo_path
+    )
+    return parse_porcelain_v2_status(outtext)
+
+
+def get_local_fingerprint(repo_path, upstream):
+    """Hash everything that can change the result of git status without git being run.
+
+    Covers HEAD, the upstream tracking ref, stat info of the index, the config
+    files and the global and repo-wide exclude files, and a stat-walk of the
+    worktree's tracked files and non-ignored directories.
+    """
+    git_dir = get_git_dir(repo_path)
+    parts = [read_head(git_dir), read_ref(git_dir, "HEAD")]
+    if upstream:
+        parts.append(read_ref(git_dir, f"refs/remotes/{upstream}"))
+
+    for path in [os.path.join(git_dir, "index"), *get_config_files(git_dir), *get_exclude_files(git_dir)]:
+        try:
+            st = os.stat(path)
+            parts.append((path, st.st_mtime_ns, st.st_size))
+        except OSError:
+            parts.append((path, None))
+
+    dir_mtimes, tracked_count, max_tracked_time_ns = walk_worktree(repo_path)
+    parts.extend([sorted(dir_mtimes.items()), tracked_count, max_tracked_time_ns])
+    return hashlib.sha1(json.dumps(parts).encode()).hexdigest()
+
+
+def load_state(path):
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+
+    except (OSError, ValueError):
+        return {}
+
+
+def save_state(path, state):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+async def probe_remote_ref(repo_path, remote_ref):
+    """Return the sha origin currently advertises for remote_ref, or None if unknown."""
+    try:
+        outtext, _ = await run_command(["git", "ls-remote", "origin", remote_ref], cwd=repo_path, network=True)
+
+    except Exception:
+        return None
+
+    for line in outtext.splitlines():
+        sha, _, ref = line.partition("\t")
+        if ref == remote_ref:
+            return sha
 
     return None
 
 
-def check_upstream_commits(repo_path):
+async def can_skip_fetch(repo_path, remote_refs):
+    """Whether the tracked branch on origin is unchanged since the last recorded fetch."""
+    if FORCE_FETCH:
+        return False
+
+    entry = remote_refs.get(repo_path)
+    if not entry or not entry.get("sha"):
+        return False
+
+    # a different branch checked out since last run means a different ref to track
+    if entry.get("branch") != read_head_branch(get_git_dir(repo_path)):
+        return False
+
+    return await probe_remote_ref(repo_path, entry["remote_ref"]) == entry["sha"]
+
+
+def record_remote_ref(repo_path, status, remote_refs):
+    """Remember the fetched sha of the tracked branch so the next run can skip an idle fetch."""
+    if not status.branch or not status.upstream or not status.upstream.startswith("origin/"):
+        remote_refs.pop(repo_path, None)
+        return
+
+    remote_branch = status.upstream[len("origin/"):]
+    remote_refs[repo_path] = {
+        "branch": status.branch,
+        "remote_ref": f"refs/heads/{remote_branch}",
+        "sha": read_ref(get_git_dir(repo_path), f"refs/remotes/origin/{remote_branch}"),
+    }
+
+
+async def fetch_upstream(repo_path):
     try:
-        run_command("git fetch origin", cwd=repo_path)
-        outtext, _ = run_command("git rev-list --count HEAD..@{u}", check=False, cwd=repo_path)
-        count = int(outtext.strip()) if outtext.strip().isdigit() else 0
-        return count
+        await run_command(["git", "fetch", "origin"], cwd=repo_path, network=True)
+        return True
 
     except Exception as e:
-        print(f"Failed to check upstream {format_repo(repo_path)}: {e}")
-        return 0
+        print(f"Failed to fetch upstream {format_repo(repo_path)}: {e}")
+        return False
 
 
 def yn_question(prompt):
     return input(red(f"{prompt} [y/n]: ")).strip().lower() == "y"
 
 
-def get_repo_list():
-    repos = []
-    for pattern in REPOS_TO_CHECK:
-        for p in glob.glob(
-            os.path.abspath(os.path.expanduser(pattern)), recursive=True
-        ):
-            if not os.path.exists(os.path.join(p, ".git")):
-                continue
+class InputNeeded(Exception):
+    """Raised when a repo synced without a human reaches a question."""
+
+
+def defer_question(prompt):
+    raise InputNeeded(prompt)
+
+
+def needs_input(config, status):
+    """Whether syncing this repo will ask anything, assuming every git step succeeds."""
+    if status.behind > 0 and not config.auto_pull:
+        return True
+
+    if status.needs_push and not PULL_ONLY and not config.auto_push:
+        return True
 
-            repos.append(p)
+    return False
 
-    return repos
 
+async def get_local_status(repo_path, scan_index):
+    """Run git status, unless the repo's fingerprint matches its last clean scan.
 
-def check_repo_status(repo_path):
-    """Check status of a single repository and return (repo_path, needs_action, config)"""
+    With --fast-status, an in-process check reading the index and refs directly
+    first tries to prove a small repo clean; git status then only runs for repos
+    with changes, ones the check cannot read, and ones large enough for git status
+    to be faster (see git_status.MAX_INDEX_ENTRIES).
+    """
+    if USE_FSMONITOR:
+        # the walk is what fsmonitor saves us from; let git decide instead
+        return await get_repo_status(repo_path)
+
+    entry = scan_index.get(repo_path)
+    upstream = entry["status"].get("upstream") if entry else None
+    fingerprint = await run_blocking(get_local_fingerprint, repo_path, upstream)
+    if entry and entry["fingerprint"] == fingerprint:
+        if VERBOSE: print(f"{format_repo(repo_path)} unchanged since last clean scan, skipping git status")
+        return RepoStatus(**entry["status"])
+
+    status = None
+    if FAST_STATUS:
+        try:
+            status = RepoStatus(**await run_blocking(read_clean_status, repo_path))
+            if VERBOSE: print(f"{format_repo(repo_path)} clean per index and refs, skipping git status")
+        except NeedsGitStatus as e:
+            if VERBOSE: print(f"{format_repo(repo_path)} running git status ({e})")
+
+    if status is None:
+        status = await get_repo_status(repo_path)
+    if status.needs_action:
+        scan_index.pop(repo_path, None)
+    else:
+        # taken before git status ran, so any edit racing with it forces a rescan next time
+        scan_index[repo_path] = {"fingerprint": fingerprint, "status": model_to_dict(status)}
+
+    return status
+
+
+async def check_repo_status(repo_path, config, remote_refs, scan_index, fetch=True):
+    """Check status of a single repository and return (repo_path, status, config).
+
+    Fetches at most once (skipped when origin's tracked branch has not moved since
+    the sha recorded in remote_refs), then reads everything else from a single
+    porcelain status call, itself skipped for repos unchanged since their last
+    clean scan in scan_index. With fetch=False only local changes are looked at.
+    The status is None if the repo could not be checked.
+    """
     try:
-        config = get_repo_config(repo_path)
-        needs_action = False
+        fetched = False
+        if fetch:
+            if await can_skip_fetch(repo_path, remote_refs):
+                if VERBOSE: print(f"{format_repo(repo_path)} upstream unchanged, skipping fetch")
+            else:
+                fetched = await fetch_upstream(repo_path)
 
-        if get_git_dirty_text(cwd=repo_path) is not None or check_upstream_commits(repo_path) > 0:
-            needs_action = True
+        status = await get_local_status(repo_path, scan_index)
+        if fetched:
+            record_remote_ref(repo_path, status, remote_refs)
 
-        return repo_path, needs_action, config
+        return repo_path, status, config
 
     except Exception as e:
         print(f"Error checking repo {format_repo(repo_path)}: {e}")
-        return repo_path, False, RepoConfig()
+        return repo_path, None, config
 
 
-def main():
-    print("-----------------------------------------------")
-    repo_configs = {}
-    repos = get_repo_list()
+async def commit_and_push(repo_path):
+    await run_command(["git", "add", "-A"], cwd=repo_path)
+    await run_command(["git", "commit", "-m", "update"], check=False, cwd=repo_path)
+    await run_command(["git", "push"], cwd=repo_path, network=True)
+
+
+async def run_sync_step(journal, name, func, log, message, failure):
+    """Run one git step of sync_repo once per journal, logging as it goes; re-raises its error.
+
+    A step already in the journal is not run again: its recorded outcome is
+    replayed silently, so a repo resumed after a deferred question picks up at
+    that question instead of repeating commits, pushes or rebases.
+    """
+    if name not in journal:
+        log(message)
+        try:
+            await func()
+            journal[name] = None
+            log("Done.")
+
+        except Exception as e:
+            journal[name] = e
+            log(failure(e))
+
+    if journal[name] is not None:
+        raise journal[name]
+
+
+async def sync_repo(p, config, status, ask=yn_question, log=print, journal=None):
+    """Pull and/or push a repo that needs action, asking where its config does not say what to do.
+
+    The concurrent automatic pass passes ask=defer_question, which turns any
+    question into InputNeeded, and a log that buffers output until the repo is done.
+    journal records the outcome of each git step run (see run_sync_step); passing
+    the automatic pass's journal back in resumes the repo at its deferred question.
+    """
+    if journal is None:
+        journal = {}
+    log(f"REPO: {format_repo(p)}")
+
+    if status.behind > 0:
+        if config.auto_pull or ask(f"There are {status.behind} commits upstream. Run git pull --ff-only?"):  # noqa
+            try:
+                await run_sync_step(
+                    journal, "pull", lambda: run_command(["git", "pull", "--ff-only"], cwd=p, network=True), log,
+                    "Running git pull --ff-only...", lambda e: f"Fast-forward pull failed: {e}",
+                )
+                status.behind = 0
+
+            except Exception:
+                if ask("Skip this repo? "):
+                    log("Skipped.")
+                    return
+
+                else:
+                    exit(1)
+
+        else:
+            log("Skipped.")
+
+    if not status.needs_push:
+        return
+
+    log(status.describe())
+
+    if PULL_ONLY:
+        log("Pull-only mode: skipping push operations.")
+    elif config.auto_push or ask(
+        f"Repository {format_repo(p)} is dirty. Do you want to push all changes with default commit message?"
+    ):
+        try:
+            await run_sync_step(
+                journal, "push", lambda: commit_and_push(p), log,
+                "Running git commit and push...", lambda e: f"Commit & push failed: {e}",
+            )
+
+        except Exception:
+            if config.auto_rebase_on_failed_push or ask("Try git pull --rebase?"):
+                # questions stay outside the try blocks, so a deferred one is not taken for a git failure
+                try:
+                    await run_sync_step(
+                        journal, "rebase", lambda: run_command(["git", "pull", "--rebase"], cwd=p, network=True), log,
+                        "Running git pull --rebase...", lambda e: "Failed to pull.",
+                    )
+
+                except Exception:
+                    if ask("Skip this repo?"):
+                        log("Skipped.")
+                        return
+
+                    else:
+                        exit(1)
+
+                if config.auto_push or ask("Commit & push again?"):
+                    try:
+                        await run_sync_step(
+                            journal, "push_again", lambda: commit_and_push(p), log,
+                            "Running git commit and push again...", lambda e: f"Push failed again: {e}",
+                        )
+                        return
+
+                    except Exception:
+                        if ask("Skip this repo?"):
+                            log("Skipped.")
+                            return
+
+                        else:
+                            exit(1)
+
+            if ask("Skip this repo?"):
+                log("Skipped.")
+                return
+
+            else:
+                exit(1)
+
+
+async def sync_repo_automatically(p, config, status):
+    """Sync a repo without asking.
+
+    Returns (repo_path, output lines, deferred question or None, journal), the
+    journal to hand to sync_repo to resume at the question.
+    """
+    lines = []
+    journal = {}
+    try:
+        await sync_repo(p, config, status, ask=defer_question, log=lines.append, journal=journal)
+        return p, lines, None, journal
+
+    except InputNeeded as e:
+        return p, lines, str(e), journal
+
+
+def get_active_repos(repo_configs, fleet_config):
+    """List repos to check and fill repo_configs, printing and leaving out the ones configured to be skipped."""
+    repos, configs = discover_repos(fleet_config)
     if not repos:
         print("No repositories found.")
 
-    action_needed = []
-
-    # Separate skipped repos from active repos
     active_repos = []
     for repo in repos:
-        config = get_repo_config(repo)
-        if config.skip:
-            repo_configs[repo] = config
+        repo_configs[repo] = configs[repo]
+        if configs[repo].skip:
             print(f"{format_repo(repo)} ... {blue('skipped')}")
         else:
             active_repos.append(repo)
 
-    # Use parallel processing for initial scan with max 8 workers
-    max_workers = min(MAX_WORKERS, len(active_repos)) if active_repos else 1
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        # Submit all repo status checks
-        future_to_repo = {executor.submit(check_repo_status, repo): repo for repo in active_repos}
-
-        # Process results as they complete
-        for future in as_completed(future_to_repo):
-            repo_path, needs_action, config = future.result()
-            repo_configs[repo_path] = config
-
-            print(f"{format_repo(repo_path)} ... ", end="")
-            if needs_action:
-                print(f"{red('action needed')}")
-                action_needed.append(repo_path)
-            else:
-                print(f"{green('up to date')}")
+    return active_repos
+
 
+async def scan_repos(repos, remote_refs, scan_index, repo_configs, repo_statuses, fetch=True):
+    """Check all repos concurrently and return the ones needing action.
+
+    repo_configs must already hold the config of every repo. The command pools
+    bound the actual parallelism.
+    """
+    action_needed = []
+    tasks = [
+        asyncio.create_task(timed(repo, "scan", check_repo_status(repo, repo_configs[repo], remote_refs, scan_index, fetch)))
+        for repo in repos
+    ]
+
+    # Process results as they complete
+    for next_done in asyncio.as_completed(tasks):
+        repo_path, status, config = await next_done
+        repo_configs[repo_path] = config
+        repo_statuses[repo_path] = status
+
+        print(f"{format_repo(repo_path)} ... ", end="")
+        if status is None:
+            print(f"{red('check failed')}")
+        elif status.needs_action:
+            print(f"{red('action needed')}")
+            action_needed.append(repo_path)
+        else:
+            print(f"{green('up to date')}")
+
+    save_state(REMOTE_REFS_STATE_FILE, remote_refs)
+    save_state(SCAN_INDEX_STATE_FILE, scan_index)
+    return action_needed
+
+
+async def act_on_repos(action_needed, repo_configs, repo_statuses, interactive=True):
+    """Sync repos needing action. Without interactive, repos that need input are only reported."""
+    global _detach_commands
+    # Repos whose config answers every question are synced concurrently; the rest
+    # (and any automatic repo that hits a failure needing a decision) are asked about serially after
+    needing_input = [p for p in action_needed if needs_input(repo_configs[p], repo_statuses[p])]
+    # git steps the automatic pass already ran for a deferred repo, so it resumes at its question
+    journals = {}
+    tasks = [
+        asyncio.create_task(timed(p, "action", sync_repo_automatically(p, repo_configs[p], repo_statuses[p])))
+        for p in action_needed if p not in needing_input
+    ]
+    for next_done in asyncio.as_completed(tasks):
+        p, lines, question, journal = await next_done
+        print("\n".join(lines))
+        if question is not None:
+            print(f"{format_repo(p)} needs input ({question.strip()}), queued for the interactive pass")
+            needing_input.append(p)
+            journals[p] = journal
+
+    for p in needing_input:
+        if interactive:
+            # one repo at a time, so git may prompt on the terminal (ssh passphrases, credentials)
+            _detach_commands = False
+            try:
+                # includes the time spent waiting on answers
+                await timed(p, "interactive", sync_repo(p, repo_configs[p], repo_statuses[p], journal=journals.get(p)))
+            finally:
+                _detach_commands = True
+        else:
+            print(f"{format_repo(p)} ... {red('needs input')}, run without --watch to resolve")
+
+
+async def main():
+    global _profiler
     print("-----------------------------------------------")
-    if not action_needed:
-        print("No action needed.")
+    init_command_pools()
+    if PROFILE:
+        _profiler = Profiler()
+    repo_configs = {}
+    repo_statuses = {}
+    remote_refs = load_state(REMOTE_REFS_STATE_FILE)
+    scan_index = load_state(SCAN_INDEX_STATE_FILE)
 
-    for p in action_needed:
-        config = repo_configs[p]
-        print(f"REPO: {format_repo(p)}")
+    active_repos = get_active_repos(repo_configs, load_fleet_config())
+    await start_ssh_multiplexer(active_repos)
+    try:
+        started_at = time.perf_counter()
+        action_needed = await scan_repos(active_repos, remote_refs, scan_index, repo_configs, repo_statuses)
+        scanned_at = time.perf_counter()
 
-        upstream_count = check_upstream_commits(p)
-        if upstream_count > 0:
-            if config.auto_pull or yn_question(f"There are {upstream_count} commits upstream. Run git pull --ff-only?"):  # noqa
-                try:
-                    print("Running git pull --ff-only...")
-                    run_command("git pull --ff-only", cwd=p)
-                    print("Done.")
+        print("-----------------------------------------------")
+        if not action_needed:
+            print("No action needed.")
 
-                except Exception as e:
-                    print(f"Fast-forward pull failed: {e}")
-                    if yn_question("Skip this repo? "):
-                        print("Skipped.")
-                        continue
+        await act_on_repos(action_needed, repo_configs, repo_statuses)
+        if _profiler is not None:
+            _profiler.record_phase("scan", scanned_at - started_at)
+            _profiler.record_phase("action", time.perf_counter() - scanned_at)
 
-                    else:
-                        exit(1)
+    finally:
+        await stop_ssh_multiplexer()
 
-            else:
-                print("Skipped.")
+    if _profiler is not None:
+        _profiler.report(PROFILE, PROFILE_HISTORY_FILE)
 
-        try:
-            dirty_text = get_git_dirty_text(cwd=p)
-            if dirty_text is not None:
-                print(dirty_text)
 
-            else:
-                continue
+async def discard_own_changes(watcher, repos):
+    """Return repos changed since the last wait, minus the repos we just ran git in.
 
-        except Exception as e:
-            print(f"Failed to check git status: {e}")
-            if yn_question("Skip this repo?"):
-                print("Skipped.")
-                continue
+    Dropping those keeps our own index/ref writes from triggering another sync. An
+    edit the user made during the sync is dropped too, but gets picked up by their
+    next edit or the next upstream check.
+    """
+    return await watcher.wait_for_changes(0) - set(repos)
 
-            else:
-                exit(1)
 
-        if PULL_ONLY:
-            print("Pull-only mode: skipping push operations.")
-        elif config.auto_push or yn_question(
-            f"Repository {format_repo(p)} is dirty. Do you want to push all changes with default commit message?"
-        ):
-            try:
-                print("Running git commit and push...")
-                run_command("git add -A", cwd=p)
-                run_command('git commit -m "update"', check=False, cwd=p)
-                run_command("git push", cwd=p)
-                print("Done.")
-
-            except Exception as e:
-                print(f"Commit & push failed: {e}")
-                if config.auto_rebase_on_failed_push or yn_question("Try git pull --rebase?"):
-                    try:
-                        print("Running git pull --rebase...")
-                        run_command("git pull --rebase", cwd=p)
-                        print("Done.")
-                        if config.auto_push or yn_question("Commit & push again?"):
-                            try:
-                                print("Running git commit and push again...")
-                                run_command("git add -A", cwd=p)
-                                run_command('git commit -m "update"', check=False, cwd=p)
-                                run_command("git push", cwd=p)
-                                print("Done.")
-                                continue
-
-                            except Exception as e:
-                                print(f"Push failed again: {e}")
-                                if yn_question("Skip this repo?"):
-                                    print("Skipped.")
-                                    continue
-
-                                else:
-                                    exit(1)
-
-                    except Exception as e:
-                        print(f"Failed to pull.")
-                        if yn_question("Skip this repo?"):
-                            print("Skipped.")
-                            continue
+async def watch():
+    """Keep running, syncing repos shortly after their files change and checking upstream on a timer.
 
-                        else:
-                            exit(1)
+    Never asks questions: repos whose config does not cover an action are reported
+    and left for a regular run.
+    """
+    init_command_pools()
+    remote_refs = load_state(REMOTE_REFS_STATE_FILE)
+    scan_index = load_state(SCAN_INDEX_STATE_FILE)
+    watcher = None
+    watched_repos = []
+    # repo -> monotonic time of the latest change event not yet synced
+    pending = {}
+    next_upstream_check = 0
 
-                if yn_question("Skip this repo?"):
-                    print("Skipped.")
-                    continue
+    try:
+        while True:
+            now = time.monotonic()
+            if now >= next_upstream_check:
+                print(f"----------------------------------------------- {time.strftime('%H:%M:%S')} upstream check")
+                fleet_config = load_fleet_config()
+                repo_configs = {}
+                repo_statuses = {}
+                active_repos = get_active_repos(repo_configs, fleet_config)
+                if active_repos != watched_repos:
+                    # repos appeared, vanished or changed their skip setting
+                    if watcher is not None:
+                        watcher.close()
+                    watcher = create_watcher(active_repos, WATCH_POLL_INTERVAL)
+                    watched_repos = active_repos
+                    # new repos may bring new hosts
+                    await stop_ssh_multiplexer()
+                    await start_ssh_multiplexer(active_repos)
+                    print(f"Watching {len(watched_repos)} repos ({watcher.kind}).")
+
+                action_needed = await scan_repos(active_repos, remote_refs, scan_index, repo_configs, repo_statuses)
+                await act_on_repos(action_needed, repo_configs, repo_statuses, interactive=False)
+                # fetches touch every repo's git dir, not only the ones acted on
+                pending = dict.fromkeys(await discard_own_changes(watcher, active_repos), time.monotonic())
+                next_upstream_check = time.monotonic() + UPSTREAM_CHECK_INTERVAL
+                continue
 
-                else:
-                    exit(1)
+            deadlines = [next_upstream_check] + [t + WATCH_DEBOUNCE for t in pending.values()]
+            changed = await watcher.wait_for_changes(max(0, min(deadlines) - now))
+            now = time.monotonic()
+            for repo in changed:
+                # every new event pushes the repo's sync back, so a burst of writes syncs once
+                pending[repo] = now
+
+            due = [repo for repo, t in pending.items() if now - t >= WATCH_DEBOUNCE]
+            if not due:
+                continue
+
+            for repo in due:
+                del pending[repo]
+            print(f"----------------------------------------------- {time.strftime('%H:%M:%S')} local changes")
+            # configs are re-read, an edit to one is also a change in its repo
+            repo_configs = {repo: get_repo_config(repo, fleet_config) for repo in due}
+            repo_statuses = {}
+            action_needed = await scan_repos(due, remote_refs, scan_index, repo_configs, repo_statuses, fetch=False)
+            # a repo whose config was edited to skip it is dropped at the next upstream check
+            action_needed = [p for p in action_needed if not repo_configs[p].skip]
+            await act_on_repos(action_needed, repo_configs, repo_statuses, interactive=False)
+            # git status refreshes the index of every repo scanned, not only the ones acted on
+            for repo in await discard_own_changes(watcher, due):
+                pending[repo] = time.monotonic()
+
+    finally:
+        if watcher is not None:
+            watcher.close()
+        await stop_ssh_multiplexer()
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Check repo status and push changes")
     parser.add_argument("-v", "--verbose", action="store_true", help="enable verbose output")
     parser.add_argument("--pull-only", action="store_true", help="only pull changes from remote repos, skip all push operations")
-    parser.add_argument("--max-workers", type=int, default=MAX_WORKERS, help="maximum number of workers to use for parallel processing")
+    parser.add_argument("--max-workers", type=int, default=MAX_WORKERS, help="maximum number of concurrent network operations (fetch/pull/push)")
+    parser.add_argument("--max-local-workers", type=int, default=MAX_LOCAL_WORKERS, help="maximum number of concurrent local git operations")
+    parser.add_argument("--network-timeout", type=float, default=NETWORK_TIMEOUT, help="seconds before a network git command is killed")
+    parser.add_argument("--local-timeout", type=float, default=LOCAL_TIMEOUT, help="seconds before a local git command is killed")
+    parser.add_argument("--force-fetch", action="store_true", help="always fetch, even if the tracked branch on origin looks unchanged")
+    parser.add_argument("--watch", action="store_true", help="keep running and sync repos as their files change (never asks questions)")
+    parser.add_argument("--watch-debounce", type=float, default=WATCH_DEBOUNCE, help="seconds without further changes before a changed repo is synced")
+    parser.add_argument("--upstream-interval", type=float, default=UPSTREAM_CHECK_INTERVAL, help="seconds between upstream checks in watch mode")
+    parser.add_argument("--no-ssh-multiplex", action="store_true", help="do not share one ssh connection per host across git commands")
+    parser.add_argument("--profile", nargs="?", const="table", choices=["table", "json"], help="print per-repo and per-command timings at the end")
+    parser.add_argument("--profile-history", nargs="?", const=DEFAULT_PROFILE_HISTORY_FILE, metavar="FILE", help=f"with --profile, append a run summary to FILE (default {DEFAULT_PROFILE_HISTORY_FILE}) and show recent runs")
+    parser.add_argument("--fleet-config", default=FLEET_CONFIG_FILE, metavar="FILE", help="fleet-wide config with repo patterns and per-pattern overrides")
+    parser.add_argument("--fast-status", action="store_true", help="check the index and refs in-process before running git status")
+    parser.add_argument("--fsmonitor", action="store_true", help="use git's fsmonitor/untracked cache for status instead of the local scan index")
     args = parser.parse_args()
     # set global flags
     VERBOSE = args.verbose
     PULL_ONLY = args.pull_only
     MAX_WORKERS = args.max_workers
+    MAX_LOCAL_WORKERS = args.max_local_workers
+    NETWORK_TIMEOUT = args.network_timeout
+    LOCAL_TIMEOUT = args.local_timeout
+    FORCE_FETCH = args.force_fetch
+    USE_FSMONITOR = args.fsmonitor
+    SSH_MULTIPLEX = not args.no_ssh_multiplex
+    FAST_STATUS = args.fast_status
+    PROFILE = args.profile
+    FLEET_CONFIG_FILE = args.fleet_config
+    PROFILE_HISTORY_FILE = args.profile_history
+    WATCH_DEBOUNCE = args.watch_debounce
+    UPSTREAM_CHECK_INTERVAL = args.upstream_interval
 
-    main()
+    try:
+        asyncio.run(watch() if args.watch else main())
+    except KeyboardInterrupt:
+        # asyncio.run has already cancelled in-flight commands, which kills their processes
+        exit(130)
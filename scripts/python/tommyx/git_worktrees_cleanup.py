@@ -0,0 +1,426 @@
+#!/usr/bin/env python3
+"""Remove the worktrees `-ai -n <branch>` left behind once their branches are done.
+
+Looks at the worktrees under <main repo>-worktrees. One is stale when its
+branch's upstream is gone from the remote (merged and deleted on GitHub), or,
+with --include-merged, when the branch is merged into the base branch (and
+has commits of its own: a fresh branch is reachable from base too); its
+worktree and branch are removed. Registered worktrees whose directory is
+missing are pruned (their branch is kept unless it is stale too).
+
+Upstreams come from one `git config --get-regexp`, the remotes they name are
+pruned concurrently, and remote refs and merged branches are then read from
+one for-each-ref snapshot each. Worktrees with uncommitted changes are
+skipped, removals run in parallel and the branches go in one `git branch -D`.
+
+    -run-tommyx-python-script git_worktrees_cleanup.py --repo . --dry-run --json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from typing import Optional
+
+# max concurrent git status / git worktree remove processes, controlled via command-line
+MAX_WORKERS = min(8, os.cpu_count() or 1)
+# verbose flag, controlled via command-line
+VERBOSE = False
+
+# branches deleted per `git branch -D`, to stay far below the argument length limit
+BRANCH_DELETE_BATCH = 500
+
+
+async def git(args, cwd, check=True):
+    proc = await asyncio.create_subprocess_exec(
+        "git", *args, cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, stdin=subprocess.DEVNULL
+    )
+    stdout, stderr = await proc.communicate()
+    if check and proc.returncode != 0:
+        raise subprocess.CalledProcessError(proc.returncode, ["git", *args], stdout.decode(), stderr.decode())
+    return proc.returncode, stdout.decode(), stderr.decode()
+
+
+def last_line(text: str):
+    lines = [line for line in text.strip().splitlines() if line.strip()]
+    return lines[-1] if lines else ""
+
+
+def parse_worktree_list(output: str):
+    """Parse `git worktree list --porcelain` into dicts (path, head, branch, locked, prunable); the main worktree is first."""
+    worktrees = []
+    for block in output.strip().split("\n\n"):
+        worktree = {"path": None, "head": None, "branch": None, "bare": False, "locked": False, "prunable": False}
+        for line in block.splitlines():
+            key, _, value = line.partition(" ")
+            if key == "worktree":
+                worktree["path"] = value
+            elif key == "HEAD":
+                worktree["head"] = value
+            elif key == "branch":
+                worktree["branch"] = value[len("refs/heads/"):] if value.startswith("refs/heads/") else value
+            elif key in ("bare", "locked", "prunable"):
+                worktree[key] = True
+        if worktree["path"]:
+            worktrees.append(worktree)
+    return worktrees
+
+
+def parse_branch_remotes(output: str):
+    """Return {branch: remote} from `git config --get-regexp '^branch\\..*\\.remote$'`."""
+    remotes = {}
+    for line in output.splitlines():
+        key, _, value = line.partition(" ")
+        # branch names can contain dots, the key's last part cannot
+        branch = key[len("branch."):-len(".remote")]
+        if branch and value:
+            remotes[branch] = value
+    return remotes
+
+
+def parse_ref_snapshot(output: str):
+    """Return ({ref: sha}, {branch: upstream ref}, {symref: target}) from the for-each-ref snapshot."""
+    refs, upstreams, symrefs = {}, {}, {}
+    for line in output.splitlines():
+        ref, sha, upstream, symref = line.split("\0")
+        refs[ref] = sha
+        if ref.startswith("refs/heads/") and upstream:
+            upstreams[ref[len("refs/heads/"):]] = upstream
+        if symref:
+            symrefs[ref] = symref
+    return refs, upstreams, symrefs
+
+
+def find_base(refs: dict, symrefs: dict, remotes: list[str]):
+    """The branch merged work lands on: what origin/HEAD points to, else main or master on a remote."""
+    for remote in sorted(remotes, key=lambda r: r != "origin"):
+        target = symrefs.get(f"refs/remotes/{remote}/HEAD")
+        if target in refs:
+            return target
+    for remote in sorted(remotes, key=lambda r: r != "origin"):
+        for branch in ["main", "master"]:
+            if f"refs/remotes/{remote}/{branch}" in refs:
+                return f"refs/remotes/{remote}/{branch}"
+    return None
+
+
+def short_ref(ref: Optional[str]):
+    for prefix in ["refs/remotes/", "refs/heads/"]:
+        if ref and ref.startswith(prefix):
+            return ref[len(prefix):]
+    return ref
+
+
+async def has_own_commits(branch: str, repo: str):
+    """Whether the branch's reflog shows a commit made on it, not only its creation, resets and fast-forwards."""
+    returncode, stdout, _ = await git(["reflog", "show", "--format=%gs", f"refs/heads/{branch}", "--"], repo, check=False)
+    return returncode == 0 and any(
+        not line.startswith(("branch: ", "reset: ")) and not line.endswith("Fast-forward") for line in stdout.splitlines()
+    )
+
+
+def plan_worktree(worktree: dict, upstreams: dict, refs: dict, merged: set, include_merged: bool):
+    """Decide what to do with one worktree: action "remove", "prune" or "skip", and why."""
+    branch = worktree["branch"]
+    upstream = upstreams.get(branch) if branch else None
+    entry = {"branch": branch, "path": worktree["path"], "upstream": short_ref(upstream), "action": "skip", "reason": None}
+
+    missing = not os.path.isdir(worktree["path"])
+    if branch is None:
+        entry["action"], entry["reason"] = ("prune", "missing directory") if missing else ("skip", "detached HEAD")
+        return entry
+
+    stale = None
+    if upstream and upstream not in refs:
+        stale = f"upstream {short_ref(upstream)} gone"
+    elif include_merged and branch in merged:
+        stale = "merged into base"
+
+    if worktree["locked"]:
+        entry["reason"] = "locked"
+    elif stale:
+        entry["action"], entry["reason"] = "remove", stale + (", missing directory" if missing else "")
+    elif missing:
+        entry["action"], entry["reason"] = "prune", "missing directory"
+    elif not upstream:
+        entry["reason"] = "no upstream" + ("; merged into base, see --include-merged" if branch in merged else "")
+    else:
+        entry["reason"] = f"upstream {short_ref(upstream)} exists" + ("; merged into base, see --include-merged" if branch in merged else "")
+    return entry
+
+
+async def read_state(repo: str, prune: bool, base: Optional[str], timings: dict):
+    """Read worktrees, upstreams, remote refs and merged branches with a fixed number of git calls."""
+    started_at = time.perf_counter()
+    (_, worktree_output, _), (_, remotes_output, _) = await asyncio.gather(
+        git(["worktree", "list", "--porcelain"], repo),
+        # exits 1 when no branch has a remote
+        git(["config", "--get-regexp", r"^branch\..*\.remote$"], repo, check=False),
+    )
+    worktrees = parse_worktree_list(worktree_output)
+    main_repo = worktrees[0]["path"]
+    worktrees_dir = f"{main_repo}-worktrees"
+    managed = [w for w in worktrees[1:] if w["path"] == worktrees_dir or w["path"].startswith(worktrees_dir + os.sep)]
+    branch_remotes = parse_branch_remotes(remotes_output)
+    timings["read_worktrees"] = time.perf_counter() - started_at
+
+    # drop remote-tracking refs of branches deleted on the remote (no fetching), each remote at once
+    started_at = time.perf_counter()
+    remotes = sorted({branch_remotes[w["branch"]] for w in managed if w["branch"] in branch_remotes} - {"."})
+    pruned = {}
+    if prune and managed:
+        results = await asyncio.gather(*(git(["remote", "prune", remote], main_repo, check=False) for remote in remotes))
+        for remote, (returncode, _, stderr) in zip(remotes, results):
+            pruned[remote] = None if returncode == 0 else last_line(stderr)
+            if returncode != 0:
+                print(f"Warning: could not prune {remote}: {last_line(stderr)}", file=sys.stderr)
+    timings["prune_remotes"] = time.perf_counter() - started_at
+
+    started_at = time.perf_counter()
+    _, snapshot, _ = await git(
+        ["for-each-ref", "--format=%(refname)%00%(objectname)%00%(upstream)%00%(symref)", "refs/heads", "refs/remotes"],
+        main_repo,
+    )
+    refs, upstreams, symrefs = parse_ref_snapshot(snapshot)
+    all_remotes = sorted(set(branch_remotes.values()) | {ref.split("/")[2] for ref in refs if ref.startswith("refs/remotes/")} - {"."})
+    if base is None:
+        base = find_base(refs, symrefs, all_remotes)
+    merged = set()
+    if base is not None:
+        returncode, merged_output, stderr = await git(
+            ["for-each-ref", f"--merged={base}", "--format=%(refname:lstrip=2)", "refs/heads"], main_repo, check=False
+        )
+        if returncode != 0:
+            print(f"Warning: not checking merged branches, base {base} unknown: {last_line(stderr)}", file=sys.stderr)
+            base = None
+        merged = set(merged_output.split())
+
+    # reachable from base is not enough: so is a branch without commits of its own, fresh from `-ai -n`
+    candidates = [w["branch"] for w in managed if w["branch"] in merged]
+    if candidates:
+        _, base_sha, _ = await git(["rev-parse", "--verify", "--end-of-options", f"{base}^{{commit}}"], main_repo)
+        semaphore = asyncio.Semaphore(MAX_WORKERS)
+
+        async def check(branch):
+            if refs.get(f"refs/heads/{branch}") == base_sha.strip():
+                return False
+            async with semaphore:
+                return await has_own_commits(branch, main_repo)
+
+        merged = {branch for branch, own in zip(candidates, await asyncio.gather(*(check(b) for b in candidates))) if own}
+    timings["read_refs"] = time.perf_counter() - started_at
+
+    return {
+        "main_repo": main_repo,
+        "worktrees_dir": worktrees_dir,
+        "worktrees": managed,
+        "upstreams": upstreams,
+        "refs": refs,
+        "base": short_ref(base),
+        "merged": merged,
+        "pruned_remotes": pruned,
+    }
+
+
+async def find_dirty(paths: list[str]):
+    """Return {path: first changed file} for the worktrees with uncommitted changes or untracked files."""
+    semaphore = asyncio.Semaphore(MAX_WORKERS)
+
+    async def check(path):
+        async with semaphore:
+            returncode, stdout, stderr = await git(["status", "--porcelain", "--untracked-files=normal"], path, check=False)
+        if returncode != 0:
+            return path, f"git status failed: {last_line(stderr)}"
+        return path, stdout.splitlines()[0][3:] if stdout.strip() else None
+
+    results = await asyncio.gather(*(check(path) for path in paths))
+    return {path: change for path, change in results if change}
+
+
+async def remove_worktrees(main_repo: str, entries: list[dict]):
+    """Run `git worktree remove` for the entries in parallel; sets each entry's "removed" and "error"."""
+    semaphore = asyncio.Semaphore(MAX_WORKERS)
+
+    async def remove(entry):
+        if not os.path.isdir(entry["path"]):
+            # only registered; `git worktree prune` drops it
+            entry["removed"] = True
+            return
+        async with semaphore:
+            returncode, _, stderr = await git(["worktree", "remove", entry["path"]], main_repo, check=False)
+        entry["removed"] = returncode == 0
+        if returncode != 0:
+            entry["error"] = last_line(stderr)
+
+    await asyncio.gather(*(remove(entry) for entry in entries))
+
+
+async def delete_branches(main_repo: str, entries: list[dict]):
+    """Delete the entries' branches with batched `git branch -D`; sets each entry's "branch_deleted"."""
+    by_branch = {entry["branch"]: entry for entry in entries}
+    branches = list(by_branch)
+    for i in range(0, len(branches), BRANCH_DELETE_BATCH):
+        batch = branches[i:i + BRANCH_DELETE_BATCH]
+        # git deletes what it can and reports the rest, one line each
+        _, stdout, stderr = await git(["branch", "-D", "--", *batch], main_repo, check=False)
+        deleted = {line.split()[2] for line in stdout.splitlines() if line.startswith("Deleted branch ")}
+        errors = [line for line in stderr.splitlines() if line.startswith("error:")]
+        for branch in batch:
+            entry = by_branch[branch]
+            entry["branch_deleted"] = branch in deleted
+            if branch not in deleted:
+                entry["error"] = next((line for line in errors if f"'{branch}'" in line), "branch not deleted")
+
+
+async def cleanup(repo: str, dry_run: bool = False, include_merged: bool = False, prune: bool = True,
+                  base: Optional[str] = None, confirm=None):
+    """Plan the cleanup of repo's worktrees and, unless dry_run, carry it out.
+
+    confirm(report) is asked before anything is removed; None removes without
+    asking. Returns the report: the plan entries (with what happened to them),
+    the base used for merged checks and the time spent per phase.
+    """
+    timings = {}
+    state = await read_state(repo, prune, base, timings)
+
+    entries = [
+        plan_worktree(worktree, state["upstreams"], state["refs"], state["merged"], include_merged)
+        for worktree in state["worktrees"]
+    ]
+
+    started_at = time.perf_counter()
+    dirty = await find_dirty([entry["path"] for entry in entries if entry["action"] == "remove" and os.path.isdir(entry["path"])])
+    for entry in entries:
+        if entry["path"] in dirty:
+            entry["action"], entry["reason"] = "skip", f"{entry['reason']}, but has uncommitted changes ({dirty[entry['path']]})"
+    timings["check_dirty"] = time.perf_counter() - started_at
+
+    report = {
+        "main_repo": state["main_repo"],
+        "worktrees_dir": state["worktrees_dir"],
+        "base": state["base"],
+        "pruned_remotes": sorted(state["pruned_remotes"]),
+        "dry_run": dry_run,
+        "worktrees": entries,
+        "timings": timings,
+    }
+
+    to_remove = [entry for entry in entries if entry["action"] == "remove"]
+    to_prune = [entry for entry in entries if entry["action"] == "prune"]
+    if dry_run or not (to_remove or to_prune):
+        return report
+    if confirm is not None and not confirm(report):
+        report["aborted"] = True
+        return report
+
+    started_at = time.perf_counter()
+    await remove_worktrees(state["main_repo"], to_remove)
+    timings["remove_worktrees"] = time.perf_counter() - started_at
+
+    started_at = time.perf_counter()
+    await git(["worktree", "prune"], state["main_repo"])
+    for entry in to_prune:
+        entry["removed"] = not os.path.isdir(entry["path"])
+    timings["prune_worktrees"] = time.perf_counter() - started_at
+
+    started_at = time.perf_counter()
+    await delete_branches(state["main_repo"], [entry for entry in to_remove if entry.get("removed")])
+    timings["delete_branches"] = time.perf_counter() - started_at
+
+    return report
+
+
+def print_report(report: dict):
+    entries = report["worktrees"]
+    if not entries:
+        print(f"No worktrees under {report['worktrees_dir']}.")
+        return
+    for entry in entries:
+        if entry["action"] == "skip":
+            print(f"skip: {entry['branch'] or entry['path']} ({entry['reason']})")
+    for action, title in [("prune", "Worktrees to prune (directory missing, branch kept)"), ("remove", "Worktrees to remove with their branches")]:
+        selected = [entry for entry in entries if entry["action"] == action]
+        if selected:
+            print(f"\n{title}:")
+            for entry in selected:
+                print(f"  {entry['branch'] or entry['path']} ({entry['reason']})")
+
+
+def print_results(report: dict):
+    failed = 0
+    for entry in report["worktrees"]:
+        if entry["action"] == "skip":
+            continue
+        if entry.get("error"):
+            failed += 1
+            print(f"failed: {entry['branch'] or entry['path']}: {entry['error']}")
+        elif VERBOSE:
+            print(f"{entry['action']}d: {entry['branch'] or entry['path']}")
+    done = sum(1 for entry in report["worktrees"] if entry["action"] != "skip") - failed
+    print(f"Done: {done} cleaned up" + (f", {failed} failed." if failed else "."))
+
+
+def ask_confirmation(report: dict):
+    print_report(report)
+    print("")
+    try:
+        return input("Remove these worktrees? [y/N] ").strip().lower() == "y"
+    except EOFError:
+        return False
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Remove worktrees whose branches were merged or deleted on the remote")
+    parser.add_argument("--repo", default=".", help="any worktree of the repository")
+    parser.add_argument("-n", "--dry-run", action="store_true", help="only show what would be removed")
+    parser.add_argument("-y", "--yes", action="store_true", help="remove without asking")
+    parser.add_argument("--json", action="store_true", help="print the plan (and results) as JSON; needs --dry-run or --yes")
+    parser.add_argument("--include-merged", action="store_true", help="also remove branches merged into the base branch")
+    parser.add_argument("--base", help="base branch for --include-merged (default: origin/HEAD, else main or master on a remote)")
+    parser.add_argument("--no-prune", action="store_true", help="do not prune remote-tracking refs first (no network)")
+    parser.add_argument("--max-workers", type=int, default=MAX_WORKERS, help="concurrent git status / worktree remove processes")
+    parser.add_argument("-v", "--verbose", action="store_true", help="list every cleaned up worktree and the time per phase")
+    args = parser.parse_args()
+
+    # set global flags
+    MAX_WORKERS = max(1, args.max_workers)
+    VERBOSE = args.verbose
+
+    if args.json and not (args.dry_run or args.yes):
+        parser.error("--json needs --dry-run or --yes")
+
+    confirm = None if args.yes or args.json else ask_confirmation
+    try:
+        report = asyncio.run(cleanup(
+            os.path.abspath(args.repo), dry_run=args.dry_run, include_merged=args.include_merged,
+            prune=not args.no_prune, base=args.base, confirm=confirm,
+        ))
+
+    except subprocess.CalledProcessError as e:
+        print(f"Error: {' '.join(e.cmd)}: {last_line(e.stderr) or e}", file=sys.stderr)
+        sys.exit(1)
+
+    has_actions = any(entry["action"] != "skip" for entry in report["worktrees"])
+    if args.json:
+        print(json.dumps(report, indent=2))
+    elif report.get("aborted"):
+        print("Aborted.")
+    else:
+        # ask_confirmation already showed the plan
+        if args.dry_run or not has_actions or confirm is None:
+            print_report(report)
+        if not has_actions:
+            print("\nNothing to clean up.")
+        elif not args.dry_run:
+            print("")
+            print_results(report)
+
+    if VERBOSE and not args.json:
+        print(" ".join(f"{phase}={seconds * 1000:.0f}ms" for phase, seconds in report["timings"].items()), file=sys.stderr)
+
+    if any(entry.get("error") for entry in report["worktrees"]):
+        sys.exit(1)
+
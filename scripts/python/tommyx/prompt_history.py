@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""Indexed history of the prompts `-ai` saves in ~/ai-prompts, for the `-ai -r` picker.
+
+Keeps a SQLite index of every prompt (one-line preview, folder/branch tag and
+an FTS5 full-text index), brought up to date by file mtime and size on each
+run, so only new or edited prompts are read. `list` prints the fzf entries
+ranked by recency, with prompts from the current folder (and branch) first;
+`search` ranks by full-text relevance instead.
+
+    -run-tommyx-python-script prompt_history.py list --folder "$(basename "$PWD")"
+"""
+
+import argparse
+import datetime
+import os
+import re
+import sqlite3
+import sys
+import time
+
+# where -ai saves prompts, as YYYY-MM-DD_HH-MM-SS_<folder>[_<branch>].md
+PROMPTS_DIR = os.path.expanduser("~/ai-prompts")
+INDEX_DB = os.path.expanduser("~/.cache/tommyx/prompt_history.sqlite")
+# characters of a prompt kept in its one-line preview, which fzf matches against
+MAX_PREVIEW_CHARS = 4000
+# prompts from the current folder (saved without a branch) rank as if this many times younger, and ...
+FOLDER_BOOST = 10
+# ... those from the current branch of it as if this many times younger again
+BRANCH_BOOST = 3
+
+FILENAME_RE = re.compile(r"^(\d{4}-\d{2}-\d{2}_\d{2}-\d{2}-\d{2})_(.+)\.md$")
+WORD_RE = re.compile(r"\w+")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS prompts (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    created REAL NOT NULL,
+    tag TEXT NOT NULL,
+    preview TEXT NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS prompts_text USING fts5(body);
+"""
+
+# verbose flag, controlled via command-line
+VERBOSE = False
+
+
+def parse_filename(name: str, mtime: float):
+    """Return (created, tag) of a prompt file; files not named by -ai are tagged with their stem."""
+    match = FILENAME_RE.match(name)
+    if match:
+        try:
+            created = datetime.datetime.strptime(match.group(1), "%Y-%m-%d_%H-%M-%S").timestamp()
+            return created, match.group(2)
+        except ValueError:
+            pass
+    return mtime, os.path.splitext(name)[0]
+
+
+def split_tag(tag: str, folders: set[str]):
+    """Split a tag into (folder, branch or None).
+
+    Folder and branch names can both contain "_", so a tag only has a branch
+    when a prefix of it before some "_" is itself a folder seen on its own
+    (the longest one wins); otherwise it is all folder.
+    """
+    for i in range(len(tag) - 1, 0, -1):
+        if tag[i] == "_" and tag[:i] in folders:
+            return tag[:i], tag[i + 1:]
+    return tag, None
+
+
+def make_preview(text: str):
+    return " ".join(text.split())[:MAX_PREVIEW_CHARS]
+
+
+def connect(path: str):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def update_index(conn, prompts_dir: str):
+    """Bring the index in line with prompts_dir, reading only new and changed files.
+
+    Returns (added or changed, removed) counts.
+    """
+    files = {}
+    try:
+        with os.scandir(prompts_dir) as it:
+            for entry in it:
+                if entry.name.endswith(".md") and entry.is_file():
+                    st = entry.stat()
+                    files[entry.name] = (st.st_mtime_ns, st.st_size, entry.path)
+
+    except FileNotFoundError:
+        pass
+
+    indexed = {name: (id, mtime_ns, size) for id, name, mtime_ns, size in conn.execute("SELECT id, name, mtime_ns, size FROM prompts")}
+    changed = [name for name, (mtime_ns, size, _) in files.items() if indexed.get(name, (None,))[1:] != (mtime_ns, size)]
+    removed = [name for name in indexed if name not in files]
+    if not changed and not removed:
+        return 0, 0
+
+    with conn:
+        for name in removed:
+            conn.execute("DELETE FROM prompts_text WHERE rowid = ?", (indexed[name][0],))
+            conn.execute("DELETE FROM prompts WHERE id = ?", (indexed[name][0],))
+
+        for name in changed:
+            mtime_ns, size, path = files[name]
+            try:
+                with open(path, "r", errors="replace") as f:
+                    text = f.read()
+
+            except OSError as e:
+                print(f"Warning: could not read {path}: {e}", file=sys.stderr)
+                continue
+
+            created, tag = parse_filename(name, mtime_ns / 1e9)
+            if name in indexed:
+                conn.execute("DELETE FROM prompts_text WHERE rowid = ?", (indexed[name][0],))
+                conn.execute("DELETE FROM prompts WHERE id = ?", (indexed[name][0],))
+            id = conn.execute(
+                "INSERT INTO prompts (name, mtime_ns, size, created, tag, preview) VALUES (?, ?, ?, ?, ?, ?)",
+                (name, mtime_ns, size, created, tag, make_preview(text)),
+            ).lastrowid
+            conn.execute("INSERT INTO prompts_text (rowid, body) VALUES (?, ?)", (id, text))
+
+    if VERBOSE:
+        print(f"prompt index: {len(changed)} added or changed, {len(removed)} removed", file=sys.stderr)
+    return len(changed), len(removed)
+
+
+def get_boost(tag: str, folder: str | None, branch: str | None):
+    if not folder:
+        return 1
+    if branch and tag == f"{folder}_{branch}":
+        return FOLDER_BOOST * BRANCH_BOOST
+    # no prefix match: with "_" in folder and branch names alike, "app_server" may be another folder
+    if tag == folder:
+        return FOLDER_BOOST
+    return 1
+
+
+def rank_by_recency(rows, folder: str | None, branch: str | None, now: float):
+    """Sort (name, created, tag, preview) rows newest first, boosting the current folder and branch."""
+    # a second's floor keeps prompts saved this second in order
+    return sorted(rows, key=lambda row: (max(now - row[1], 1) / get_boost(row[2], folder, branch), -row[1]))
+
+
+def to_fts_query(query: str):
+    """Match all words of query, each as a prefix, so plain typing works as an FTS5 query."""
+    return " ".join(f'"{word}"*' for word in WORD_RE.findall(query))
+
+
+def search(conn, query: str, folder: str | None = None, branch: str | None = None, limit: int | None = None):
+    """Return (name, created, tag, preview) rows matching every word of query, best first.
+
+    Relevance is FTS5's bm25, scaled up for the current folder and branch.
+    """
+    fts_query = to_fts_query(query)
+    if not fts_query:
+        return []
+    rows = conn.execute(
+        "SELECT prompts.name, prompts.created, prompts.tag, prompts.preview, bm25(prompts_text) "
+        "FROM prompts_text JOIN prompts ON prompts.id = prompts_text.rowid WHERE prompts_text MATCH ?",
+        (fts_query,),
+    ).fetchall()
+    # bm25 is negative, more so for better matches
+    rows.sort(key=lambda row: (row[4] * get_boost(row[2], folder, branch), -row[1]))
+    return [row[:4] for row in rows[:limit]]
+
+
+def list_prompts(conn, folder: str | None = None, branch: str | None = None, limit: int | None = None):
+    rows = conn.execute("SELECT name, created, tag, preview FROM prompts").fetchall()
+    return rank_by_recency(rows, folder, branch, time.time())[:limit]
+
+
+def print_entries(rows, prompts_dir: str):
+    """Print fzf entries: file name, preview and path, tab separated (-ai shows the first two)."""
+    for name, _, _, preview in rows:
+        sys.stdout.write(f"{name}\t{preview}\t{os.path.join(prompts_dir, name)}\n")
+
+
+def print_tags(conn):
+    tags = [tag for tag, in conn.execute("SELECT tag FROM prompts")]
+    folders = set(tags)
+    counts = {}
+    for tag in tags:
+        key = split_tag(tag, folders)
+        counts[key] = counts.get(key, 0) + 1
+    for (folder, branch), count in sorted(counts.items(), key=lambda item: (-item[1], item[0][0], item[0][1] or "")):
+        print(f"{count:6d}  {folder}" + (f"  [{branch}]" if branch else ""))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Index and search the prompts saved by -ai")
+    parser.add_argument("--dir", default=PROMPTS_DIR, help="prompt directory")
+    parser.add_argument("--db", default=INDEX_DB, help="index SQLite file")
+    parser.add_argument("-v", "--verbose", action="store_true", help="report index updates on stderr")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    list_parser = subparsers.add_parser("list", help="print fzf entries, most recent first")
+    search_parser = subparsers.add_parser("search", help="print fzf entries matching all words of a query, best first")
+    search_parser.add_argument("query", nargs="*", help="words to find; each also matches as a prefix")
+    for subparser in [list_parser, search_parser]:
+        subparser.add_argument("--folder", help="rank prompts saved in this folder higher")
+        subparser.add_argument("--branch", help="rank prompts saved for this branch of --folder higher still")
+        subparser.add_argument("-n", "--limit", type=int, help="print at most this many entries")
+    subparsers.add_parser("update", help="only bring the index up to date")
+    subparsers.add_parser("tags", help="count prompts per folder and branch")
+    args = parser.parse_args()
+
+    # set global flags
+    VERBOSE = args.verbose
+
+    prompts_dir = os.path.abspath(os.path.expanduser(args.dir))
+    conn = connect(args.db)
+    changed, removed = update_index(conn, prompts_dir)
+
+    try:
+        if args.command == "list":
+            print_entries(list_prompts(conn, args.folder, args.branch, args.limit), prompts_dir)
+        elif args.command == "search":
+            print_entries(search(conn, " ".join(args.query), args.folder, args.branch, args.limit), prompts_dir)
+        elif args.command == "tags":
+            print_tags(conn)
+        else:
+            print(f"{changed} added or changed, {removed} removed")
+
+    except BrokenPipeError:
+        # fzf exits as soon as a prompt is picked; keep the flush at exit quiet too
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+    finally:
+        conn.close()
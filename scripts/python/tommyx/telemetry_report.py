@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""Latency, cost and approval-wait report from the telemetry store.
+
+Reads the SQLite file call_llm, call_llm_stream, call_llm_many and run_agent
+append to (utils/telemetry.py). Prints percentiles per model and per script,
+and a per-day (or per-week) trend, so a model or config change shows up as a
+step in the numbers. Cached responses are counted but left out of the latency
+percentiles.
+
+Recording is on by default and stays on this machine (~/.cache/tommyx/telemetry.sqlite,
+written from a background thread); set TOMMYX_TELEMETRY=0 to record nothing.
+
+    -run-tommyx-python-script telemetry_report.py --days 14 --period week
+"""
+
+import argparse
+import datetime
+import json
+import os
+import sqlite3
+import sys
+import time
+from collections import defaultdict
+
+from tommyx.utils import telemetry
+
+
+def percentile(values, q):
+    """Linearly interpolated q-th percentile (0-100) of values, None if empty."""
+    values = sorted(v for v in values if v is not None)
+    if not values:
+        return None
+    position = (len(values) - 1) * q / 100
+    low = int(position)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (position - low)
+
+
+def total(values):
+    values = [v for v in values if v is not None]
+    return sum(values) if values else None
+
+
+def period_start(ts, period):
+    date = datetime.date.fromtimestamp(ts)
+    if period == "day":
+        return date.isoformat()
+    year, week, _ = date.isocalendar()
+    return f"{year}-W{week:02d}"
+
+
+def summarize_llm_calls(rows):
+    uncached = [row for row in rows if not row["cached"]]
+    return {
+        "calls": len(rows),
+        "errors": sum(1 for row in rows if row["error"]),
+        "fallbacks": sum(1 for row in rows if row["fallback"]),
+        "cached": len(rows) - len(uncached),
+        "retries": sum(max(0, (row["attempts"] or 1) - 1) for row in uncached),
+        "latency_p50": percentile([row["latency_s"] for row in uncached], 50),
+        "latency_p90": percentile([row["latency_s"] for row in uncached], 90),
+        "latency_p99": percentile([row["latency_s"] for row in uncached], 99),
+        "ttft_p50": percentile([row["time_to_first_token_s"] for row in uncached], 50),
+        "input_tokens": total(row["input_tokens"] for row in rows),
+        "output_tokens": total(row["output_tokens"] for row in rows),
+        "cost_usd": total(row["cost_usd"] for row in rows),
+    }
+
+
+def summarize_sessions(rows):
+    return {
+        "sessions": len(rows),
+        "errors": sum(1 for row in rows if row["is_error"]),
+        "duration_p50": percentile([row["duration_s"] for row in rows], 50),
+        "duration_p90": percentile([row["duration_s"] for row in rows], 90),
+        "turns_p50": percentile([row["num_turns"] for row in rows], 50),
+        "tool_calls": total(row["tool_calls"] for row in rows),
+        "approval_wait_s": total(row["approval_wait_s"] for row in rows),
+        "approval_wait_p90": percentile([row["approval_wait_s"] for row in rows], 90),
+        "cost_usd": total(row["cost_usd"] for row in rows),
+    }
+
+
+def summarize_approvals(rows):
+    asked = [row for row in rows if row["source"] == "asked"]
+    return {
+        "calls": len(rows),
+        "asked": len(asked),
+        "denied": sum(1 for row in rows if not row["allowed"]),
+        "wait_p50": percentile([row["wait_s"] for row in asked], 50),
+        "wait_p90": percentile([row["wait_s"] for row in asked], 90),
+        "wait_total": total(row["wait_s"] for row in asked),
+    }
+
+
+def group(rows, *keys, period=None):
+    groups = defaultdict(list)
+    for row in rows:
+        key = tuple(row[k] for k in keys)
+        if period is not None:
+            key = (period_start(row["ts"], period),) + key
+        groups[key].append(row)
+    return dict(sorted(groups.items(), key=lambda item: tuple(str(k) for k in item[0])))
+
+
+def fmt(value, unit="", digits=2):
+    if value is None:
+        return "-"
+    if isinstance(value, float):
+        return f"{value:.{digits}f}{unit}"
+    return f"{value}{unit}"
+
+
+def print_table(title, header, rows):
+    print(f"\n{title}")
+    if not rows:
+        print("  (no records)")
+        return
+    widths = [max(len(str(cell)) for cell in column) for column in zip(header, *rows)]
+    for line in [header, *rows]:
+        print("  " + "  ".join(f"{cell:<{w}}" if i == 0 else f"{cell:>{w}}" for i, (cell, w) in enumerate(zip(line, widths))))
+
+
+def llm_table_row(name, s):
+    return [
+        name, s["calls"], s["errors"], s["fallbacks"], s["cached"],
+        fmt(s["latency_p50"], "s"), fmt(s["latency_p90"], "s"), fmt(s["latency_p99"], "s"), fmt(s["ttft_p50"], "s"),
+        fmt(s["input_tokens"]), fmt(s["output_tokens"]), fmt(s["cost_usd"], digits=4),
+    ]
+
+
+LLM_HEADER = ["", "calls", "err", "fallback", "cached", "p50", "p90", "p99", "ttft p50", "in tok", "out tok", "cost $"]
+SESSION_HEADER = ["", "sessions", "err", "p50", "p90", "turns p50", "tools", "wait total", "wait p90", "cost $"]
+
+
+def session_table_row(name, s):
+    return [
+        name, s["sessions"], s["errors"], fmt(s["duration_p50"], "s", 1), fmt(s["duration_p90"], "s", 1),
+        fmt(s["turns_p50"], digits=0), fmt(s["tool_calls"]), fmt(s["approval_wait_s"], "s", 1),
+        fmt(s["approval_wait_p90"], "s", 1), fmt(s["cost_usd"], digits=4),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report LLM call and agent session telemetry")
+    parser.add_argument("--days", type=float, default=30, help="only records from the last DAYS days")
+    parser.add_argument("--period", choices=["day", "week"], default="day", help="bucket size of the trend tables")
+    parser.add_argument("--model", help="only LLM calls answered by this model and agent sessions (and their approvals) run on it")
+    parser.add_argument("--script", help="only records from this script, e.g. tommyx.agent_batch")
+    parser.add_argument("--db", default=telemetry.TELEMETRY_DB, help="telemetry SQLite file")
+    parser.add_argument("--json", action="store_true", help="print the summaries as JSON instead of tables")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        print(f"No telemetry recorded yet ({args.db} does not exist).", file=sys.stderr)
+        sys.exit(1)
+
+    conn = telemetry.connect(args.db)
+    conn.row_factory = sqlite3.Row
+
+    def select(query, table, model_column=None):
+        filters, params = [f"{table}.ts >= ?"], [time.time() - args.days * 86400]
+        if args.script:
+            filters.append(f"{table}.script = ?")
+            params.append(args.script)
+        if args.model and model_column:
+            filters.append(f"{table}.{model_column} = ?")
+            params.append(args.model)
+        return [dict(row) for row in conn.execute(f"{query} WHERE {' AND '.join(filters)} ORDER BY {table}.ts", params)]
+
+    calls = select("SELECT * FROM llm_calls", "llm_calls", "model")
+    sessions = select("SELECT * FROM agent_sessions", "agent_sessions", "model")
+    approvals = select(
+        "SELECT tool_approvals.* FROM tool_approvals JOIN agent_sessions ON tool_approvals.session_id = agent_sessions.id",
+        "agent_sessions", "model",
+    )
+    conn.close()
+
+    report = {
+        "llm_by_model": {model: summarize_llm_calls(rows) for (model,), rows in group(calls, "model").items()},
+        "llm_by_script": {script: summarize_llm_calls(rows) for (script,), rows in group(calls, "script").items()},
+        "llm_trend": [
+            {"period": p, "model": model, **summarize_llm_calls(rows)}
+            for (p, model), rows in group(calls, "model", period=args.period).items()
+        ],
+        "sessions_by_script": {script: summarize_sessions(rows) for (script,), rows in group(sessions, "script").items()},
+        "sessions_trend": [
+            {"period": p, **summarize_sessions(rows)} for (p,), rows in group(sessions, period=args.period).items()
+        ],
+        "approvals_by_tool": {tool: summarize_approvals(rows) for (tool,), rows in group(approvals, "tool").items()},
+    }
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"Telemetry of the last {args.days:g} days from {args.db}")
+    print_table("LLM calls by answering model (fallback: calls that landed here after a rate limit; latency excludes cached)", LLM_HEADER,
+                [llm_table_row(name, s) for name, s in report["llm_by_model"].items()])
+    print_table("LLM calls by script", LLM_HEADER,
+                [llm_table_row(name, s) for name, s in report["llm_by_script"].items()])
+    print_table(f"LLM calls per {args.period}", LLM_HEADER,
+                [llm_table_row(f"{t['period']} {t['model']}", t) for t in report["llm_trend"]])
+    print_table("Agent sessions by script", SESSION_HEADER,
+                [session_table_row(name, s) for name, s in report["sessions_by_script"].items()])
+    print_table(f"Agent sessions per {args.period}", SESSION_HEADER,
+                [session_table_row(t["period"], t) for t in report["sessions_trend"]])
+    print_table("Tool approvals by tool (waits are for asked calls)",
+                ["", "calls", "asked", "denied", "wait p50", "wait p90", "wait total"],
+                [[tool, s["calls"], s["asked"], s["denied"], fmt(s["wait_p50"], "s", 1), fmt(s["wait_p90"], "s", 1), fmt(s["wait_total"], "s", 1)]
+                 for tool, s in report["approvals_by_tool"].items()])
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,29 @@
-from openai import OpenAI, RateLimitError
-from pydantic import BaseModel
-from typing import Optional
-import difflib
+# openai, claude_agent_sdk, rich, jiter, asyncio and concurrent.futures are imported
+# where they are used, so importing this module is cheap and needs no OPENAI_API_KEY
+from pydantic import BaseModel, ValidationError, create_model
+from typing import TYPE_CHECKING, Optional
+from collections import deque
 import json
-from claude_agent_sdk import query, ClaudeAgentOptions, ClaudeSDKClient, PermissionResultAllow, PermissionResultDeny
-from claude_agent_sdk._errors import MessageParseError
-from claude_agent_sdk._internal.message_parser import parse_message
-from claude_agent_sdk.types import ResultMessage
-from rich.console import Console
-from rich.text import Text
-from rich.panel import Panel
+import random
+import threading
+import time
+from tommyx.utils import diff, llm_cache, telemetry
+from tommyx.utils.tool_policy import ToolPolicy
 
-openai_client = OpenAI()
+if TYPE_CHECKING:
+    from rich.console import Console
+
+# created on first use, see get_openai_client()
+openai_client = None
+# created on first use by call_llm_many_async
+async_openai_client = None
+
+def get_openai_client():
+    global openai_client
+    if openai_client is None:
+        from openai import OpenAI
+        openai_client = OpenAI()
+    return openai_client
 
 class LLMConfig(BaseModel):
     model: str = "gpt-5.1"
@@ -19,82 +31,608 @@ class LLMConfig(BaseModel):
 
     reasoning_effort: str = "low"
 
+    # on-disk response cache (see llm_cache), off unless asked for
+    cache: bool = False
+    # skip cache lookups but still store the fresh response
+    refresh_cache: bool = False
+    # seconds a cached response stays valid, None for no expiry, 0 to not store responses
+    cache_ttl: Optional[float] = 30 * 24 * 3600
+
     class Config:
         frozen = True
 
-def call_llm(input: list[dict] | str, response_format: Optional[BaseModel] = None, config: LLMConfig = LLMConfig()):
+def normalize_input(input: list[dict] | str):
     if isinstance(input, str):
-        input = [{"role": "user", "content": input}]
+        return [{"role": "user", "content": input}]
+    return input
 
-    args = {
-        "model": config.model,
+def request_args(input: list[dict], config: LLMConfig, model: Optional[str] = None):
+    return {
+        "model": model or config.model,
         "input": input,
         "reasoning": {
             "effort": config.reasoning_effort,
         },
     }
 
+def cache_lookup(input: list[dict], response_format: Optional[BaseModel], config: LLMConfig):
+    """Return (cache key or None, cached result or llm_cache.MISS)."""
+    if not config.cache:
+        return None, llm_cache.MISS
+
+    cache_key = llm_cache.make_key(config.model, input, config.reasoning_effort, response_format)
+    if config.refresh_cache:
+        return cache_key, llm_cache.MISS
+    return cache_key, llm_cache.get(cache_key, response_format)
+
+def cache_store(cache_key: Optional[str], input: list[dict], response_format: Optional[BaseModel], result, config: LLMConfig, model: str):
+    """Store a fresh result under cache_key, from cache_lookup.
+
+    A fallback model's answer goes under that model's own key instead, so it is
+    never served as the requested model's.
+    """
+    if cache_key is None or result is None:
+        return
+    if model != config.model:
+        cache_key = llm_cache.make_key(model, input, config.reasoning_effort, response_format)
+    llm_cache.put(cache_key, result, ttl=config.cache_ttl, model=model)
+
+def call_llm(input: list[dict] | str, response_format: Optional[BaseModel] = None, config: LLMConfig = LLMConfig()):
+    from openai import RateLimitError
+
+    input = normalize_input(input)
+    args = request_args(input, config)
+    started_at = time.perf_counter()
+
+    cache_key, cached = cache_lookup(input, response_format, config)
+    if cached is not llm_cache.MISS:
+        telemetry.record_llm_call("call", config.model, config.model, time.perf_counter() - started_at, cached=True)
+        return cached
+
     def query(args: dict):
         if response_format:
-            response = openai_client.responses.parse(
+            return get_openai_client().responses.parse(
                 **args,
                 text_format=response_format,
             )
-            return response.output_parsed
         else:
-            response = openai_client.responses.create(**args)
-            return response.output_text
+            return get_openai_client().responses.create(**args)
+
+    attempts = 1
+    try:
+        try:
+            response = query(args)
+        except RateLimitError:
+            print(f"Rate limit exceeded for model {config.model}, retrying with fallback model {config.rate_limit_fallback_model}")
+            # Retry once with fallback model
+            args["model"] = config.rate_limit_fallback_model
+            attempts += 1
+            response = query(args)
+
+    except Exception as e:
+        telemetry.record_llm_call("call", config.model, args["model"], time.perf_counter() - started_at, attempts=attempts, error=e)
+        raise
+
+    result = parse_response(response, response_format)
+    telemetry.record_llm_call("call", config.model, args["model"], time.perf_counter() - started_at, response=response, attempts=attempts)
+    cache_store(cache_key, input, response_format, result, config, args["model"])
+    return result
+
+class LLMStreamMetrics(BaseModel):
+    model: Optional[str] = None
+    # seconds from sending the request to the first output delta
+    time_to_first_token: Optional[float] = None
+    # seconds from sending the request to the complete response
+    latency: Optional[float] = None
+    input_tokens: Optional[int] = None
+    output_tokens: Optional[int] = None
+    total_tokens: Optional[int] = None
+    cached: bool = False
+
+partial_models = {}
+
+def get_partial_model(response_format: BaseModel):
+    """response_format with every top-level field optional, to validate output that is still arriving."""
+    if response_format not in partial_models:
+        fields = {name: (Optional[field.annotation], None) for name, field in response_format.model_fields.items()}
+        partial_models[response_format] = create_model(f"Partial{response_format.__name__}", **fields)
+    return partial_models[response_format]
+
+def parse_partial(partial_model: BaseModel, text: str):
+    """Validate incomplete JSON output against partial_model; None while it does not validate yet."""
+    import jiter
+
+    try:
+        return partial_model.model_validate(jiter.from_json(text.encode(), partial_mode="trailing-strings"))
+    except (ValueError, ValidationError):
+        return None
+
+def call_llm_stream(
+    input: list[dict] | str,
+    response_format: Optional[BaseModel] = None,
+    config: LLMConfig = LLMConfig(),
+    metrics: Optional[LLMStreamMetrics] = None,
+):
+    """Like call_llm, but a generator yielding the output as it arrives.
+
+    Without response_format it yields text deltas. With it, it yields a partial
+    object (see get_partial_model) whenever the JSON received so far validates
+    and differs from the last one, and finally the complete response_format
+    instance. metrics, if given, is filled in as the call progresses.
+    """
+    from openai import RateLimitError
+
+    metrics = metrics if metrics is not None else LLMStreamMetrics()
+    input = normalize_input(input)
+    started_at = time.perf_counter()
+
+    cache_key, cached = cache_lookup(input, response_format, config)
+    if cached is not llm_cache.MISS:
+        metrics.model = config.model
+        metrics.cached = True
+        metrics.time_to_first_token = metrics.latency = time.perf_counter() - started_at
+        telemetry.record_llm_call("stream", config.model, config.model, metrics.latency, cached=True)
+        yield cached
+        return
+
+    partial_model = get_partial_model(response_format) if response_format else None
+
+    def stream_model(model: str):
+        metrics.model = model
+        args = request_args(input, config, model)
+        if response_format:
+            args["text_format"] = response_format
+        last_partial = None
+        with get_openai_client().responses.stream(**args) as stream:
+            for event in stream:
+                if event.type != "response.output_text.delta":
+                    continue
+                if metrics.time_to_first_token is None:
+                    metrics.time_to_first_token = time.perf_counter() - started_at
+                if response_format is None:
+                    yield event.delta
+                    continue
+                partial = parse_partial(partial_model, event.snapshot)
+                if partial is not None and partial != last_partial:
+                    last_partial = partial
+                    yield partial
+            return stream.get_final_response()
+
+    try:
+        try:
+            response = yield from stream_model(config.model)
+        except RateLimitError:
+            # once output was yielded, switching models would mix two answers
+            if metrics.time_to_first_token is not None:
+                raise
+            print(f"Rate limit exceeded for model {config.model}, retrying with fallback model {config.rate_limit_fallback_model}")
+            response = yield from stream_model(config.rate_limit_fallback_model)
+
+    except Exception as e:
+        telemetry.record_llm_call(
+            "stream", config.model, metrics.model, time.perf_counter() - started_at,
+            attempts=1 if metrics.model == config.model else 2, time_to_first_token=metrics.time_to_first_token, error=e,
+        )
+        raise
+
+    metrics.latency = time.perf_counter() - started_at
+    telemetry.record_llm_call(
+        "stream", config.model, metrics.model, metrics.latency, response=response,
+        attempts=1 if metrics.model == config.model else 2, time_to_first_token=metrics.time_to_first_token,
+    )
+    usage = getattr(response, "usage", None)
+    if usage is not None:
+        metrics.input_tokens = usage.input_tokens
+        metrics.output_tokens = usage.output_tokens
+        metrics.total_tokens = usage.total_tokens
+
+    result = parse_response(response, response_format)
+    if response_format:
+        yield result
+    cache_store(cache_key, input, response_format, result, config, metrics.model)
+
+class ModelRateLimit(BaseModel):
+    requests_per_minute: Optional[int] = None
+    tokens_per_minute: Optional[int] = None
+
+    class Config:
+        frozen = True
+
+class LLMBatchConfig(BaseModel):
+    max_concurrency: int = 8
+    # budget per model name, e.g. {"gpt-5.1": ModelRateLimit(requests_per_minute=500)}; unlisted models are unlimited
+    rate_limits: dict[str, ModelRateLimit] = {}
+    # attempts per model; an item that keeps hitting rate limits then moves on to the fallback model
+    max_attempts: int = 4
+    # exponential backoff in seconds, used when the server sends no retry-after
+    backoff_base: float = 1.0
+    backoff_max: float = 60.0
+
+    class Config:
+        frozen = True
+
+class LLMCallError(Exception):
+    """One failed item of a call_llm_many batch."""
+    def __init__(self, index: int, model: str, error: Exception):
+        super().__init__(f"item {index} failed on {model}: {error}")
+        self.index = index
+        self.model = model
+        self.error = error
+
+class LLMBatchError(Exception):
+    """Raised by call_llm_many when items failed; results holds every result, with LLMCallError for failed items."""
+    def __init__(self, results: list, failures: list[LLMCallError]):
+        super().__init__(f"{len(failures)} of {len(results)} LLM calls failed, first: {failures[0]}")
+        self.results = results
+        self.failures = failures
+
+def retryable_errors():
+    from openai import APIConnectionError, APITimeoutError, InternalServerError, RateLimitError
+    return (RateLimitError, APIConnectionError, APITimeoutError, InternalServerError)
+
+class RateBudget:
+    """Sliding one-minute request/token budget of one model, shared by the workers of a batch (thread-safe)."""
+    def __init__(self, limit: ModelRateLimit):
+        self.limit = limit
+        self.lock = threading.Lock()
+        # [time, tokens] of requests in the last minute
+        self.window = deque()
+        self.tokens = 0
+        # set from retry-after when the server rate limits us
+        self.blocked_until = 0.0
+
+    def reserve(self, tokens: int):
+        """Reserve a request of about `tokens` tokens.
+
+        Returns (0, entry) if granted, where entry is what settle() corrects
+        once the usage is known, else (seconds to wait before asking again, None).
+        """
+        with self.lock:
+            now = time.monotonic()
+            if now < self.blocked_until:
+                return self.blocked_until - now, None
+
+            while self.window and self.window[0][0] <= now - 60:
+                self.tokens -= self.window.popleft()[1]
+
+            requests_per_minute = self.limit.requests_per_minute
+            tokens_per_minute = self.limit.tokens_per_minute
+            # an empty window always grants, so one oversized request cannot wait forever
+            if self.window and (
+                (requests_per_minute and len(self.window) >= requests_per_minute)
+                or (tokens_per_minute and self.tokens + tokens > tokens_per_minute)
+            ):
+                return max(0.01, self.window[0][0] + 60 - now), None
+
+            entry = [now, tokens]
+            self.window.append(entry)
+            self.tokens += tokens
+            return 0, entry
+
+    def settle(self, entry: list, response):
+        """Replace the estimate of a granted request (its reserve() entry) with the usage the response reports."""
+        usage = getattr(response, "usage", None)
+        actual = getattr(usage, "total_tokens", None)
+        if actual is None:
+            return
+        with self.lock:
+            # entries leave the window oldest first, so the entry is still counted unless older ones are gone
+            if self.window and self.window[0][0] <= entry[0]:
+                self.tokens += actual - entry[1]
+            entry[1] = actual
+
+    def block(self, seconds: float):
+        with self.lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+def estimate_tokens(input: list[dict]):
+    # about 4 characters per token; corrected with the reported usage afterwards
+    return len(json.dumps(input, default=str)) // 4 + 1
+
+def retry_delay(error: Exception, attempt: int, batch_config: LLMBatchConfig):
+    """Seconds to wait before retrying: the server's retry-after if it sent one, else exponential backoff with jitter."""
+    response = getattr(error, "response", None)
+    headers = response.headers if response is not None else {}
+    for header, scale in (("retry-after-ms", 0.001), ("retry-after", 1)):
+        try:
+            return float(headers[header]) * scale
+        except (KeyError, TypeError, ValueError):
+            pass
+
+    return min(batch_config.backoff_max, batch_config.backoff_base * 2 ** attempt) * random.uniform(0.5, 1)
+
+def batch_models(config: LLMConfig):
+    models = [config.model]
+    if config.rate_limit_fallback_model and config.rate_limit_fallback_model != config.model:
+        models.append(config.rate_limit_fallback_model)
+    return models
+
+def parse_response(response, response_format: Optional[BaseModel]):
+    return response.output_parsed if response_format else response.output_text
+
+def finish_batch(outcomes: list, config: LLMConfig, return_exceptions: bool):
+    results = [result for result, _ in outcomes]
+    failures = [result for result in results if isinstance(result, LLMCallError)]
+    fallbacks = sum(1 for result, model in outcomes if model != config.model and not isinstance(result, LLMCallError))
+    if failures or fallbacks:
+        print(
+            f"call_llm_many: {len(results) - len(failures)}/{len(results)} succeeded, "
+            f"{fallbacks} on fallback model {config.rate_limit_fallback_model}, {len(failures)} failed"
+        )
+    if failures and not return_exceptions:
+        raise LLMBatchError(results, failures)
+    return results
+
+def batch_item_steps(index: int, input, response_format, config: LLMConfig, batch_config: LLMBatchConfig, budgets: dict):
+    """Run one item with budget waits, backoff and fallback, leaving the waiting and requests to a driver.
+
+    Yields either seconds to sleep, or (model, request args) for a request, to
+    which the driver sends the response back (or throws the request's error in).
+    Returns (result or LLMCallError, model used); see call_one_in_batch and
+    call_one_in_batch_async for the threaded and asyncio drivers.
+    """
+    from openai import RateLimitError
+
+    input = normalize_input(input)
+    started_at = time.perf_counter()
+    cache_key, cached = cache_lookup(input, response_format, config)
+    if cached is not llm_cache.MISS:
+        telemetry.record_llm_call("batch", config.model, config.model, time.perf_counter() - started_at, cached=True)
+        return cached, config.model
 
+    tokens = estimate_tokens(input)
+    error = None
+    attempts = 0
+    for model in batch_models(config):
+        budget = budgets[model]
+        for attempt in range(batch_config.max_attempts):
+            attempts += 1
+            while True:
+                wait, entry = budget.reserve(tokens)
+                if not wait:
+                    break
+                yield wait
+            try:
+                response = yield model, request_args(input, config, model)
+                result = parse_response(response, response_format)
+            except retryable_errors() as e:
+                error = e
+                delay = retry_delay(e, attempt, batch_config)
+                if isinstance(e, RateLimitError):
+                    budget.block(delay)
+                if attempt + 1 < batch_config.max_attempts:
+                    yield delay
+                continue
+            except Exception as e:
+                # any other error (a bad request, an unparsable response, a bug) fails this item only
+                telemetry.record_llm_call("batch", config.model, model, time.perf_counter() - started_at, attempts=attempts, error=e)
+                return LLMCallError(index, model, e), model
+
+            budget.settle(entry, response)
+            telemetry.record_llm_call("batch", config.model, model, time.perf_counter() - started_at, response=response, attempts=attempts)
+            cache_store(cache_key, input, response_format, result, config, model)
+            return result, model
+
+        # only rate limits move an item on to the fallback model
+        if not isinstance(error, RateLimitError):
+            break
+
+    telemetry.record_llm_call("batch", config.model, model, time.perf_counter() - started_at, attempts=attempts, error=error)
+    return LLMCallError(index, model, error), model
+
+def call_one_in_batch(index: int, input, response_format, config: LLMConfig, batch_config: LLMBatchConfig, budgets: dict, client):
+    """Drive batch_item_steps with blocking sleeps and requests. Returns (result or LLMCallError, model used)."""
+    steps = batch_item_steps(index, input, response_format, config, batch_config, budgets)
+    response, error = None, None
+    try:
+        while True:
+            step = steps.throw(error) if error is not None else steps.send(response)
+            response, error = None, None
+            if not isinstance(step, tuple):
+                time.sleep(step)
+                continue
+            _, args = step
+            try:
+                if response_format:
+                    response = client.responses.parse(**args, text_format=response_format)
+                else:
+                    response = client.responses.create(**args)
+            except Exception as e:
+                error = e
+    except StopIteration as stop:
+        return stop.value
+
+async def call_one_in_batch_async(index: int, input, response_format, config: LLMConfig, batch_config: LLMBatchConfig, budgets: dict, client):
+    """Drive batch_item_steps with asyncio sleeps and requests. Returns (result or LLMCallError, model used)."""
+    import asyncio
+
+    steps = batch_item_steps(index, input, response_format, config, batch_config, budgets)
+    response, error = None, None
     try:
-        return query(args)
-    except RateLimitError:
-        print(f"Rate limit exceeded for model {config.model}, retrying with fallback model {config.rate_limit_fallback_model}")
-        # Retry once with fallback model
-        args["model"] = config.rate_limit_fallback_model
-        return query(args)
+        while True:
+            step = steps.throw(error) if error is not None else steps.send(response)
+            response, error = None, None
+            if not isinstance(step, tuple):
+                await asyncio.sleep(step)
+                continue
+            _, args = step
+            try:
+                if response_format:
+                    response = await client.responses.parse(**args, text_format=response_format)
+                else:
+                    response = await client.responses.create(**args)
+            except Exception as e:
+                error = e
+    except StopIteration as stop:
+        return stop.value
+
+def call_llm_many(
+    inputs: list[list[dict] | str],
+    response_format: Optional[BaseModel] = None,
+    config: LLMConfig = LLMConfig(),
+    batch_config: LLMBatchConfig = LLMBatchConfig(),
+    return_exceptions: bool = False,
+):
+    """call_llm over many inputs on a thread pool; results come back in input order.
+
+    Concurrency is bounded by batch_config.max_concurrency and each model's
+    request/token budget. Retryable errors back off exponentially (or as long as
+    the server's retry-after says), and items that keep getting rate limited
+    move on to the fallback model. Failed items are LLMCallError in the results
+    if return_exceptions, else LLMBatchError is raised once all items finished.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    budgets = {model: RateBudget(batch_config.rate_limits.get(model, ModelRateLimit())) for model in batch_models(config)}
+    # retries are ours to schedule
+    client = get_openai_client().with_options(max_retries=0)
+    with ThreadPoolExecutor(max_workers=batch_config.max_concurrency) as executor:
+        outcomes = list(executor.map(
+            lambda item: call_one_in_batch(item[0], item[1], response_format, config, batch_config, budgets, client),
+            enumerate(inputs),
+        ))
+
+    return finish_batch(outcomes, config, return_exceptions)
+
+async def call_llm_many_async(
+    inputs: list[list[dict] | str],
+    response_format: Optional[BaseModel] = None,
+    config: LLMConfig = LLMConfig(),
+    batch_config: LLMBatchConfig = LLMBatchConfig(),
+    return_exceptions: bool = False,
+):
+    """Async version of call_llm_many, running the items as tasks on the current event loop."""
+    import asyncio
+    from openai import AsyncOpenAI
+
+    global async_openai_client
+    if async_openai_client is None:
+        async_openai_client = AsyncOpenAI()
+
+    budgets = {model: RateBudget(batch_config.rate_limits.get(model, ModelRateLimit())) for model in batch_models(config)}
+    client = async_openai_client.with_options(max_retries=0)
+    semaphore = asyncio.Semaphore(batch_config.max_concurrency)
+
+    async def run(index, input):
+        async with semaphore:
+            return await call_one_in_batch_async(index, input, response_format, config, batch_config, budgets, client)
+
+    outcomes = await asyncio.gather(*(run(index, input) for index, input in enumerate(inputs)))
+    return finish_batch(outcomes, config, return_exceptions)
 
 class AgentConfig(BaseModel):
     permission_mode: str = "default"
     load_project_settings: bool = True
     load_user_settings: bool = True
     override_system_prompt: str | None = None
+    # line diff shown for Edit approvals, a name from diff.DIFF_BACKENDS
+    diff_backend: str = "histogram"
+    # decide tool calls by the rules in the project's and the user's policy files first (see tool_policy)
+    tool_policy: bool = True
 
-def visualize_diff(old_string: str, new_string: str, file_path: str = ""):
-    """Visualize line-based and character-based diff between two strings."""
+# edits with more lines than this (old + new) are only summarized, not diffed
+MAX_DIFF_INPUT_LINES = 100_000
+# diff lines printed for one edit; the hunks past this are only counted
+MAX_DIFF_OUTPUT_LINES = 300
+# replaced blocks up to this many lines get their changed characters highlighted
+MAX_INTRALINE_LINES = 40
+# ... if each line of a pair is at most this long
+MAX_INTRALINE_CHARS = 500
+
+def format_diff_line(prefix: str, line: str, spans: Optional[list[tuple[int, int]]], color: str):
+    """Color a diff line, showing the changed character ranges in spans in reverse video."""
+    line = line.rstrip()
+    if not spans:
+        return f"{color}{prefix}{line}\033[0m"
+
+    parts = [prefix]
+    pos = 0
+    for start, end in spans:
+        start, end = min(start, len(line)), min(end, len(line))
+        if start >= end:
+            continue
+        parts.append(line[pos:start])
+        parts.append(f"\033[7m{line[start:end]}\033[27m")
+        pos = end
+    parts.append(line[pos:])
+    return f"{color}{''.join(parts)}\033[0m"
+
+def format_diff_hunk(group, old_lines: list[str], new_lines: list[str]):
+    """Yield the colored lines of one hunk, highlighting changed characters in small replacements."""
+    yield diff.hunk_header(group)
+    for tag, i1, i2, j1, j2 in group:
+        if tag == "equal":
+            for line in old_lines[i1:i2]:
+                yield f" {line.rstrip()}"
+            continue
+
+        old_spans = [None] * (i2 - i1)
+        new_spans = [None] * (j2 - j1)
+        if tag == "replace" and i2 - i1 <= MAX_INTRALINE_LINES and j2 - j1 <= MAX_INTRALINE_LINES:
+            # pair the removed and added lines in order
+            for k in range(min(i2 - i1, j2 - j1)):
+                old_line, new_line = old_lines[i1 + k].rstrip(), new_lines[j1 + k].rstrip()
+                if len(old_line) <= MAX_INTRALINE_CHARS and len(new_line) <= MAX_INTRALINE_CHARS:
+                    spans = diff.intraline_spans(old_line, new_line)
+                    if spans is not None:
+                        old_spans[k], new_spans[k] = spans
+
+        for line, spans in zip(old_lines[i1:i2], old_spans):
+            yield format_diff_line("-", line, spans, "\033[91m")  # Red for deletions
+        for line, spans in zip(new_lines[j1:j2], new_spans):
+            yield format_diff_line("+", line, spans, "\033[92m")  # Green for additions
+
+def visualize_diff(old_string: str, new_string: str, file_path: str = "", backend: str = "histogram"):
+    """Visualize line-based and character-based diff between two strings.
+
+    backend is a name from diff.DIFF_BACKENDS. Edits too large to diff or to
+    print in full degrade to a summary of their size.
+    """
     old_lines = old_string.splitlines(keepends=True)
     new_lines = new_string.splitlines(keepends=True)
     
     # Line-based unified diff
     print(f"\n   📝 Diff for {file_path if file_path else 'content'}:")
     print("   " + "=" * 70)
+
+    if len(old_lines) + len(new_lines) > MAX_DIFF_INPUT_LINES:
+        print(f"   (too large to diff: {len(old_lines)} lines, {len(old_string)} chars"
+              f" -> {len(new_lines)} lines, {len(new_string)} chars)")
+        print("   " + "=" * 70)
+        return
+
+    opcodes = diff.diff_sequences(old_lines, new_lines, backend)
+    hunks = list(diff.group_opcodes(opcodes, 5))  # 5 context lines
     
     # Unified diff format (like git diff)
-    unified_diff = difflib.unified_diff(
-        old_lines,
-        new_lines,
-        fromfile=f"old: {file_path}" if file_path else "old",
-        tofile=f"new: {file_path}" if file_path else "new",
-        lineterm='',
-        n=5  # context lines
-    )
-    
-    for line in unified_diff:
-        line = line.rstrip()
-        if line.startswith('---') or line.startswith('+++'):
-            print(f"   {line}")
-        elif line.startswith('@@'):
-            print(f"   {line}")
-        elif line.startswith('-'):
-            print(f"   \033[91m{line}\033[0m")  # Red for deletions
-        elif line.startswith('+'):
-            print(f"   \033[92m{line}\033[0m")  # Green for additions
-        elif line.startswith(' '):
+    if hunks:
+        print(f"   --- old: {file_path}" if file_path else "   --- old")
+        print(f"   +++ new: {file_path}" if file_path else "   +++ new")
+
+    printed = 0
+    for index, group in enumerate(hunks):
+        for line in format_diff_hunk(group, old_lines, new_lines):
+            if printed >= MAX_DIFF_OUTPUT_LINES:
+                break
             print(f"   {line}")
+            printed += 1
+        else:
+            continue
+
+        print(f"   ... output truncated, {len(hunks) - index - 1} more hunks not shown")
+        break
+
+    removed = sum(i2 - i1 for tag, i1, i2, _, _ in opcodes if tag in ("replace", "delete"))
+    added = sum(j2 - j1 for tag, _, _, j1, j2 in opcodes if tag in ("replace", "insert"))
+    if printed >= MAX_DIFF_OUTPUT_LINES:
+        print(f"   {len(hunks)} hunks: \033[92m+{added}\033[0m \033[91m-{removed}\033[0m lines")
     
     print("   " + "=" * 70)
 
-def format_message(message, console: Console):
+def format_message(message, console: "Console"):
     """Format and print messages nicely using rich."""
+    from rich.panel import Panel
+
     message_type = type(message).__name__
     
     if message_type == "AssistantMessage":
@@ -175,45 +713,111 @@ def format_message(message, console: Console):
         # Unrecognized message type - print directly
         console.print(str(message))
 
-async def run_agent(cwd: str, prompt: str, config: AgentConfig = AgentConfig()):
+def show_tool_request(tool_name: str, input_params: dict, config: AgentConfig = AgentConfig()):
+    """Print a tool call for approval, as a diff for edits."""
+    print(f"\n🔧 Tool Request:")
+    print(f"   Tool: {tool_name}")
+
+    # Special handling for Edit tool
+    if tool_name == "Edit" and "old_string" in input_params and "new_string" in input_params:
+        file_path = input_params.get("file_path", "")
+        old_string = input_params["old_string"]
+        new_string = input_params["new_string"]
+        
+        visualize_diff(old_string, new_string, file_path, config.diff_backend)
+        
+        # Still show other parameters if any
+        input_params = {k: v for k, v in input_params.items() if k not in ["old_string", "new_string", "file_path"]}
+
+    if input_params:
+        print("   Parameters:")
+        for key, value in input_params.items():
+            display_value = value
+            if isinstance(value, str) and len(value) > 100:
+                display_value = value[:100] + "..."
+            elif isinstance(value, (dict, list)):
+                display_value = json.dumps(value, indent=2)
+            print(f"     {key}: {display_value}")
+
+def ask_tool_approval(tool_name: str, input_params: dict, config: AgentConfig = AgentConfig(), remember: bool = False):
+    """Show a tool call and ask on the terminal; returns "y" to approve, anything else is the reason to deny.
+
+    With remember, "a" is also offered, approving this command or file for the
+    rest of the session (see ToolPolicy).
+    """
+    show_tool_request(tool_name, input_params, config)
+
+    # Get user approval
+    answer = input(f"\n   Approve this tool use? ({'y/a=always/explain' if remember else 'y/explain'}): ")
+
+    if answer.lower() == 'y':
+        print("   ✅ Approved\n")
+    elif remember and answer.lower() == 'a':
+        print("   ✅ Approved, and remembered\n")
+    else:
+        print("   ❌ Denied\n")
+    return answer
+
+async def run_agent(
+    cwd: str,
+    prompt: str,
+    config: AgentConfig = AgentConfig(),
+    console: Optional["Console"] = None,
+    approve=None,
+    on_message=None,
+):
+    """Run one agent session until its result, rendering messages to console (stdout by default).
+
+    approve is an async function (tool_name, input_params) -> answer used instead
+    of asking on the terminal with ask_tool_approval; with config.tool_policy it
+    is only asked about calls the policy rules and remembered answers leave
+    open. on_message is called with every parsed message. Returns the final
+    ResultMessage.
+    """
+    from claude_agent_sdk import ClaudeAgentOptions, ClaudeSDKClient, PermissionResultAllow, PermissionResultDeny
+    from claude_agent_sdk._errors import MessageParseError
+    from claude_agent_sdk._internal.message_parser import parse_message
+    from claude_agent_sdk.types import ResultMessage
+    from rich.console import Console
+
+    async def ask_on_terminal(tool_name: str, input_params: dict):
+        return ask_tool_approval(tool_name, input_params, config, remember=config.tool_policy)
+
+    policy = None
+    if config.tool_policy:
+        policy = ToolPolicy.load(cwd, approve or ask_on_terminal)
+
+    # for telemetry
+    session_started_at = time.monotonic()
+    approvals = []
+    tool_calls = 0
+    model = None
+    result = None
+
     async def prompt_for_tool_approval(tool_name: str, input_params: dict, context: dict):
-        print(f"\n🔧 Tool Request:")
-        print(f"   Tool: {tool_name}")
-
-        original_input_params = input_params
-
-        # Special handling for Edit tool
-        if tool_name == "Edit" and "old_string" in input_params and "new_string" in input_params:
-            file_path = input_params.get("file_path", "")
-            old_string = input_params["old_string"]
-            new_string = input_params["new_string"]
-            
-            visualize_diff(old_string, new_string, file_path)
-            
-            # Still show other parameters if any
-            input_params = {k: v for k, v in input_params.items() if k not in ["old_string", "new_string", "file_path"]}
-
-        if input_params:
-            print("   Parameters:")
-            for key, value in input_params.items():
-                display_value = value
-                if isinstance(value, str) and len(value) > 100:
-                    display_value = value[:100] + "..."
-                elif isinstance(value, (dict, list)):
-                    display_value = json.dumps(value, indent=2)
-                print(f"     {key}: {display_value}")
-
-        # Get user approval
-        answer = input("\n   Approve this tool use? (y/explain): ")
+        started_at = time.monotonic()
+        source = "asked"
+        if policy is not None:
+            # returned with the answer: concurrent approvals would overwrite anything shared
+            answer, source = await policy.approve(tool_name, input_params)
+        elif approve is not None:
+            answer = await approve(tool_name, input_params)
+        else:
+            answer = await ask_on_terminal(tool_name, input_params)
+        approvals.append({
+            "ts": time.time(),
+            "tool": tool_name,
+            "source": source,
+            "allowed": int(answer.lower() == 'y'),
+            "wait_s": time.monotonic() - started_at,
+        })
 
         if answer.lower() == 'y':
-            print("   ✅ Approved\n")
             return PermissionResultAllow(
                 behavior="allow",
-                updated_input=original_input_params
+                updated_input=input_params
             )
         else:
-            print("   ❌ Denied\n")
             return PermissionResultDeny(
                 behavior="deny",
                 message=answer
@@ -240,17 +844,51 @@ async def run_agent(cwd: str, prompt: str, config: AgentConfig = AgentConfig()):
         can_use_tool=prompt_for_tool_approval,
     )
 
-    console = Console()
+    if console is None:
+        console = Console()
     
-    async with ClaudeSDKClient(options=options) as client:
-        await client.query(prompt)
+    try:
+        async with ClaudeSDKClient(options=options) as client:
+            await client.query(prompt)
 
-        async for data in client._query.receive_messages():
-            try:
-                message = parse_message(data)
-            except MessageParseError:
-                console.print(f"[yellow]Warning: unknown message type '{data.get('type')}', skipping[/yellow]")
-                continue
-            format_message(message, console)
-            if isinstance(message, ResultMessage):
-                return
\ No newline at end of file
+            async for data in client._query.receive_messages():
+                try:
+                    message = parse_message(data)
+                except MessageParseError:
+                    console.print(f"[yellow]Warning: unknown message type '{data.get('type')}', skipping[/yellow]")
+                    continue
+                format_message(message, console)
+                if on_message is not None:
+                    on_message(message)
+                for block in getattr(message, "content", None) or []:
+                    if type(block).__name__ == "ToolUseBlock":
+                        tool_calls += 1
+                model = getattr(message, "model", None) or model
+                if isinstance(message, ResultMessage):
+                    result = message
+                    return message
+
+    finally:
+        if policy is not None:
+            console.print(f"[dim]{policy.summary()}[/dim]")
+            policy.save_stats()
+        usage = getattr(result, "usage", None) or {}
+        if result is None:
+            error = "no result"
+        else:
+            error = result.subtype if result.is_error else None
+        telemetry.record_agent_session({
+            "cwd": cwd,
+            "model": model,
+            "duration_s": result.duration_ms / 1000 if result is not None else time.monotonic() - session_started_at,
+            "api_duration_s": result.duration_api_ms / 1000 if result is not None else None,
+            "num_turns": getattr(result, "num_turns", None),
+            "tool_calls": tool_calls,
+            "approvals": len(approvals),
+            "approval_wait_s": sum(approval["wait_s"] for approval in approvals),
+            "input_tokens": usage.get("input_tokens"),
+            "output_tokens": usage.get("output_tokens"),
+            "cost_usd": getattr(result, "total_cost_usd", None),
+            "is_error": int(error is not None),
+            "error": error,
+        }, approvals)
\ No newline at end of file
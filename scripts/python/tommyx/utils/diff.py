@@ -0,0 +1,311 @@
+import difflib
+import time
+from collections import Counter
+
+# seconds spent looking for a minimal diff; regions still open after that are
+# reported as plain replacements, so a pathological edit cannot stall a prompt
+DIFF_TIMEOUT = 1.0
+# regions whose shortest edit provably has more lines than this are reported as
+# plain replacements without searching; Myers' cost grows with the square of it
+MAX_MYERS_EDIT = 2000
+# lines occurring more often than this in a region are never used as histogram anchors
+MAX_CHAIN_LENGTH = 64
+
+
+def trim_region(a, b, alo, ahi, blo, bhi, blocks):
+    """Strip the common prefix and suffix of a region, recording them as matching blocks."""
+    start = alo
+    while alo < ahi and blo < bhi and a[alo] == b[blo]:
+        alo += 1
+        blo += 1
+    if alo > start:
+        blocks.append((start, blo - (alo - start), alo - start))
+
+    end = ahi
+    while ahi > alo and bhi > blo and a[ahi - 1] == b[bhi - 1]:
+        ahi -= 1
+        bhi -= 1
+    if ahi < end:
+        blocks.append((ahi, bhi, end - ahi))
+
+    return alo, ahi, blo, bhi
+
+
+def bisect(a, b, alo, ahi, blo, bhi, deadline):
+    """Find a point on a shortest edit path through a region, in linear space.
+
+    Runs Myers' search from both corners at once until the paths meet (the
+    "middle snake"), keeping only the furthest point per diagonal. Returns the
+    point (x, y) relative to (alo, blo), or None if the deadline passed or the
+    region has nothing in common.
+    """
+    n = ahi - alo
+    m = bhi - blo
+    max_d = (n + m + 1) // 2
+    offset = max_d + 1
+    size = 2 * max_d + 3
+    forward = [-1] * size
+    backward = [-1] * size
+    forward[offset + 1] = 0
+    backward[offset + 1] = 0
+    delta = n - m
+    # with an odd delta the paths meet during a forward step, otherwise during a backward one
+    front = delta % 2 != 0
+    # diagonals that ran off the edge of the grid are skipped from then on
+    k1start = k1end = k2start = k2end = 0
+
+    for d in range(max_d + 1):
+        if deadline is not None and time.monotonic() > deadline:
+            return None
+
+        for k1 in range(-d + k1start, d + 1 - k1end, 2):
+            i = offset + k1
+            if k1 == -d or (k1 != d and forward[i - 1] < forward[i + 1]):
+                x1 = forward[i + 1]
+            else:
+                x1 = forward[i - 1] + 1
+            y1 = x1 - k1
+            while x1 < n and y1 < m and a[alo + x1] == b[blo + y1]:
+                x1 += 1
+                y1 += 1
+            forward[i] = x1
+            if x1 > n:
+                k1end += 2
+            elif y1 > m:
+                k1start += 2
+            elif front:
+                j = offset + delta - k1
+                if 0 <= j < size and backward[j] != -1 and x1 >= n - backward[j]:
+                    return x1, y1
+
+        for k2 in range(-d + k2start, d + 1 - k2end, 2):
+            i = offset + k2
+            if k2 == -d or (k2 != d and backward[i - 1] < backward[i + 1]):
+                x2 = backward[i + 1]
+            else:
+                x2 = backward[i - 1] + 1
+            y2 = x2 - k2
+            while x2 < n and y2 < m and a[ahi - 1 - x2] == b[bhi - 1 - y2]:
+                x2 += 1
+                y2 += 1
+            backward[i] = x2
+            if x2 > n:
+                k2end += 2
+            elif y2 > m:
+                k2start += 2
+            elif not front:
+                j = offset + delta - k2
+                if 0 <= j < size and forward[j] != -1:
+                    x1 = forward[j]
+                    if x1 >= n - x2:
+                        return x1, x1 - (delta - k2)
+
+    return None
+
+
+def min_edit_size(a, b, alo, ahi, blo, bhi):
+    """Return a lower bound on the edit size of a region: lines that cannot all be matched."""
+    counts = Counter(a[alo:ahi])
+    common = 0
+    for item, count in Counter(b[blo:bhi]).items():
+        common += min(count, counts.get(item, 0))
+    return (ahi - alo) + (bhi - blo) - 2 * common
+
+
+def myers_blocks(a, b, alo, ahi, blo, bhi, blocks, deadline):
+    stack = [(alo, ahi, blo, bhi)]
+    while stack:
+        alo, ahi, blo, bhi = trim_region(a, b, *stack.pop(), blocks)
+        if alo == ahi or blo == bhi:
+            continue
+        if ahi - alo + bhi - blo > MAX_MYERS_EDIT and min_edit_size(a, b, alo, ahi, blo, bhi) > MAX_MYERS_EDIT:
+            continue
+
+        split = bisect(a, b, alo, ahi, blo, bhi, deadline)
+        if split is None or split in ((0, 0), (ahi - alo, bhi - blo)):
+            # the rest of the region is a replacement
+            continue
+        x, y = split
+        stack.append((alo, alo + x, blo, blo + y))
+        stack.append((alo + x, ahi, blo + y, bhi))
+
+
+def find_anchor(a, b, alo, ahi, blo, bhi):
+    """Return the common run (i, j, size) around the lines that occur least often in a, or None."""
+    positions = {}
+    for i in range(alo, ahi):
+        positions.setdefault(a[i], []).append(i)
+
+    best = None
+    best_count = MAX_CHAIN_LENGTH + 1
+    j = blo
+    while j < bhi:
+        next_j = j + 1
+        candidates = positions.get(b[j])
+        if candidates is not None and len(candidates) <= best_count:
+            for i in candidates:
+                si, sj = i, j
+                while si > alo and sj > blo and a[si - 1] == b[sj - 1]:
+                    si -= 1
+                    sj -= 1
+                ei, ej = i + 1, j + 1
+                while ei < ahi and ej < bhi and a[ei] == b[ej]:
+                    ei += 1
+                    ej += 1
+
+                count = min(len(positions[a[k]]) for k in range(si, ei))
+                if best is None or count < best_count or (count == best_count and ei - si > best[2]):
+                    best = (si, sj, ei - si)
+                    best_count = count
+                # lines inside this run cannot anchor a better one
+                next_j = max(next_j, ej)
+        j = next_j
+
+    return best
+
+
+def myers_diff(a, b, deadline=None):
+    """Return the matching blocks (i, j, size) of a shortest edit script, using linear space.
+
+    Regions past MAX_MYERS_EDIT or DIFF_TIMEOUT are left as replacements.
+    """
+    blocks = []
+    myers_blocks(a, b, 0, len(a), 0, len(b), blocks, deadline)
+    return blocks
+
+
+def histogram_diff(a, b, deadline=None):
+    """Return matching blocks (i, j, size) the way git's histogram diff pairs lines.
+
+    Splits each region around the longest common run of its rarest lines, so
+    blank lines and braces never anchor a match, and hands regions without any
+    rare line to Myers.
+    """
+    blocks = []
+    stack = [(0, len(a), 0, len(b))]
+    while stack:
+        alo, ahi, blo, bhi = trim_region(a, b, *stack.pop(), blocks)
+        if alo == ahi or blo == bhi:
+            continue
+        if deadline is not None and time.monotonic() > deadline:
+            continue
+
+        anchor = find_anchor(a, b, alo, ahi, blo, bhi)
+        if anchor is None:
+            myers_blocks(a, b, alo, ahi, blo, bhi, blocks, deadline)
+            continue
+        i, j, size = anchor
+        blocks.append(anchor)
+        stack.append((alo, i, blo, j))
+        stack.append((i + size, ahi, j + size, bhi))
+
+    return blocks
+
+
+def difflib_diff(a, b, deadline=None):
+    """Return difflib's matching blocks, as visualize_diff used to.
+
+    Ignores the deadline; quadratic in the worst case, and its autojunk heuristic
+    stops matching frequent lines at all in inputs over 200 lines.
+    """
+    return difflib.SequenceMatcher(None, a, b).get_matching_blocks()[:-1]
+
+
+# name -> function(a, b, deadline) returning matching blocks (i, j, size) in any order
+DIFF_BACKENDS = {
+    "histogram": histogram_diff,
+    "myers": myers_diff,
+    "difflib": difflib_diff,
+}
+
+
+def get_opcodes(blocks, n, m):
+    """Turn matching blocks into difflib-style (tag, i1, i2, j1, j2) opcodes."""
+    merged = []
+    for i, j, size in sorted(blocks):
+        if size == 0:
+            continue
+        if merged and merged[-1][0] + merged[-1][2] == i and merged[-1][1] + merged[-1][2] == j:
+            merged[-1] = (merged[-1][0], merged[-1][1], merged[-1][2] + size)
+        else:
+            merged.append((i, j, size))
+
+    opcodes = []
+    i = j = 0
+    for bi, bj, size in merged + [(n, m, 0)]:
+        if i < bi and j < bj:
+            opcodes.append(("replace", i, bi, j, bj))
+        elif i < bi:
+            opcodes.append(("delete", i, bi, j, bj))
+        elif j < bj:
+            opcodes.append(("insert", i, bi, j, bj))
+        if size:
+            opcodes.append(("equal", bi, bi + size, bj, bj + size))
+        i, j = bi + size, bj + size
+
+    return opcodes
+
+
+def diff_sequences(a, b, backend: str = "histogram", timeout: float | None = DIFF_TIMEOUT):
+    """Return difflib-style opcodes turning sequence a into b."""
+    # compare small ints instead of whole lines
+    ids = {}
+    a_ids = [ids.setdefault(item, len(ids)) for item in a]
+    b_ids = [ids.setdefault(item, len(ids)) for item in b]
+    deadline = time.monotonic() + timeout if timeout is not None else None
+    blocks = DIFF_BACKENDS[backend](a_ids, b_ids, deadline)
+    return get_opcodes(blocks, len(a), len(b))
+
+
+def group_opcodes(opcodes, context: int = 3):
+    """Split opcodes into hunks with up to context lines around each change (like difflib)."""
+    codes = list(opcodes) or [("equal", 0, 1, 0, 1)]
+    # fix up leading and trailing context
+    tag, i1, i2, j1, j2 = codes[0]
+    if tag == "equal":
+        codes[0] = tag, max(i1, i2 - context), i2, max(j1, j2 - context), j2
+    tag, i1, i2, j1, j2 = codes[-1]
+    if tag == "equal":
+        codes[-1] = tag, i1, min(i2, i1 + context), j1, min(j2, j1 + context)
+
+    group = []
+    for tag, i1, i2, j1, j2 in codes:
+        # end the current hunk and start a new one at a long run of equal lines
+        if tag == "equal" and i2 - i1 > 2 * context:
+            group.append((tag, i1, min(i2, i1 + context), j1, min(j2, j1 + context)))
+            yield group
+            group = []
+            i1, j1 = max(i1, i2 - context), max(j1, j2 - context)
+        group.append((tag, i1, i2, j1, j2))
+    if group and not (len(group) == 1 and group[0][0] == "equal"):
+        yield group
+
+
+def format_range(start, stop):
+    """Format a line range like `diff -u` does in hunk headers."""
+    length = stop - start
+    if length == 1:
+        return f"{start + 1}"
+    if length == 0:
+        return f"{start},0"
+    return f"{start + 1},{length}"
+
+
+def hunk_header(group):
+    return f"@@ -{format_range(group[0][1], group[-1][2])} +{format_range(group[0][3], group[-1][4])} @@"
+
+
+def intraline_spans(old: str, new: str, min_similarity: float = 0.5, timeout: float = 0.02):
+    """Return the changed character ranges [(start, end)] of old and of new.
+
+    Returns None if the lines have so little in common that highlighting
+    characters would only add noise.
+    """
+    opcodes = diff_sequences(old, new, "myers", timeout)
+    common = sum(i2 - i1 for tag, i1, i2, _, _ in opcodes if tag == "equal")
+    if len(old) + len(new) == 0 or 2 * common / (len(old) + len(new)) < min_similarity:
+        return None
+
+    old_spans = [(i1, i2) for tag, i1, i2, _, _ in opcodes if tag in ("replace", "delete")]
+    new_spans = [(j1, j2) for tag, _, _, j1, j2 in opcodes if tag in ("replace", "insert")]
+    return old_spans, new_spans
@@ -0,0 +1,224 @@
+import asyncio
+import ctypes
+import ctypes.util
+import errno
+import os
+import struct
+import sys
+
+from tommyx.utils.git import get_git_dir
+from tommyx.utils.git_status import NeedsGitStatus, load_ignore_rules, walk_worktree
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+
+WATCH_MASK = (
+    IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+)
+
+EVENT_HEADER = struct.Struct("iIII")
+
+# inside .git only these change when the user stages, commits or switches branch;
+# objects/ and logs/ would just double the watch count
+GIT_DIRS_TO_WATCH = ["", "refs/heads"]
+
+
+def get_git_paths_to_watch(root):
+    git_dir = get_git_dir(root)
+    return [path for path in (os.path.join(git_dir, name) for name in GIT_DIRS_TO_WATCH) if os.path.isdir(path)]
+
+
+def get_polling_fingerprint(root):
+    stats = []
+    for path in get_git_paths_to_watch(root) + [os.path.join(get_git_dir(root), "index")]:
+        try:
+            st = os.stat(path)
+            stats.append((st.st_mtime_ns, st.st_size))
+        except OSError:
+            stats.append(None)
+
+    return walk_worktree(root), stats
+
+
+class InotifyWatcher:
+    """Watches a set of git worktrees with Linux inotify and reports which of them changed.
+
+    Every directory of each worktree that .gitignore does not exclude is watched
+    (inotify is not recursive), new directories are picked up as they appear, and
+    events for ignored files are dropped. Ignore rules are read when a directory
+    starts being watched; a directory un-ignored later is only watched once the
+    watcher is recreated. Raises OSError if inotify is not available or the
+    per-user watch limit is hit, so callers can fall back to polling.
+    """
+
+    kind = "inotify"
+
+    def __init__(self, roots):
+        if not sys.platform.startswith("linux"):
+            raise OSError(errno.ENOSYS, "inotify is only available on Linux")
+
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+
+        self.roots = list(roots)
+        # watch descriptor -> (root, directory path, path relative to root as bytes, None inside .git)
+        self.watches = {}
+        # root -> IgnoreRules, None to watch everything where they cannot be read here
+        self.ignore_rules = {}
+        self.changed = set()
+        self.event = asyncio.Event()
+        try:
+            for root in self.roots:
+                try:
+                    self.ignore_rules[root] = load_ignore_rules(root)
+                except (NeedsGitStatus, OSError, ValueError):
+                    self.ignore_rules[root] = None
+                self._add_tree(root, b"")
+                for git_path in get_git_paths_to_watch(root):
+                    self._add_watch(root, git_path, None)
+
+        except OSError:
+            os.close(self.fd)
+            raise
+
+        asyncio.get_running_loop().add_reader(self.fd, self._on_readable)
+
+    def _add_watch(self, root, path, rel_dir):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK | IN_ONLYDIR)
+        if wd < 0:
+            err = ctypes.get_errno()
+            if err in (errno.ENOENT, errno.ENOTDIR, errno.EACCES):
+                # gone or unreadable by the time we got here; nothing to watch
+                return
+            raise OSError(err, f"inotify_add_watch {path}: {os.strerror(err)}")
+
+        self.watches[wd] = (root, path, rel_dir)
+
+    def _is_ignored(self, root, rel_path, is_dir):
+        ignore_rules = self.ignore_rules.get(root)
+        return ignore_rules is not None and ignore_rules.is_ignored(rel_path, is_dir)
+
+    def _add_tree(self, root, rel_dir):
+        """Watch the directory rel_dir (bytes, relative to root) and the ones below it not ignored."""
+        ignore_rules = self.ignore_rules.get(root)
+        stack = [rel_dir]
+        while stack:
+            rel_dir = stack.pop()
+            path = os.path.join(root, os.fsdecode(rel_dir)) if rel_dir else root
+            self._add_watch(root, path, rel_dir)
+            if ignore_rules is not None:
+                ignore_rules.load_dir(rel_dir)
+            try:
+                with os.scandir(os.fsencode(path)) as it:
+                    for entry in it:
+                        if entry.name != b".git" and entry.is_dir(follow_symlinks=False):
+                            rel_path = rel_dir + b"/" + entry.name if rel_dir else entry.name
+                            if not self._is_ignored(root, rel_path, True):
+                                stack.append(rel_path)
+
+            except OSError:
+                pass
+
+    def _on_readable(self):
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return
+
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, name_len = EVENT_HEADER.unpack_from(data, offset)
+            name = data[offset + EVENT_HEADER.size:offset + EVENT_HEADER.size + name_len].rstrip(b"\0")
+            offset += EVENT_HEADER.size + name_len
+
+            if mask & IN_Q_OVERFLOW:
+                # events were dropped, so anything may have changed
+                self.changed.update(self.roots)
+                continue
+
+            watch = self.watches.get(wd)
+            if watch is None:
+                continue
+
+            root, path, rel_dir = watch
+            if mask & IN_IGNORED:
+                del self.watches[wd]
+                continue
+
+            rel_path = rel_dir + b"/" + name if rel_dir else name
+            if rel_dir is not None and name and self._is_ignored(root, rel_path, bool(mask & IN_ISDIR)):
+                continue
+
+            self.changed.add(root)
+            if rel_dir is not None and mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO) and name != b".git":
+                try:
+                    self._add_tree(root, rel_path)
+                except OSError as e:
+                    print(f"Warning: cannot watch new directory in {root}: {e}", file=sys.stderr)
+
+        if self.changed:
+            self.event.set()
+
+    async def wait_for_changes(self, timeout):
+        """Wait up to timeout seconds for changes and return the set of changed roots."""
+        if not self.changed:
+            try:
+                await asyncio.wait_for(self.event.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+        changed, self.changed = self.changed, set()
+        self.event.clear()
+        return changed
+
+    def close(self):
+        asyncio.get_running_loop().remove_reader(self.fd)
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    """Fallback watcher that re-walks every worktree on an interval and compares stat fingerprints."""
+
+    kind = "polling"
+
+    def __init__(self, roots, interval=10.0):
+        self.roots = list(roots)
+        self.interval = interval
+        self.fingerprints = {root: get_polling_fingerprint(root) for root in self.roots}
+
+    async def wait_for_changes(self, timeout):
+        await asyncio.sleep(min(timeout, self.interval))
+        changed = set()
+        for root in self.roots:
+            fingerprint = await asyncio.to_thread(get_polling_fingerprint, root)
+            if fingerprint != self.fingerprints.get(root):
+                self.fingerprints[root] = fingerprint
+                changed.add(root)
+
+        return changed
+
+    def close(self):
+        pass
+
+
+def create_watcher(roots, poll_interval=10.0):
+    """Return an InotifyWatcher if possible, else a PollingWatcher. Must be called inside the event loop."""
+    try:
+        return InotifyWatcher(roots)
+
+    except OSError as e:
+        print(f"Warning: inotify unavailable ({e}), falling back to polling every {poll_interval}s", file=sys.stderr)
+        return PollingWatcher(roots, poll_interval)
@@ -0,0 +1,340 @@
+import fnmatch
+import glob
+import os
+
+
+def get_git_dir(repo_path):
+    """Return the git dir of a worktree, following `.git` files used by linked worktrees."""
+    git_path = os.path.join(repo_path, ".git")
+    if os.path.isfile(git_path):
+        with open(git_path, "r") as f:
+            content = f.read().strip()
+        if content.startswith("gitdir:"):
+            return os.path.normpath(os.path.join(repo_path, content[len("gitdir:"):].strip()))
+
+    return git_path
+
+
+def get_common_dir(git_dir):
+    """Return the dir holding shared refs and objects (differs from git_dir for linked worktrees)."""
+    commondir_file = os.path.join(git_dir, "commondir")
+    if os.path.isfile(commondir_file):
+        with open(commondir_file, "r") as f:
+            return os.path.normpath(os.path.join(git_dir, f.read().strip()))
+
+    return git_dir
+
+
+def read_head(git_dir):
+    """Return the raw contents of HEAD ("ref: refs/heads/..." or a commit sha), or None."""
+    try:
+        with open(os.path.join(git_dir, "HEAD"), "r") as f:
+            return f.read().strip()
+
+    except OSError:
+        return None
+
+
+def read_head_branch(git_dir):
+    """Return the checked out branch name, or None if HEAD is detached or unreadable."""
+    head = read_head(git_dir)
+    if head and head.startswith("ref: refs/heads/"):
+        return head[len("ref: refs/heads/"):]
+
+    return None
+
+
+def read_packed_refs(common_dir):
+    refs = {}
+    try:
+        with open(os.path.join(common_dir, "packed-refs"), "r") as f:
+            for line in f:
+                if line.startswith(("#", "^")):
+                    continue
+                sha, _, ref = line.strip().partition(" ")
+                if ref:
+                    refs[ref] = sha
+
+    except OSError:
+        pass
+
+    return refs
+
+
+def read_ref(git_dir, ref):
+    """Resolve a full ref name (e.g. refs/remotes/origin/main) to a sha without spawning git.
+
+    Looks at loose refs first, then packed-refs. Symbolic refs are followed.
+    Returns None if the ref does not exist.
+    """
+    common_dir = get_common_dir(git_dir)
+    for _ in range(10):
+        # HEAD and other pseudo refs are per-worktree, everything under refs/ is shared
+        base_dir = git_dir if not ref.startswith("refs/") else common_dir
+        try:
+            with open(os.path.join(base_dir, ref), "r") as f:
+                value = f.read().strip()
+
+        except OSError:
+            return read_packed_refs(common_dir).get(ref)
+
+        if not value.startswith("ref: "):
+            return value or None
+        ref = value[len("ref: "):]
+
+    return None
+
+
+def walk_worktree_mtimes(repo_path):
+    """Stat-walk a worktree (skipping .git) without spawning git.
+
+    Returns (dir_mtimes, file_count, max_file_time_ns). dir_mtimes maps each
+    directory's relative path to its mtime, which catches files being created,
+    deleted or renamed; the newest file mtime/ctime catches in-place edits,
+    which do not touch the parent directory.
+    """
+    dir_mtimes = {}
+    file_count = 0
+    max_file_time_ns = 0
+    stack = [repo_path]
+    while stack:
+        path = stack.pop()
+        try:
+            dir_mtimes[os.path.relpath(path, repo_path)] = os.stat(path).st_mtime_ns
+            with os.scandir(path) as it:
+                for entry in it:
+                    if entry.name == ".git":
+                        continue
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    else:
+                        st = entry.stat(follow_symlinks=False)
+                        file_count += 1
+                        max_file_time_ns = max(max_file_time_ns, st.st_mtime_ns, st.st_ctime_ns)
+
+        except OSError:
+            # vanished while walking; record it so the fingerprint cannot match
+            dir_mtimes[os.path.relpath(path, repo_path)] = -1
+
+    return dir_mtimes, file_count, max_file_time_ns
+
+
+def parse_config_file(path):
+    """Parse a git config file into a list of (section, subsection, key, value) in file order.
+
+    Section and key names are lowercased, subsections keep their case. A key
+    without `=` has the value "" (git reads it as true). Returns [] if the file
+    cannot be read.
+    """
+    entries = []
+    current = (None, None)
+    try:
+        with open(path, "r") as f:
+            lines = f.readlines()
+
+    except (OSError, UnicodeDecodeError):
+        return entries
+
+    for line in lines:
+        line = line.strip()
+        if not line or line[0] in "#;":
+            continue
+
+        if line.startswith("["):
+            header = line[1:line.find("]")].strip()
+            name, _, sub = header.partition(" ")
+            current = (name.lower(), sub.strip().strip('"') if sub else None)
+            continue
+
+        name, _, raw = line.partition("=")
+        raw = raw.strip()
+        if raw.startswith('"') and raw.count('"') >= 2:
+            value = raw[1:raw.index('"', 1)]
+        else:
+            for marker in (" #", " ;"):
+                if marker in raw:
+                    raw = raw[:raw.index(marker)]
+            value = raw.strip()
+        entries.append((current[0], current[1], name.strip().lower(), value))
+
+    return entries
+
+
+def _lookup_config(entries, section, subsection, key):
+    value = None
+    for entry_section, entry_subsection, entry_key, entry_value in entries:
+        if (entry_section, entry_subsection, entry_key) == (section.lower(), subsection, key.lower()):
+            value = entry_value
+
+    return value
+
+
+def read_config_value(git_dir, section, subsection, key):
+    """Look up a value in the repo's own config file, e.g. ("remote", "origin", "url").
+
+    A plain-text reader for the common case: include directives, url.<base>.insteadOf
+    and global/system config are not looked at. Returns the last matching value or None.
+    """
+    return _lookup_config(parse_config_file(os.path.join(get_common_dir(git_dir), "config")), section, subsection, key)
+
+
+def get_config_files(git_dir):
+    """Return the config files git reads for a repo, lowest precedence first (system, global, repo)."""
+    files = []
+    if not os.environ.get("GIT_CONFIG_NOSYSTEM"):
+        files.append(os.environ.get("GIT_CONFIG_SYSTEM", "/etc/gitconfig"))
+    if "GIT_CONFIG_GLOBAL" in os.environ:
+        files.append(os.environ["GIT_CONFIG_GLOBAL"])
+    else:
+        xdg_config_home = os.environ.get("XDG_CONFIG_HOME") or os.path.expanduser("~/.config")
+        files += [os.path.join(xdg_config_home, "git", "config"), os.path.expanduser("~/.gitconfig")]
+    files.append(os.path.join(get_common_dir(git_dir), "config"))
+    return files
+
+
+def read_effective_config(git_dir):
+    """Return the merged config entries of system, global and repo config, lowest precedence first.
+
+    Include directives are not followed; check for "include"/"includeif" sections
+    where that matters.
+    """
+    entries = []
+    for path in get_config_files(git_dir):
+        entries += parse_config_file(path)
+
+    return entries
+
+
+def get_config_value(entries, section, subsection, key, default=None):
+    """Look up a value in entries from parse_config_file or read_effective_config."""
+    value = _lookup_config(entries, section, subsection, key)
+    return default if value is None else value
+
+
+def get_config_bool(entries, section, subsection, key, default=False):
+    value = _lookup_config(entries, section, subsection, key)
+    if value is None:
+        return default
+
+    return value.lower() in ("", "true", "yes", "on", "1")
+
+
+def parse_ssh_remote(url):
+    """Return (user, host, port) for an SSH remote URL, or None for other transports.
+
+    Handles ssh:// URLs and the scp-like user@host:path form; user and port may be None.
+    """
+    if not url:
+        return None
+
+    for scheme in ("ssh://", "git+ssh://", "ssh+git://"):
+        if url.startswith(scheme):
+            authority = url[len(scheme):].split("/", 1)[0]
+            user, _, hostport = authority.rpartition("@")
+            if hostport.startswith("["):
+                host, _, rest = hostport[1:].partition("]")
+                port = rest[1:] if rest.startswith(":") else None
+            else:
+                host, _, port = hostport.partition(":")
+            return user or None, host, port or None
+
+    if "://" in url:
+        return None
+
+    # scp-like syntax: a colon before any slash, and not a Windows drive letter
+    before, sep, _ = url.partition(":")
+    if not sep or "/" in before or len(before) <= 1:
+        return None
+
+    user, _, host = before.rpartition("@")
+    return user or None, host, None
+
+
+def is_repo(path):
+    """Whether path is a git worktree root (`.git` dir, or `.git` file for linked worktrees)."""
+    return os.path.lexists(os.path.join(path, ".git"))
+
+
+def find_repos(pattern, nested=False, visited_dirs=None):
+    """Find git worktrees matching a glob pattern, using os.scandir instead of glob.
+
+    Supports `*`, `?`, `[...]` per path component and `**` for any depth. A `**`
+    descent stops at repository boundaries unless nested is set, so it never walks
+    through repo worktrees looking for more repos. Like glob, wildcards do not
+    match names starting with a dot.
+
+    If visited_dirs is a dict, it is filled with the mtime of every directory whose
+    listing or `.git` presence the result depends on, so callers can cache the result
+    and revalidate it with stats alone.
+    """
+    parts = os.path.abspath(os.path.expanduser(pattern)).split(os.sep)
+    base = os.sep
+    # literal leading components need no listing
+    while parts and not glob.has_magic(parts[0]):
+        base = os.path.join(base, parts.pop(0))
+
+    repos = []
+    _match_repos(base, parts, nested, visited_dirs, repos, in_globstar=False)
+    return sorted(set(repos))
+
+
+def _record_dir(path, visited_dirs):
+    if visited_dirs is None:
+        return True
+
+    try:
+        visited_dirs[path] = os.stat(path).st_mtime_ns
+        return True
+
+    except OSError:
+        visited_dirs[path] = None
+        return False
+
+
+def _list_subdirs(path, pattern_part, follow_symlinks=True):
+    try:
+        with os.scandir(path) as it:
+            entries = [entry for entry in it if entry.is_dir(follow_symlinks=follow_symlinks)]
+
+    except OSError:
+        return []
+
+    hidden_ok = pattern_part.startswith(".")
+    return [
+        entry.path for entry in entries
+        if entry.name != ".git" and (hidden_ok or not entry.name.startswith(".")) and fnmatch.fnmatchcase(entry.name, pattern_part)
+    ]
+
+
+def _match_repos(path, parts, nested, visited_dirs, repos, in_globstar):
+    if not parts:
+        # the .git check depends on this directory's entries
+        _record_dir(path, visited_dirs)
+        if is_repo(path):
+            repos.append(path)
+        return
+
+    part, rest = parts[0], parts[1:]
+    if part == "**":
+        # zero directories
+        _match_repos(path, rest, nested, visited_dirs, repos, in_globstar=True)
+        if in_globstar and not nested and is_repo(path):
+            return
+        if not _record_dir(path, visited_dirs):
+            return
+        # like glob, `**` does not follow symlinks, which also keeps it out of cycles
+        for subdir in _list_subdirs(path, "*", follow_symlinks=False):
+            _match_repos(subdir, parts, nested, visited_dirs, repos, in_globstar=True)
+
+    elif glob.has_magic(part):
+        if not _record_dir(path, visited_dirs):
+            return
+        for subdir in _list_subdirs(path, part):
+            _match_repos(subdir, rest, nested, visited_dirs, repos, in_globstar=False)
+
+    else:
+        # whether the directory exists depends on its parent's entries
+        _record_dir(path, visited_dirs)
+        subdir = os.path.join(path, part)
+        if os.path.isdir(subdir):
+            _match_repos(subdir, rest, nested, visited_dirs, repos, in_globstar=False)
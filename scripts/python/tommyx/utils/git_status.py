@@ -0,0 +1,727 @@
+import glob
+import hashlib
+import mmap
+import os
+import re
+import stat
+import struct
+import zlib
+from collections import namedtuple
+
+from tommyx.utils.git import (
+    get_common_dir, get_config_bool, get_config_value, get_git_dir, read_effective_config, read_head,
+    read_head_branch, read_ref, walk_worktree_mtimes,
+)
+
+INDEX_HEADER = struct.Struct(">4sII")
+# ctime s/ns, mtime s/ns, dev, ino, mode, uid, gid, size, sha1, flags
+INDEX_ENTRY = struct.Struct(">10I20sH")
+
+FLAG_ASSUME_VALID = 0x8000
+FLAG_EXTENDED = 0x4000
+EXTENDED_FLAG_SKIP_WORKTREE = 0x4000
+EXTENDED_FLAG_INTENT_TO_ADD = 0x2000
+
+MODE_SYMLINK = 0o120000
+MODE_GITLINK = 0o160000
+MODE_EXECUTABLE = 0o100755
+
+OBJ_TYPES = {1: b"commit", 2: b"tree", 3: b"blob", 4: b"tag"}
+OBJ_OFS_DELTA = 6
+OBJ_REF_DELTA = 7
+# longest delta chain followed before giving up
+MAX_DELTA_DEPTH = 64
+# repos with more tracked files are left to git status, which is faster there: with 100 files
+# the checks here took 3.2ms against 2.8ms for git status, with 3000 files 57ms against 12ms
+MAX_INDEX_ENTRIES = 100
+
+IndexEntry = namedtuple(
+    "IndexEntry", "path ctime_s ctime_ns mtime_s mtime_ns ino mode uid gid size sha flags extended_flags"
+)
+
+
+class NeedsGitStatus(Exception):
+    """The repo is not provably clean in-process (it has changes, or uses a feature we do not read)."""
+
+
+def read_varint(data, pos):
+    """Read git's offset varint (index v4 path prefixes, OFS_DELTA offsets). Returns (value, new pos)."""
+    byte = data[pos]
+    pos += 1
+    value = byte & 0x7f
+    while byte & 0x80:
+        byte = data[pos]
+        pos += 1
+        value = ((value + 1) << 7) | (byte & 0x7f)
+
+    return value, pos
+
+
+def read_index_entry_count(git_dir):
+    """Number of entries in the index, from its header alone."""
+    try:
+        with open(os.path.join(git_dir, "index"), "rb") as f:
+            header = f.read(INDEX_HEADER.size)
+
+    except FileNotFoundError:
+        raise NeedsGitStatus("no index file")
+
+    signature, _, count = INDEX_HEADER.unpack(header)
+    if signature != b"DIRC":
+        raise NeedsGitStatus("unknown index format")
+    return count
+
+
+def read_index(git_dir):
+    """Parse the index file (versions 2-4) into (entries, extension signatures).
+
+    Entry paths are bytes, in index order. Extension contents are not parsed.
+    """
+    try:
+        with open(os.path.join(git_dir, "index"), "rb") as f:
+            data = f.read()
+
+    except FileNotFoundError:
+        raise NeedsGitStatus("no index file")
+
+    signature, version, count = INDEX_HEADER.unpack_from(data, 0)
+    if signature != b"DIRC" or version not in (2, 3, 4):
+        raise NeedsGitStatus(f"unsupported index version {version}")
+
+    entries = []
+    offset = INDEX_HEADER.size
+    path = b""
+    for _ in range(count):
+        fields = INDEX_ENTRY.unpack_from(data, offset)
+        flags = fields[11]
+        pos = offset + INDEX_ENTRY.size
+        extended_flags = 0
+        if flags & FLAG_EXTENDED:
+            extended_flags, = struct.unpack_from(">H", data, pos)
+            pos += 2
+
+        if version == 4:
+            # prefix compressed: drop that many bytes of the previous path, append the rest
+            strip, pos = read_varint(data, pos)
+            end = data.index(b"\0", pos)
+            path = path[:len(path) - strip] + data[pos:end]
+            offset = end + 1
+        else:
+            end = data.index(b"\0", pos)
+            path = data[pos:end]
+            # padded with 1-8 NULs to a multiple of 8 bytes
+            offset += (end - offset + 8) & ~7
+
+        entries.append(IndexEntry(
+            path, fields[0], fields[1], fields[2], fields[3], fields[5], fields[6], fields[7], fields[8],
+            fields[9], fields[10], flags, extended_flags,
+        ))
+
+    extensions = []
+    # everything up to the trailing checksum is extensions: 4-byte signature, 4-byte size
+    while offset + 8 <= len(data) - 20:
+        signature, size = struct.unpack_from(">4sI", data, offset)
+        extensions.append(signature)
+        offset += 8 + size
+
+    return entries, extensions
+
+
+def hash_object(kind, content):
+    return hashlib.sha1(b"%s %d\0" % (kind, len(content)) + content).digest()
+
+
+def hash_tree(entries):
+    """Return the sha of the tree `git write-tree` would write for (path, mode, sha) entries in index order."""
+    items = []
+    i = 0
+    while i < len(entries):
+        path, mode, sha = entries[i]
+        slash = path.find(b"/")
+        if slash < 0:
+            items.append((path, b"%o" % mode, sha))
+            i += 1
+            continue
+
+        # a directory's entries are contiguous in index order
+        prefix = path[:slash + 1]
+        j = i
+        while j < len(entries) and entries[j][0].startswith(prefix):
+            j += 1
+        subtree = [(p[len(prefix):], m, s) for p, m, s in entries[i:j]]
+        items.append((path[:slash], b"40000", hash_tree(subtree)))
+        i = j
+
+    # trees sort as if their name ended with a slash
+    items.sort(key=lambda item: item[0] + b"/" if item[1] == b"40000" else item[0])
+    return hash_object(b"tree", b"".join(b"%s %s\0%s" % (mode, name, sha) for name, mode, sha in items))
+
+
+def get_object_dirs(common_dir):
+    object_dirs = [os.path.join(common_dir, "objects")]
+    try:
+        with open(os.path.join(common_dir, "objects", "info", "alternates"), "r") as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith("#"):
+                    object_dirs.append(os.path.normpath(os.path.join(common_dir, "objects", line)))
+
+    except OSError:
+        pass
+
+    return object_dirs
+
+
+def find_in_pack_index(idx, sha):
+    """Binary search a v2 pack .idx for a binary sha; returns the pack offset or None."""
+    if idx[:8] != b"\xfftOc\x00\x00\x00\x02":
+        raise NeedsGitStatus("unsupported pack index version")
+
+    first = sha[0]
+    lo = struct.unpack_from(">I", idx, 8 + (first - 1) * 4)[0] if first else 0
+    hi = struct.unpack_from(">I", idx, 8 + first * 4)[0]
+    count = struct.unpack_from(">I", idx, 8 + 255 * 4)[0]
+    shas_at = 8 + 256 * 4
+    while lo < hi:
+        mid = (lo + hi) // 2
+        candidate = idx[shas_at + mid * 20:shas_at + mid * 20 + 20]
+        if candidate < sha:
+            lo = mid + 1
+        elif candidate > sha:
+            hi = mid
+        else:
+            offset = struct.unpack_from(">I", idx, shas_at + count * 24 + mid * 4)[0]
+            if offset & 0x80000000:
+                # index into the 64-bit offset table
+                offset = struct.unpack_from(">Q", idx, shas_at + count * 28 + (offset & 0x7fffffff) * 8)[0]
+            return offset
+
+    return None
+
+
+def inflate(data, pos):
+    decompressor = zlib.decompressobj()
+    chunks = []
+    while not decompressor.eof:
+        chunk = data[pos:pos + 65536]
+        if not chunk:
+            raise NeedsGitStatus("truncated pack")
+        chunks.append(decompressor.decompress(chunk))
+        pos += 65536
+
+    return b"".join(chunks)
+
+
+def read_delta_size(data, pos):
+    size = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        size |= (byte & 0x7f) << shift
+        shift += 7
+        if not byte & 0x80:
+            return size, pos
+
+
+def apply_delta(base, delta):
+    _, pos = read_delta_size(delta, 0)
+    _, pos = read_delta_size(delta, pos)
+    out = bytearray()
+    while pos < len(delta):
+        op = delta[pos]
+        pos += 1
+        if op & 0x80:
+            # copy from base: offset and size bytes are present per bit
+            offset = size = 0
+            for i in range(4):
+                if op & (1 << i):
+                    offset |= delta[pos] << (8 * i)
+                    pos += 1
+            for i in range(3):
+                if op & (0x10 << i):
+                    size |= delta[pos] << (8 * i)
+                    pos += 1
+            out += base[offset:offset + (size or 0x10000)]
+        elif op:
+            out += delta[pos:pos + op]
+            pos += op
+        else:
+            raise NeedsGitStatus("invalid delta")
+
+    return bytes(out)
+
+
+def read_pack_object(pack, offset, object_dirs, depth=0):
+    if depth > MAX_DELTA_DEPTH:
+        raise NeedsGitStatus("delta chain too long")
+
+    byte = pack[offset]
+    kind = (byte >> 4) & 7
+    pos = offset + 1
+    while byte & 0x80:
+        byte = pack[pos]
+        pos += 1
+
+    if kind == OBJ_OFS_DELTA:
+        distance, pos = read_varint(pack, pos)
+        base_kind, base = read_pack_object(pack, offset - distance, object_dirs, depth + 1)
+        return base_kind, apply_delta(base, inflate(pack, pos))
+    if kind == OBJ_REF_DELTA:
+        base_kind, base = read_object(object_dirs, pack[pos:pos + 20], depth + 1)
+        return base_kind, apply_delta(base, inflate(pack, pos + 20))
+    if kind not in OBJ_TYPES:
+        raise NeedsGitStatus(f"unknown pack object type {kind}")
+
+    return OBJ_TYPES[kind], inflate(pack, pos)
+
+
+def read_object(object_dirs, sha, depth=0):
+    """Read an object by binary sha from loose objects or packs. Returns (kind, content)."""
+    hex_sha = sha.hex()
+    for object_dir in object_dirs:
+        try:
+            with open(os.path.join(object_dir, hex_sha[:2], hex_sha[2:]), "rb") as f:
+                raw = zlib.decompress(f.read())
+            header, _, content = raw.partition(b"\0")
+            return header.split(b" ")[0], content
+
+        except FileNotFoundError:
+            pass
+
+        for idx_path in glob.glob(os.path.join(object_dir, "pack", "*.idx")):
+            with open(idx_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as idx:
+                offset = find_in_pack_index(idx, sha)
+            if offset is None:
+                continue
+            with open(idx_path[:-len(".idx")] + ".pack", "rb") as f, \
+                    mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as pack:
+                return read_pack_object(pack, offset, object_dirs, depth)
+
+    raise NeedsGitStatus(f"object {hex_sha} not found")
+
+
+def read_commit_tree(common_dir, commit_sha):
+    kind, content = read_object(get_object_dirs(common_dir), bytes.fromhex(commit_sha))
+    if kind != b"commit" or not content.startswith(b"tree "):
+        raise NeedsGitStatus(f"{commit_sha} is not a commit")
+
+    return bytes.fromhex(content[5:45].decode())
+
+
+def translate_ignore_pattern(pattern):
+    """Translate a gitignore glob (bytes) into a regex matching whole relative paths."""
+    out = []
+    i = 0
+    n = len(pattern)
+    while i < n:
+        c = pattern[i:i + 1]
+        if c == b"*":
+            at_boundary = i == 0 or pattern[i - 1:i] == b"/"
+            if pattern[i:i + 2] == b"**" and at_boundary and i + 2 == n:
+                out.append(b".*")
+                i += 2
+                continue
+            if pattern[i:i + 3] == b"**/" and at_boundary:
+                out.append(b"(?:.*/)?")
+                i += 3
+                continue
+            out.append(b"[^/]*")
+            while pattern[i:i + 1] == b"*":
+                i += 1
+            continue
+
+        if c == b"?":
+            out.append(b"[^/]")
+        elif c == b"[":
+            j = i + 1
+            if pattern[j:j + 1] in (b"!", b"^"):
+                j += 1
+            if pattern[j:j + 1] == b"]":
+                j += 1
+            while j < n and pattern[j:j + 1] != b"]":
+                j += 1
+            if j >= n:
+                out.append(b"\\[")
+            else:
+                body = pattern[i + 1:j].replace(b"\\", b"\\\\")
+                if body[:1] in (b"!", b"^"):
+                    out.append(b"[^/" + body[1:] + b"]")
+                else:
+                    out.append(b"[" + body + b"]")
+                i = j
+        elif c == b"\\" and i + 1 < n:
+            out.append(re.escape(pattern[i + 1:i + 2]))
+            i += 1
+        else:
+            out.append(re.escape(c))
+        i += 1
+
+    return b"".join(out)
+
+
+def parse_ignore_file(path, flags=0):
+    """Return the patterns of a gitignore-style file as (regex, negate, dir_only, anchored) tuples."""
+    try:
+        with open(path, "rb") as f:
+            lines = f.read().split(b"\n")
+
+    except OSError:
+        return []
+
+    patterns = []
+    for line in lines:
+        line = line.rstrip(b"\r")
+        if not line or line.startswith(b"#"):
+            continue
+        # trailing spaces are dropped unless escaped
+        while line.endswith(b" ") and not line.endswith(b"\\ "):
+            line = line[:-1]
+
+        negate = line.startswith(b"!")
+        if negate:
+            line = line[1:]
+        dir_only = line.endswith(b"/")
+        if dir_only:
+            line = line[:-1]
+        if not line:
+            continue
+
+        # a slash anywhere but the end anchors the pattern to the file's directory
+        anchored = b"/" in line
+        if line.startswith(b"/"):
+            line = line[1:]
+        patterns.append((re.compile(translate_ignore_pattern(line), flags), negate, dir_only, anchored))
+
+    return patterns
+
+
+def get_excludes_file(config):
+    """core.excludesFile, by default $XDG_CONFIG_HOME/git/ignore."""
+    excludes_file = get_config_value(config, "core", None, "excludesfile")
+    if excludes_file is None:
+        xdg_config_home = os.environ.get("XDG_CONFIG_HOME") or os.path.expanduser("~/.config")
+        excludes_file = os.path.join(xdg_config_home, "git", "ignore")
+    return os.path.expanduser(excludes_file)
+
+
+def get_exclude_files(git_dir):
+    """The ignore files that apply to the whole worktree: core.excludesFile and info/exclude."""
+    return [get_excludes_file(read_effective_config(git_dir)), os.path.join(get_common_dir(git_dir), "info", "exclude")]
+
+
+class IgnoreRules:
+    """gitignore matching for one worktree: global excludes, info/exclude and per-directory .gitignore files.
+
+    Directory .gitignore files are loaded with load_dir as the walk enters each
+    directory, parents first.
+    """
+
+    def __init__(self, repo_path, common_dir, config, ignore_case=False):
+        self.repo_path = repo_path
+        self.ignore_case = ignore_case
+        self.flags = re.IGNORECASE if ignore_case else 0
+        self.base_patterns = (
+            parse_ignore_file(get_excludes_file(config), self.flags)
+            + parse_ignore_file(os.path.join(common_dir, "info", "exclude"), self.flags)
+        )
+        # directory relative path (bytes, b"" for the root) -> patterns of its .gitignore
+        self.dir_patterns = {}
+
+    def load_dir(self, rel_dir):
+        path = os.path.join(self.repo_path, rel_dir, b".gitignore") if rel_dir else os.path.join(self.repo_path, b".gitignore")
+        self.dir_patterns[rel_dir] = parse_ignore_file(path, self.flags)
+
+    def is_ignored(self, path, is_dir):
+        """Whether path (relative, bytes) is ignored. Its parent directories must not be ignored."""
+        basename = path.rpartition(b"/")[2]
+        # deeper .gitignore files take precedence, and later lines within a file
+        bases = [b""]
+        parent = path.rpartition(b"/")[0]
+        if parent:
+            parts = parent.split(b"/")
+            bases += [b"/".join(parts[:i]) for i in range(1, len(parts) + 1)]
+
+        for base in reversed(bases):
+            relative = path[len(base) + 1:] if base else path
+            match = self._match(self.dir_patterns.get(base, []), relative, basename, is_dir)
+            if match is not None:
+                return match
+
+        return bool(self._match(self.base_patterns, path, basename, is_dir))
+
+    @staticmethod
+    def _match(patterns, relative, basename, is_dir):
+        for regex, negate, dir_only, anchored in reversed(patterns):
+            if dir_only and not is_dir:
+                continue
+            if regex.fullmatch(relative if anchored else basename):
+                return not negate
+
+        return None
+
+
+def stat_matches(entry, st, trust_ctime):
+    """Whether the lstat of a worktree file matches its index entry, as git compares them."""
+    mask = 0xffffffff
+    if entry.mtime_s != (st.st_mtime_ns // 1000000000) & mask or entry.mtime_ns != st.st_mtime_ns % 1000000000:
+        return False
+    if trust_ctime and (
+        entry.ctime_s != (st.st_ctime_ns // 1000000000) & mask or entry.ctime_ns != st.st_ctime_ns % 1000000000
+    ):
+        return False
+
+    return (
+        entry.ino == st.st_ino & mask and entry.uid == st.st_uid & mask and entry.gid == st.st_gid & mask
+        and entry.size == st.st_size & mask
+    )
+
+
+def check_tracked_file(repo_path, entry, index_mtime_ns, trust_filemode, trust_ctime, can_hash):
+    """Raise NeedsGitStatus unless a tracked file provably matches its index entry."""
+    path = os.path.join(repo_path, entry.path)
+    try:
+        st = os.lstat(path)
+
+    except (FileNotFoundError, NotADirectoryError):
+        raise NeedsGitStatus(f"deleted: {os.fsdecode(entry.path)}")
+
+    if entry.mode == MODE_SYMLINK:
+        if not stat.S_ISLNK(st.st_mode):
+            raise NeedsGitStatus(f"type changed: {os.fsdecode(entry.path)}")
+    elif not stat.S_ISREG(st.st_mode):
+        raise NeedsGitStatus(f"type changed: {os.fsdecode(entry.path)}")
+    elif trust_filemode and bool(st.st_mode & 0o100) != (entry.mode == MODE_EXECUTABLE):
+        raise NeedsGitStatus(f"mode changed: {os.fsdecode(entry.path)}")
+
+    if entry.flags & FLAG_ASSUME_VALID:
+        return
+
+    # racily clean: written in the same tick as the index, so the stat info proves nothing
+    entry_mtime_ns = entry.mtime_s * 1000000000 + entry.mtime_ns
+    if stat_matches(entry, st, trust_ctime) and entry_mtime_ns < index_mtime_ns:
+        return
+
+    if not can_hash:
+        raise NeedsGitStatus(f"stat changed with content filters active: {os.fsdecode(entry.path)}")
+
+    if entry.mode == MODE_SYMLINK:
+        content = os.readlink(path)
+    else:
+        with open(path, "rb") as f:
+            content = f.read()
+    if hash_object(b"blob", content) != entry.sha:
+        raise NeedsGitStatus(f"modified: {os.fsdecode(entry.path)}")
+
+
+def check_untracked(repo_path, tracked, tracked_dirs, ignore_rules):
+    """Raise NeedsGitStatus on the first untracked, not ignored file (or nested repo) in the worktree.
+
+    tracked and tracked_dirs are lowercased if the ignore rules ignore case.
+    """
+    stack = [b""]
+    while stack:
+        rel_dir = stack.pop()
+        ignore_rules.load_dir(rel_dir)
+        try:
+            with os.scandir(os.path.join(repo_path, rel_dir) if rel_dir else repo_path) as it:
+                entries = list(it)
+
+        except OSError:
+            continue
+
+        for entry in entries:
+            if entry.name == b".git":
+                continue
+
+            path = rel_dir + b"/" + entry.name if rel_dir else entry.name
+            key = path.lower() if ignore_rules.ignore_case else path
+            if entry.is_dir(follow_symlinks=False):
+                if ignore_rules.is_ignored(path, True):
+                    continue
+                if key not in tracked_dirs and os.path.lexists(os.path.join(entry.path, b".git")):
+                    raise NeedsGitStatus(f"untracked repo: {os.fsdecode(path)}")
+                stack.append(path)
+            elif key not in tracked and not ignore_rules.is_ignored(path, False):
+                raise NeedsGitStatus(f"untracked: {os.fsdecode(path)}")
+
+
+def walk_worktree(repo_path):
+    """Stat-walk the parts of a worktree git status depends on, without spawning git.
+
+    Returns (dir_mtimes, tracked_count, max_tracked_time_ns) like
+    git.walk_worktree_mtimes, but reads far less: dir_mtimes covers only the
+    directories .gitignore does not exclude (so node_modules or build output is
+    never entered) and catches files being created, deleted or renamed, while
+    only the tracked files listed in the index are stat'ed, their newest
+    mtime/ctime catching in-place edits. Falls back to walk_worktree_mtimes when
+    the index or the ignore rules cannot be read here.
+    """
+    try:
+        return _walk_worktree(repo_path)
+
+    except (NeedsGitStatus, OSError, ValueError, IndexError, struct.error):
+        return walk_worktree_mtimes(repo_path)
+
+
+def load_ignore_rules(repo_path):
+    """IgnoreRules of a worktree; raises NeedsGitStatus when its config could change them in ways not read here."""
+    git_dir = get_git_dir(repo_path)
+    config = read_effective_config(git_dir)
+    # an included file could point core.excludesfile elsewhere, and a wrongly skipped directory hides changes
+    if any(section in ("include", "includeif") for section, _, _, _ in config):
+        raise NeedsGitStatus("config uses include directives")
+    return IgnoreRules(os.fsencode(repo_path), get_common_dir(git_dir), config, get_config_bool(config, "core", None, "ignorecase"))
+
+
+def _walk_worktree(repo_path):
+    ignore_rules = load_ignore_rules(repo_path)
+    git_dir = get_git_dir(repo_path)
+    repo_path = os.fsencode(repo_path)
+
+    entries, _ = read_index(git_dir)
+    tracked_count = 0
+    max_tracked_time_ns = 0
+    for entry in entries:
+        try:
+            st = os.lstat(os.path.join(repo_path, entry.path))
+
+        except OSError:
+            continue
+
+        tracked_count += 1
+        max_tracked_time_ns = max(max_tracked_time_ns, st.st_mtime_ns, st.st_ctime_ns)
+
+    dir_mtimes = {".": os.stat(repo_path).st_mtime_ns}
+    stack = [b""]
+    while stack:
+        rel_dir = stack.pop()
+        ignore_rules.load_dir(rel_dir)
+        try:
+            with os.scandir(os.path.join(repo_path, rel_dir) if rel_dir else repo_path) as it:
+                subdirs = [entry for entry in it if entry.name != b".git" and entry.is_dir(follow_symlinks=False)]
+
+        except OSError:
+            # vanished while walking; record it so the fingerprint cannot match
+            dir_mtimes[os.fsdecode(rel_dir) or "."] = -1
+            continue
+
+        for entry in subdirs:
+            path = rel_dir + b"/" + entry.name if rel_dir else entry.name
+            if ignore_rules.is_ignored(path, True):
+                continue
+            try:
+                dir_mtimes[os.fsdecode(path)] = entry.stat(follow_symlinks=False).st_mtime_ns
+            except OSError:
+                dir_mtimes[os.fsdecode(path)] = -1
+            stack.append(path)
+
+    return dir_mtimes, tracked_count, max_tracked_time_ns
+
+
+def read_clean_status(repo_path):
+    """Check in-process that a repo is clean and level with its upstream, without spawning git.
+
+    Resolves HEAD and the upstream ref, hashes the index into a tree and compares
+    it with HEAD's tree (staged changes), stat-compares every tracked file
+    against its index entry, hashing the racy or stat-dirty ones (unstaged
+    changes), and walks the worktree for files not covered by the index or
+    .gitignore (untracked). Returns the RepoStatus fields {head, branch,
+    upstream} of a clean repo.
+
+    Raises NeedsGitStatus as soon as anything is or might be different, including
+    features not read here (split index, sparse checkout, submodules, config
+    includes, content filters on stat-dirty files, sha256 repos); the caller then
+    runs git status, which also gives the details of the changes. Repos with
+    more than MAX_INDEX_ENTRIES tracked files go to git status straight away.
+    """
+    try:
+        return _read_clean_status(repo_path)
+
+    except (OSError, ValueError, IndexError, struct.error, zlib.error) as e:
+        raise NeedsGitStatus(f"cannot read repo: {e}") from e
+
+
+def _read_clean_status(repo_path):
+    git_dir = get_git_dir(repo_path)
+    count = read_index_entry_count(git_dir)
+    if count > MAX_INDEX_ENTRIES:
+        raise NeedsGitStatus(f"{count} tracked files, git status is faster")
+    common_dir = get_common_dir(git_dir)
+    config = read_effective_config(git_dir)
+    if any(section in ("include", "includeif") for section, _, _, _ in config):
+        raise NeedsGitStatus("config uses include directives")
+    if get_config_value(config, "extensions", None, "objectformat", "sha1").lower() != "sha1":
+        raise NeedsGitStatus("repo does not use sha1")
+    if get_config_bool(config, "core", None, "sparsecheckout"):
+        raise NeedsGitStatus("sparse checkout")
+    if get_config_bool(config, "core", None, "splitindex"):
+        raise NeedsGitStatus("split index")
+
+    if not read_head(git_dir):
+        raise NeedsGitStatus("unreadable HEAD")
+    branch = read_head_branch(git_dir)
+    head = read_ref(git_dir, "HEAD")
+    if head is None:
+        raise NeedsGitStatus("unborn branch")
+
+    upstream = None
+    remote = get_config_value(config, "branch", branch, "remote") if branch else None
+    merge = get_config_value(config, "branch", branch, "merge") if branch else None
+    if remote and merge:
+        default_refspec = f"+refs/heads/*:refs/remotes/{remote}/*"
+        if not merge.startswith("refs/heads/") or get_config_value(config, "remote", remote, "fetch") != default_refspec:
+            raise NeedsGitStatus("upstream not tracked through a default refspec")
+        upstream = f"{remote}/{merge[len('refs/heads/'):]}"
+        upstream_sha = read_ref(git_dir, f"refs/remotes/{upstream}")
+        if upstream_sha is None:
+            raise NeedsGitStatus("upstream branch is gone")
+        if upstream_sha != head:
+            raise NeedsGitStatus("not level with upstream")
+
+    index_mtime_ns = os.stat(os.path.join(git_dir, "index")).st_mtime_ns
+    entries, extensions = read_index(git_dir)
+    for signature in extensions:
+        # extensions with a lowercase signature change how the index must be read
+        if signature[:1].islower():
+            raise NeedsGitStatus(f"index extension {signature.decode(errors='replace')}")
+
+    for entry in entries:
+        if entry.flags & 0x3000:
+            raise NeedsGitStatus("unmerged entries")
+        if entry.extended_flags & EXTENDED_FLAG_SKIP_WORKTREE:
+            raise NeedsGitStatus("sparse checkout")
+        if entry.extended_flags & EXTENDED_FLAG_INTENT_TO_ADD:
+            raise NeedsGitStatus("intent-to-add entries")
+        if entry.mode == MODE_GITLINK:
+            raise NeedsGitStatus("submodules")
+
+    if hash_tree([(entry.path, entry.mode, entry.sha) for entry in entries]) != read_commit_tree(common_dir, head):
+        raise NeedsGitStatus("staged changes")
+
+    # with line ending conversion or filters the worktree bytes are not the blob bytes
+    xdg_config_home = os.environ.get("XDG_CONFIG_HOME") or os.path.expanduser("~/.config")
+    can_hash = not (
+        get_config_value(config, "core", None, "autocrlf", "false").lower() != "false"
+        or get_config_value(config, "core", None, "attributesfile") is not None
+        or os.path.exists(os.path.join(xdg_config_home, "git", "attributes"))
+        or os.path.exists(os.path.join(common_dir, "info", "attributes"))
+        or any(entry.path.rpartition(b"/")[2] == b".gitattributes" for entry in entries)
+    )
+    trust_filemode = get_config_bool(config, "core", None, "filemode", True)
+    trust_ctime = get_config_bool(config, "core", None, "trustctime", True)
+    repo_path = os.fsencode(repo_path)
+    for entry in entries:
+        check_tracked_file(repo_path, entry, index_mtime_ns, trust_filemode, trust_ctime, can_hash)
+
+    if get_config_value(config, "status", None, "showuntrackedfiles", "normal").lower() not in ("no", "false"):
+        ignore_case = get_config_bool(config, "core", None, "ignorecase")
+        tracked = {entry.path.lower() if ignore_case else entry.path for entry in entries}
+        tracked_dirs = set()
+        for path in tracked:
+            while b"/" in path:
+                path = path.rpartition(b"/")[0]
+                tracked_dirs.add(path)
+        ignore_rules = IgnoreRules(repo_path, common_dir, config, ignore_case)
+        check_untracked(repo_path, tracked, tracked_dirs, ignore_rules)
+
+    return {"head": head, "branch": branch, "upstream": upstream}
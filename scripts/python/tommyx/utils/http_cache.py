@@ -0,0 +1,244 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import zlib
+from collections import Counter
+
+# per URL a JSON entry (validators, freshness, extracted title and text) and the zlib-compressed body read
+CACHE_DIR = os.path.expanduser("~/.cache/tommyx/http")
+# the cache is trimmed to this size, least recently used entries first
+MAX_CACHE_BYTES = 512 * 1024 * 1024
+# puts between size checks; a check lists the whole cache
+EVICT_EVERY = 100
+# without Cache-Control or Expires a page stays fresh for 10% of the time since Last-Modified, at most this long
+MAX_HEURISTIC_FRESHNESS = 24 * 3600
+# set TOMMYX_HTTP_CACHE=0 to always fetch pages
+ENABLED = os.environ.get("TOMMYX_HTTP_CACHE", "1") != "0"
+
+# response headers kept in entries, to recompute freshness when a 304 updates some of them
+STORED_HEADERS = ["cache-control", "expires", "etag", "last-modified", "date", "age", "vary"]
+
+# "fresh": served without a request, "revalidated": 304, "miss": fetched in full
+stats = Counter()
+
+_lock = threading.Lock()
+_puts_since_evict = None
+
+
+def make_key(url: str):
+    return hashlib.sha256(url.encode()).hexdigest()
+
+
+def get_entry_path(key):
+    return os.path.join(CACHE_DIR, key[:2], f"{key}.json")
+
+
+def get_body_path(key):
+    return os.path.join(CACHE_DIR, key[:2], f"{key}.body")
+
+
+def parse_cache_control(value: str | None):
+    """Return the Cache-Control directives as {name: value or None}."""
+    directives = {}
+    for part in (value or "").split(","):
+        name, _, arg = part.strip().partition("=")
+        if name:
+            directives[name.lower()] = arg.strip().strip('"') or None
+    return directives
+
+
+def parse_http_date(value: str | None):
+    from email.utils import parsedate_to_datetime
+
+    if not value:
+        return None
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError, IndexError, OverflowError):
+        return None
+
+
+def get_int(value):
+    try:
+        return max(0, int(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def is_storable(status_code: int, headers):
+    directives = parse_cache_control(headers.get("cache-control"))
+    return status_code == 200 and "no-store" not in directives and headers.get("vary", "").strip() != "*"
+
+
+def fresh_until(headers, now: float):
+    """When a response with these headers stops being fresh (RFC 9111 section 4.2), as a time.time() value."""
+    directives = parse_cache_control(headers.get("cache-control"))
+    if "no-cache" in directives:
+        return now
+
+    # age when received: what the server says, or the Date header's lag behind our clock
+    date = parse_http_date(headers.get("date"))
+    age = max(get_int(headers.get("age")) or 0, now - date if date is not None else 0)
+
+    if get_int(directives.get("max-age")) is not None:
+        lifetime = get_int(directives["max-age"])
+    elif headers.get("expires") is not None:
+        expires = parse_http_date(headers["expires"])
+        # an unparsable Expires (often "0" or "-1") means already expired
+        lifetime = expires - (date if date is not None else now) if expires is not None else 0
+    else:
+        last_modified = parse_http_date(headers.get("last-modified"))
+        base = date if date is not None else now
+        lifetime = min(0.1 * (base - last_modified), MAX_HEURISTIC_FRESHNESS) if last_modified is not None else 0
+
+    return now + max(0, lifetime - age)
+
+
+def is_fresh(entry: dict, now: float | None = None):
+    return entry["fresh_until"] > (time.time() if now is None else now)
+
+
+def has_validators(entry: dict):
+    return bool(entry["headers"].get("etag") or entry["headers"].get("last-modified"))
+
+
+def conditional_headers(entry: dict):
+    """Request headers that let the server answer 304 if the stored response is still current."""
+    headers = {}
+    if entry["headers"].get("etag"):
+        headers["If-None-Match"] = entry["headers"]["etag"]
+    if entry["headers"].get("last-modified"):
+        headers["If-Modified-Since"] = entry["headers"]["last-modified"]
+    return headers
+
+
+def get(url: str):
+    """Return the entry stored for url (fresh or not), or None."""
+    key = make_key(url)
+    path = get_entry_path(key)
+    try:
+        with open(path, "r") as f:
+            entry = json.load(f)
+
+    except (OSError, ValueError):
+        return None
+
+    if entry.get("url") != url:
+        return None
+
+    # mtime is the last use, which eviction goes by
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+    return entry
+
+
+def get_body(url: str):
+    """Return the body bytes stored for url (all of it if the entry's body_complete), or None."""
+    try:
+        with open(get_body_path(make_key(url)), "rb") as f:
+            return zlib.decompress(f.read())
+
+    except (OSError, zlib.error):
+        return None
+
+
+def write_file(path, data: bytes):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # fetches run on several threads
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def put(url: str, headers, now: float, values: dict, body: bytes | None = None):
+    """Store a 200 response for url with the values extracted from it, unless its headers forbid it.
+
+    Returns the entry, or None if it was not stored. An entry that is never
+    fresh and has nothing to revalidate with would only cost disk, so it is
+    not stored either.
+    """
+    entry = {
+        "url": url,
+        "stored_at": now,
+        "fresh_until": fresh_until(headers, now),
+        "headers": {name: headers[name] for name in STORED_HEADERS if headers.get(name) is not None},
+        **values,
+    }
+    if not is_storable(200, headers) or (entry["fresh_until"] <= now and not has_validators(entry)):
+        return None
+
+    key = make_key(url)
+    if body is not None:
+        write_file(get_body_path(key), zlib.compress(body, 1))
+    write_file(get_entry_path(key), json.dumps(entry, ensure_ascii=False).encode())
+
+    global _puts_since_evict
+    with _lock:
+        evict_now = _puts_since_evict is None or _puts_since_evict >= EVICT_EVERY
+        if evict_now:
+            _puts_since_evict = 0
+        _puts_since_evict += 1
+    if evict_now:
+        evict()
+
+    return entry
+
+
+def update(entry: dict, headers, now: float):
+    """Apply a 304 response's headers to entry and store it; returns the updated entry."""
+    entry = {**entry, "headers": {**entry["headers"]}}
+    for name in STORED_HEADERS:
+        if headers.get(name) is not None:
+            entry["headers"][name] = headers[name]
+    # Date and Age describe this response; stale ones would age the entry again
+    for name in ["date", "age"]:
+        if headers.get(name) is None:
+            entry["headers"].pop(name, None)
+    entry["fresh_until"] = fresh_until(entry["headers"], now)
+    write_file(get_entry_path(make_key(entry["url"])), json.dumps(entry, ensure_ascii=False).encode())
+    return entry
+
+
+def remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def evict(max_bytes: int | None = None):
+    """Delete the least recently used entries, with their bodies, until the cache fits in max_bytes."""
+    max_bytes = MAX_CACHE_BYTES if max_bytes is None else max_bytes
+    entries = {}
+    try:
+        subdirs = [entry.path for entry in os.scandir(CACHE_DIR) if entry.is_dir()]
+    except OSError:
+        return
+
+    for subdir in subdirs:
+        try:
+            with os.scandir(subdir) as it:
+                for entry in it:
+                    key, ext = os.path.splitext(entry.name)
+                    if ext in (".json", ".body"):
+                        st = entry.stat()
+                        mtime, size, paths = entries.get(key, (0, 0, []))
+                        # an entry's last use is its JSON file's mtime
+                        entries[key] = (max(mtime, st.st_mtime) if ext == ".json" else mtime, size + st.st_size, paths + [entry.path])
+
+        except OSError:
+            pass
+
+    total = sum(size for _, size, _ in entries.values())
+    for mtime, size, paths in sorted(entries.values()):
+        if total <= max_bytes:
+            break
+        for path in paths:
+            remove(path)
+        total -= size
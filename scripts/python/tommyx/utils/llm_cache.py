@@ -0,0 +1,154 @@
+import hashlib
+import json
+import os
+import sys
+import time
+
+import pydantic
+
+# one JSON file per cached response, named by the hash of the request
+CACHE_DIR = os.path.expanduser("~/.cache/tommyx/llm")
+# the cache is trimmed to this size, least recently used entries first
+MAX_CACHE_BYTES = 256 * 1024 * 1024
+# puts between size checks; a check lists the whole cache
+EVICT_EVERY = 100
+
+MISS = object()
+
+_puts_since_evict = None
+
+
+def get_schema(response_format):
+    if hasattr(response_format, 'model_json_schema'):
+        return response_format.model_json_schema()
+    else:
+        return response_format.schema()
+
+
+def make_key(model: str, input: list[dict], reasoning_effort: str, response_format=None):
+    """Hash everything that determines a response into a cache key.
+
+    input is normalized to canonical JSON (sorted keys, no whitespace), and
+    response_format is represented by its JSON schema, so editing the model
+    class gives new keys.
+    """
+    request = {
+        "model": model,
+        "input": input,
+        "reasoning_effort": reasoning_effort,
+        "response_format": get_schema(response_format) if response_format else None,
+    }
+    text = json.dumps(request, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def get_entry_path(key):
+    return os.path.join(CACHE_DIR, key[:2], f"{key}.json")
+
+
+def get(key, response_format=None):
+    """Return the cached text (or parsed response_format instance), or MISS."""
+    path = get_entry_path(key)
+    try:
+        with open(path, "r") as f:
+            entry = json.load(f)
+
+    except (OSError, ValueError):
+        return MISS
+
+    if entry.get("expires_at") is not None and entry["expires_at"] < time.time():
+        remove(path)
+        return MISS
+
+    try:
+        if response_format is None:
+            value = entry["text"]
+        elif hasattr(response_format, 'model_validate'):
+            value = response_format.model_validate(entry["parsed"])
+        else:
+            value = response_format.parse_obj(entry["parsed"])
+
+    except (KeyError, pydantic.ValidationError):
+        return MISS
+
+    # mtime is the last use, which eviction goes by
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+    return value
+
+
+def put(key, value, ttl: float | None = None, model: str | None = None):
+    """Store value under key for ttl seconds (None: until evicted); a ttl of 0 or less stores nothing.
+
+    A failed write (disk full, read-only HOME) only warns: the answer was paid for either way.
+    """
+    if ttl is not None and ttl <= 0:
+        return
+    now = time.time()
+    entry = {"created_at": now, "expires_at": now + ttl if ttl is not None else None, "model": model}
+    if isinstance(value, str):
+        entry["text"] = value
+    elif hasattr(value, 'model_dump'):
+        entry["parsed"] = value.model_dump(mode="json")
+    else:
+        entry["parsed"] = json.loads(value.json())
+
+    path = get_entry_path(key)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(tmp_path, "w") as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    except OSError as e:
+        print(f"Warning: could not write LLM cache entry {path}: {e}", file=sys.stderr)
+        remove(tmp_path)
+        return
+
+    global _puts_since_evict
+    if _puts_since_evict is None or _puts_since_evict >= EVICT_EVERY:
+        _puts_since_evict = 0
+        evict()
+    _puts_since_evict += 1
+
+
+def remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def evict(max_bytes: int | None = None):
+    """Delete the least recently used entries until the cache fits in max_bytes.
+
+    Expired entries are removed when they are next looked up.
+    """
+    max_bytes = MAX_CACHE_BYTES if max_bytes is None else max_bytes
+    entries = []
+    try:
+        subdirs = [entry.path for entry in os.scandir(CACHE_DIR) if entry.is_dir()]
+    except OSError:
+        return
+
+    for subdir in subdirs:
+        try:
+            with os.scandir(subdir) as it:
+                for entry in it:
+                    if entry.name.endswith(".json"):
+                        st = entry.stat()
+                        entries.append((st.st_mtime, st.st_size, entry.path))
+
+        except OSError:
+            pass
+
+    total = sum(size for _, size, _ in entries)
+    for mtime, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        remove(path)
+        total -= size
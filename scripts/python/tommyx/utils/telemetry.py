@@ -0,0 +1,269 @@
+import atexit
+import os
+import queue
+import sys
+import threading
+import time
+from typing import Optional
+
+# SQLite file every LLM call and agent session is appended to (see telemetry_report.py); local only
+TELEMETRY_DB = os.path.expanduser("~/.cache/tommyx/telemetry.sqlite")
+# on by default; set TOMMYX_TELEMETRY=0 to record nothing
+ENABLED = os.environ.get("TOMMYX_TELEMETRY", "1") != "0"
+# seconds the interpreter waits at exit for queued records to be written
+FLUSH_TIMEOUT = 5.0
+
+# USD per million tokens: (input, cached input, output); reasoning tokens count as output.
+# Dated snapshots match by prefix; calls to unlisted models get no cost.
+MODEL_PRICES = {
+    "gpt-5.1": (1.25, 0.125, 10.0),
+    "gpt-5": (1.25, 0.125, 10.0),
+    "gpt-5-mini": (0.25, 0.025, 2.0),
+    "gpt-5-nano": (0.05, 0.005, 0.4),
+    "gpt-4.1": (2.0, 0.5, 8.0),
+    "gpt-4.1-mini": (0.4, 0.1, 1.6),
+    "gpt-4.1-nano": (0.1, 0.025, 0.4),
+    "gpt-4o": (2.5, 1.25, 10.0),
+    "gpt-4o-mini": (0.15, 0.075, 0.6),
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS llm_calls (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    script TEXT,
+    kind TEXT,
+    requested_model TEXT,
+    model TEXT,
+    fallback INTEGER NOT NULL DEFAULT 0,
+    cached INTEGER NOT NULL DEFAULT 0,
+    attempts INTEGER,
+    latency_s REAL,
+    time_to_first_token_s REAL,
+    input_tokens INTEGER,
+    cached_input_tokens INTEGER,
+    output_tokens INTEGER,
+    reasoning_tokens INTEGER,
+    cost_usd REAL,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS llm_calls_ts ON llm_calls (ts);
+CREATE TABLE IF NOT EXISTS agent_sessions (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    script TEXT,
+    cwd TEXT,
+    model TEXT,
+    duration_s REAL,
+    api_duration_s REAL,
+    num_turns INTEGER,
+    tool_calls INTEGER,
+    approvals INTEGER,
+    approval_wait_s REAL,
+    input_tokens INTEGER,
+    output_tokens INTEGER,
+    cost_usd REAL,
+    is_error INTEGER NOT NULL DEFAULT 0,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS agent_sessions_ts ON agent_sessions (ts);
+CREATE TABLE IF NOT EXISTS tool_approvals (
+    id INTEGER PRIMARY KEY,
+    session_id INTEGER REFERENCES agent_sessions (id),
+    ts REAL NOT NULL,
+    tool TEXT,
+    source TEXT,
+    allowed INTEGER,
+    wait_s REAL
+);
+CREATE INDEX IF NOT EXISTS tool_approvals_session ON tool_approvals (session_id);
+"""
+
+_schema_ready = set()
+_warned = False
+# records waiting for the writer thread, started on the first write
+_queue = None
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_script_name():
+    """The running tommyx script (e.g. "tommyx.agent_batch"), or the file run as __main__."""
+    main = sys.modules.get("__main__")
+    spec = getattr(main, "__spec__", None)
+    if spec is not None and spec.name:
+        return spec.name
+    return os.path.basename(sys.argv[0]) if sys.argv and sys.argv[0] else "python"
+
+
+def connect(path: Optional[str] = None):
+    import sqlite3
+
+    path = path or TELEMETRY_DB
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    conn = sqlite3.connect(path, timeout=5)
+    if path not in _schema_ready:
+        # WAL so concurrent scripts append without blocking each other or the report
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(SCHEMA)
+        _schema_ready.add(path)
+    return conn
+
+
+def insert(conn, table: str, row: dict):
+    columns = ", ".join(row)
+    placeholders = ", ".join("?" for _ in row)
+    return conn.execute(f"INSERT INTO {table} ({columns}) VALUES ({placeholders})", list(row.values())).lastrowid
+
+
+def write(func):
+    """Queue func(conn) to run in a transaction on the writer thread.
+
+    Callers never wait on SQLite, which matters most on the event loop of
+    call_llm_many_async. Records still queued at exit are flushed (see flush).
+    """
+    global _queue, _writer
+    if not ENABLED:
+        return
+
+    with _writer_lock:
+        if _writer is None:
+            _queue = queue.SimpleQueue()
+            _writer = threading.Thread(target=run_writer, args=(_queue,), name="telemetry", daemon=True)
+            _writer.start()
+            atexit.register(flush)
+    _queue.put(func)
+
+
+def run_writer(records):
+    """Body of the writer thread: write whatever has queued up in one transaction, then wait for more."""
+    while True:
+        funcs = [records.get()]
+        while True:
+            try:
+                funcs.append(records.get_nowait())
+            except queue.Empty:
+                break
+
+        write_now([func for func in funcs if not isinstance(func, threading.Event)])
+        for func in funcs:
+            if isinstance(func, threading.Event):
+                func.set()
+
+
+def write_now(funcs):
+    """Run each func(conn) in one transaction; telemetry failures only warn, once."""
+    global _warned
+    if not funcs:
+        return
+
+    import sqlite3
+
+    try:
+        conn = connect()
+        try:
+            with conn:
+                for func in funcs:
+                    func(conn)
+        finally:
+            conn.close()
+
+    except (sqlite3.Error, OSError) as e:
+        if not _warned:
+            _warned = True
+            print(f"Warning: could not record telemetry in {TELEMETRY_DB}: {e}", file=sys.stderr)
+
+
+def flush(timeout: float = FLUSH_TIMEOUT):
+    """Wait up to timeout seconds for the records queued so far to be written."""
+    if _queue is None:
+        return
+    done = threading.Event()
+    _queue.put(done)
+    done.wait(timeout)
+
+
+def reset_after_fork():
+    # the writer thread does not exist in a forked child; records queued before the fork stay the parent's
+    global _queue, _writer, _writer_lock
+    _queue = _writer = None
+    _writer_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=reset_after_fork)
+
+
+def get_price(model: Optional[str]):
+    if not model:
+        return None
+    # longest prefix first, so "gpt-5-mini-2025-08-07" is not priced as "gpt-5"
+    for name in sorted(MODEL_PRICES, key=len, reverse=True):
+        if model == name or model.startswith(name + "-"):
+            return MODEL_PRICES[name]
+    return None
+
+
+def get_usage(response):
+    """(input, cached input, output, reasoning) tokens of a Responses API response, None where missing."""
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return None, None, None, None
+    input_details = getattr(usage, "input_tokens_details", None)
+    output_details = getattr(usage, "output_tokens_details", None)
+    return (
+        getattr(usage, "input_tokens", None),
+        getattr(input_details, "cached_tokens", None),
+        getattr(usage, "output_tokens", None),
+        getattr(output_details, "reasoning_tokens", None),
+    )
+
+
+def record_llm_call(
+    kind: str,
+    requested_model: str,
+    model: str,
+    latency: Optional[float],
+    response=None,
+    cached: bool = False,
+    attempts: int = 1,
+    time_to_first_token: Optional[float] = None,
+    error: Optional[BaseException] = None,
+):
+    """Append one call_llm / call_llm_stream / call_llm_many item to the store."""
+    input_tokens, cached_input_tokens, output_tokens, reasoning_tokens = get_usage(response)
+    cost = None
+    price = get_price(getattr(response, "model", None) or model)
+    if price is not None and input_tokens is not None and output_tokens is not None:
+        cached_tokens = cached_input_tokens or 0
+        cost = ((input_tokens - cached_tokens) * price[0] + cached_tokens * price[1] + output_tokens * price[2]) / 1e6
+    row = {
+        "ts": time.time(),
+        "script": get_script_name(),
+        "kind": kind,
+        "requested_model": requested_model,
+        "model": model,
+        "fallback": int(model != requested_model),
+        "cached": int(cached),
+        "attempts": attempts,
+        "latency_s": latency,
+        "time_to_first_token_s": time_to_first_token,
+        "input_tokens": input_tokens,
+        "cached_input_tokens": cached_input_tokens,
+        "output_tokens": output_tokens,
+        "reasoning_tokens": reasoning_tokens,
+        "cost_usd": cost,
+        "error": f"{type(error).__name__}: {error}" if error is not None else None,
+    }
+    write(lambda conn: insert(conn, "llm_calls", row))
+
+
+def record_agent_session(session: dict, approvals: list[dict]):
+    """Append an agent session (agent_sessions columns) and its tool approvals (tool, source, allowed, wait_s, ts)."""
+    session = {"ts": time.time(), "script": get_script_name(), **session}
+
+    def write_session(conn):
+        session_id = insert(conn, "agent_sessions", session)
+        for approval in approvals:
+            insert(conn, "tool_approvals", {"session_id": session_id, **approval})
+
+    write(write_session)
@@ -0,0 +1,292 @@
+import fnmatch
+import json
+import os
+import re
+import sys
+import time
+from collections import Counter
+from typing import Literal, Optional, Union
+
+from pydantic import BaseModel
+
+# per-project rules, in the directory the agent runs in; checked before the user's. Any repo can
+# ship one (and an agent could write one), so only its deny and ask rules apply unless the user
+# lists the project in trusted_projects
+PROJECT_POLICY_FILE = ".tool_policy.json"
+# rules for every project
+USER_POLICY_FILE = os.path.expanduser("~/.config/tommyx/tool_policy.json")
+# "always" answers kept across sessions, for policies with persist_decisions set
+DECISIONS_FILE = os.path.expanduser("~/.cache/tommyx/tool_policy/decisions.json")
+# cumulative rule fire counts and time spent waiting for answers
+STATS_FILE = os.path.expanduser("~/.cache/tommyx/tool_policy/stats.json")
+
+# tool parameters naming the file or directory a call works on
+PATH_PARAMS = ["file_path", "notebook_path", "path"]
+# shell syntax that can run more than the command an allow prefix names, or write files
+UNSAFE_SHELL = re.compile(r"[;&|`<>\n]|\$\(")
+# splits a shell command into the commands it runs, for deny and ask prefixes
+SHELL_SEPARATORS = re.compile(r"&&|\|\||[;&|\n`]|\$\(")
+
+
+class ToolRule(BaseModel):
+    """One policy rule; every condition given must hold for it to match.
+
+    tool, path and input values are fnmatch patterns (`*` also matches `/`);
+    paths are matched relative to the project when inside it, absolute otherwise.
+    command_prefix matches a Bash command word by word. An allow prefix never
+    matches commands with chaining, substitution or redirection, while deny and
+    ask prefixes match any command in the chain.
+    """
+    action: Literal["allow", "deny", "ask"]
+    tool: Union[str, list[str]] = "*"
+    path: Union[str, list[str], None] = None
+    command_prefix: Union[str, list[str], None] = None
+    input: Optional[dict[str, str]] = None
+    # reason given to the agent when a deny rule fires
+    message: Optional[str] = None
+    # name in stats, default <file>#<index>
+    name: Optional[str] = None
+
+
+class ToolPolicyFile(BaseModel):
+    # first matching rule wins
+    rules: list[ToolRule] = []
+    # keep "always" answers across sessions (in DECISIONS_FILE)
+    persist_decisions: bool = False
+    # projects (directories) whose own policy file is applied in full, allow rules and
+    # persist_decisions included; only read from the user's file
+    trusted_projects: list[str] = []
+
+
+def as_list(value):
+    return [value] if isinstance(value, str) else list(value)
+
+
+def get_call_paths(input_params: dict, root: str):
+    paths = []
+    for param in PATH_PARAMS:
+        value = input_params.get(param)
+        if isinstance(value, str) and value:
+            path = os.path.normpath(os.path.join(root, os.path.expanduser(value)))
+            relative = os.path.relpath(path, root)
+            paths.append(path if relative == ".." or relative.startswith(".." + os.sep) else relative)
+    return paths
+
+
+def starts_with_command(command: str, prefix: str):
+    command, prefix = command.strip(), prefix.strip()
+    return command == prefix or command.startswith(prefix + " ")
+
+
+def rule_matches(rule: ToolRule, tool_name: str, input_params: dict, root: str):
+    if not any(fnmatch.fnmatchcase(tool_name, pattern) for pattern in as_list(rule.tool)):
+        return False
+
+    if rule.path is not None:
+        paths = get_call_paths(input_params, root)
+        patterns = [os.path.expanduser(pattern) for pattern in as_list(rule.path)]
+        if not paths or not all(any(fnmatch.fnmatchcase(path, pattern) for pattern in patterns) for path in paths):
+            return False
+
+    if rule.command_prefix is not None:
+        command = input_params.get("command")
+        if not isinstance(command, str):
+            return False
+        if rule.action == "allow":
+            if UNSAFE_SHELL.search(command):
+                return False
+            commands = [command]
+        else:
+            commands = SHELL_SEPARATORS.split(command)
+        if not any(starts_with_command(c, prefix) for c in commands for prefix in as_list(rule.command_prefix)):
+            return False
+
+    for key, pattern in (rule.input or {}).items():
+        value = input_params.get(key)
+        if value is None:
+            return False
+        if not isinstance(value, str):
+            value = json.dumps(value, sort_keys=True)
+        if not fnmatch.fnmatchcase(value, pattern):
+            return False
+
+    return True
+
+
+def protected_file_rules(root: str):
+    """Rules checked before any policy file: nothing may edit the policy files through the file tools."""
+    # get_call_paths makes paths inside the project relative, so match both forms
+    paths = [PROJECT_POLICY_FILE, f"*/{PROJECT_POLICY_FILE}"]
+    for path in [USER_POLICY_FILE, DECISIONS_FILE]:
+        paths += get_call_paths({"path": path}, root)
+    return [
+        ("builtin#policy-files", ToolRule(
+            action="deny",
+            tool=["Write", "Edit", "MultiEdit", "NotebookEdit"],
+            path=paths,
+            message="Tool policy files can only be changed by the user",
+        )),
+    ]
+
+
+def decision_key(tool_name: str, input_params: dict, root: str):
+    """What an "always" answer covers: the exact command, the file, or else the exact call."""
+    command = input_params.get("command")
+    if isinstance(command, str):
+        return f"{tool_name}: {command.strip()}"
+    paths = get_call_paths(input_params, root)
+    if paths:
+        return f"{tool_name}: {' '.join(paths)}"
+    return f"{tool_name}: {json.dumps(input_params, sort_keys=True)}"
+
+
+def load_json(path, default):
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+
+    except (OSError, ValueError):
+        return default
+
+
+def read_policy_file(path):
+    """Return the ToolPolicyFile at path, or None if there is none or it is broken (with a warning)."""
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r") as f:
+            return ToolPolicyFile(**json.load(f))
+
+    except (OSError, TypeError, ValueError) as e:
+        # pydantic's ValidationError is a ValueError
+        print(f"Warning: ignoring tool policy {path}: {e}", file=sys.stderr)
+        return None
+
+
+def save_json(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+class ToolPolicy:
+    """Decides tool calls from rules and remembered answers, asking fallback about the rest.
+
+    fallback is an async function (tool_name, input_params) -> answer, where "y"
+    approves, "a" approves and remembers the decision (see decision_key) and
+    anything else denies with that reason.
+    """
+
+    def __init__(self, root: str, rules: list[tuple[str, ToolRule]], fallback, persist_decisions: bool = False):
+        self.root = os.path.abspath(root)
+        self.rules = rules
+        self.fallback = fallback
+        self.persist_decisions = persist_decisions
+        self.allowed = set()
+        if persist_decisions:
+            self.allowed.update(load_json(DECISIONS_FILE, {}).get(self.root, []))
+
+        self.rule_counts = Counter()
+        self.remembered = 0
+        self.asked = 0
+        self.human_wait = 0.0
+
+    @classmethod
+    def load(cls, root: str, fallback):
+        """Read the project's and the user's policy files; a broken file is skipped with a warning.
+
+        A project file only adds deny and ask rules, unless the user's file lists
+        the project in trusted_projects.
+        """
+        root = os.path.abspath(root)
+        project_path = os.path.join(root, PROJECT_POLICY_FILE)
+        project_file = read_policy_file(project_path)
+        user_file = read_policy_file(USER_POLICY_FILE)
+
+        rules = protected_file_rules(root)
+        persist_decisions = False
+        if project_file is not None:
+            trusted = user_file is not None and any(
+                os.path.abspath(os.path.expanduser(project)) == root for project in user_file.trusted_projects
+            )
+            project_rules = [(rule.name or f"{project_path}#{i + 1}", rule) for i, rule in enumerate(project_file.rules)]
+            if not trusted:
+                ignored = sum(1 for _, rule in project_rules if rule.action == "allow")
+                if ignored:
+                    print(
+                        f"Warning: ignoring {ignored} allow rule(s) of untrusted tool policy {project_path}, "
+                        f"add {root} to trusted_projects in {USER_POLICY_FILE} to apply them",
+                        file=sys.stderr,
+                    )
+                project_rules = [(name, rule) for name, rule in project_rules if rule.action != "allow"]
+            rules += project_rules
+            persist_decisions = trusted and project_file.persist_decisions
+
+        if user_file is not None:
+            rules += [(rule.name or f"{USER_POLICY_FILE}#{i + 1}", rule) for i, rule in enumerate(user_file.rules)]
+            persist_decisions = persist_decisions or user_file.persist_decisions
+
+        return cls(root, rules, fallback, persist_decisions)
+
+    def match(self, tool_name: str, input_params: dict):
+        """Return (rule name, rule) of the first matching rule, or None."""
+        for name, rule in self.rules:
+            if rule_matches(rule, tool_name, input_params, self.root):
+                return name, rule
+        return None
+
+    async def approve(self, tool_name: str, input_params: dict):
+        """Return (answer, source), source telling how the call was decided: "rule <name>", "remembered" or "asked"."""
+        key = decision_key(tool_name, input_params, self.root)
+        matched = self.match(tool_name, input_params)
+        if matched is not None:
+            name, rule = matched
+            self.rule_counts[name] += 1
+            if rule.action == "allow":
+                return "y", f"rule {name}"
+            if rule.action == "deny":
+                return rule.message or f"Denied by tool policy rule {name}", f"rule {name}"
+        elif key in self.allowed:
+            self.remembered += 1
+            return "y", "remembered"
+
+        started_at = time.monotonic()
+        try:
+            answer = await self.fallback(tool_name, input_params)
+        finally:
+            self.asked += 1
+            self.human_wait += time.monotonic() - started_at
+
+        if answer.lower() == "a":
+            self.allowed.add(key)
+            if self.persist_decisions:
+                decisions = load_json(DECISIONS_FILE, {})
+                decisions[self.root] = sorted(set(decisions.get(self.root, [])) | {key})
+                save_json(DECISIONS_FILE, decisions)
+            return "y", "asked"
+
+        return answer, "asked"
+
+    def summary(self):
+        fired = sum(self.rule_counts.values())
+        return (
+            f"tool policy: {fired} decided by rules, {self.remembered} remembered, "
+            f"{self.asked} asked ({self.human_wait:.1f}s waiting)"
+        )
+
+    def save_stats(self):
+        """Add this session's counts to STATS_FILE."""
+        stats = load_json(STATS_FILE, {})
+        rules = stats.setdefault("rules", {})
+        for name, count in self.rule_counts.items():
+            rules[name] = rules.get(name, 0) + count
+        stats["sessions"] = stats.get("sessions", 0) + 1
+        stats["remembered"] = stats.get("remembered", 0) + self.remembered
+        stats["asked"] = stats.get("asked", 0) + self.asked
+        stats["human_wait_s"] = stats.get("human_wait_s", 0.0) + self.human_wait
+        try:
+            save_json(STATS_FILE, stats)
+        except OSError as e:
+            print(f"Warning: could not save tool policy stats: {e}", file=sys.stderr)
@@ -1,27 +1,99 @@
+# requests is imported where used, so importing this module is cheap
+import codecs
+import re
 import sys
-from urllib.request import urlopen
+import time
+from collections import Counter
 from html.parser import HTMLParser
-import requests
-from bs4 import BeautifulSoup
+from typing import NamedTuple, Optional
+
+from tommyx.utils import http_cache
+
+# bytes asked of the socket per read while streaming a page
+FETCH_CHUNK_SIZE = 16 * 1024
+# stop reading a page after this many (decompressed) bytes
+MAX_FETCH_BYTES = 5 * 1024 * 1024
+# seconds a whole page fetch may take; every connect and read also times out after this
+FETCH_TIMEOUT = 10.0
+# a page left unread by at most this many bytes is read to the end, so its connection can be reused
+KEEPALIVE_DRAIN_BYTES = 64 * 1024
+# pages get_texts / get_titles fetch at once, in total and from one host
+MAX_FETCH_CONCURRENCY = 16
+MAX_FETCH_PER_HOST = 4
+
+HEADER_CHARSET_RE = re.compile(r"""charset\s*=\s*["']?([\w.:-]+)""", re.IGNORECASE)
+META_CHARSET_RE = re.compile(rb"""<meta[^>]+charset\s*=\s*["']?([\w.:-]+)""", re.IGNORECASE)
+
+# created on first use, see get_session()
+session = None
+# (host pools, connections per host pool) of its adapter
+session_pool_sizes = (0, 0)
+
+MISS = object()
+
+
+def get_session(max_concurrency=MAX_FETCH_CONCURRENCY, max_per_host=MAX_FETCH_PER_HOST):
+    """The keep-alive requests session every fetch shares.
+
+    Its pools keep at least max_per_host connections per host, for max_concurrency
+    hosts; asking for more than before re-mounts bigger pools, as connections a
+    full pool cannot take back are closed instead of reused.
+    """
+    global session, session_pool_sizes
+    if session is None:
+        import requests
+
+        session = requests.Session()
+    pool_sizes = (max(session_pool_sizes[0], max_concurrency), max(session_pool_sizes[1], max_per_host))
+    if pool_sizes != session_pool_sizes:
+        from requests.adapters import HTTPAdapter
+
+        adapter = HTTPAdapter(pool_connections=pool_sizes[0], pool_maxsize=pool_sizes[1])
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        session_pool_sizes = pool_sizes
+    return session
+
+
+class FetchResult(NamedTuple):
+    # position of url in the list given to get_texts / get_titles
+    index: int
+    url: str
+    # the text or title, None if the fetch failed
+    value: Optional[str]
+    error: Optional[Exception]
 
 
 class TitleParser(HTMLParser):
     def __init__(self):
         super().__init__()
         self.in_title = False
+        self.title_parts = []
         self.title = None
 
+    @property
+    def done(self):
+        return self.title is not None
+
     def handle_starttag(self, tag, attrs):
-        if tag == 'title':
+        if tag == 'title' and self.title is None:
             self.in_title = True
 
     def handle_endtag(self, tag):
-        if tag == 'title':
+        if tag == 'title' and self.in_title:
             self.in_title = False
+            self.title = "".join(self.title_parts).strip()
 
     def handle_data(self, data):
-        if self.in_title and self.title is None:
-            self.title = data.strip()
+        # fed chunk by chunk, the title text can arrive in several pieces
+        if self.in_title:
+            self.title_parts.append(data)
+
+    def close(self):
+        super().close()
+        # a page cut off (or broken) inside its title
+        if self.in_title:
+            self.handle_endtag('title')
 
 
 class TextParser(HTMLParser):
@@ -29,61 +101,321 @@ class TextParser(HTMLParser):
         super().__init__()
         self.text_parts = []
         self.ignore_tags = {'script', 'style', 'noscript'}
-        self.in_ignored_tag = False
+        self.ignored_depth = 0
         self.max_chars = max_chars
         self.total_chars = 0
         self.limit_reached = False
+        # text since the last tag; fed chunk by chunk, a word can arrive in several pieces
+        self.pending = []
+
+    @property
+    def done(self):
+        return self.limit_reached or (self.max_chars is not None and self.total_chars >= self.max_chars)
 
     def handle_starttag(self, tag, attrs):
+        self.flush()
         if tag in self.ignore_tags:
-            self.in_ignored_tag = True
+            self.ignored_depth += 1
 
     def handle_endtag(self, tag):
-        if tag in self.ignore_tags:
-            self.in_ignored_tag = False
+        self.flush()
+        if tag in self.ignore_tags and self.ignored_depth > 0:
+            self.ignored_depth -= 1
 
     def handle_data(self, data):
-        if not self.in_ignored_tag and not self.limit_reached:
-            text = data.strip()
-            if text:
-                if self.max_chars is not None:
-                    remaining = self.max_chars - self.total_chars
-                    if remaining <= 0:
-                        self.limit_reached = True
-                        return
-                    if len(text) > remaining:
-                        text = text[:remaining]
-                        self.limit_reached = True
-                self.text_parts.append(text)
-                self.total_chars += len(text)
+        if not self.ignored_depth and not self.limit_reached:
+            self.pending.append(data)
 
+    def flush(self):
+        text = "".join(self.pending).strip()
+        self.pending = []
+        if not text or self.limit_reached:
+            return
+        # count the space get_text joins parts with, so max_chars bounds the result
+        if self.text_parts:
+            text = " " + text
+        if self.max_chars is not None:
+            remaining = self.max_chars - self.total_chars
+            if remaining <= 0:
+                self.limit_reached = True
+                return
+            if len(text) > remaining:
+                text = text[:remaining].rstrip()
+                self.limit_reached = True
+        if text.strip():
+            self.text_parts.append(text.lstrip())
+            self.total_chars += len(text)
 
-def get_title_from_url(url):
-    """Fetch the webpage and extract the title."""
-    with urlopen(url, timeout=10) as response:
-        html = response.read().decode('utf-8', errors='ignore')
+    def close(self):
+        super().close()
+        self.flush()
+
+    def get_text(self):
+        return " ".join(self.text_parts)
+
+
+def get_charset(content_type, head: bytes):
+    """Charset from the Content-Type header, else from a <meta> tag in the first chunk, else UTF-8."""
+    for match in [HEADER_CHARSET_RE.search(content_type or ""), META_CHARSET_RE.search(head)]:
+        if match:
+            charset = match.group(1)
+            if isinstance(charset, bytes):
+                charset = charset.decode("ascii", errors="ignore")
+            try:
+                return codecs.lookup(charset).name
+            except LookupError:
+                pass
+    return "utf-8"
+
+
+def read_page(url, parsers, done, headers=None, keep_body=False, timeout=FETCH_TIMEOUT, max_bytes=MAX_FETCH_BYTES):
+    """Feed the page at url to parsers chunk by chunk, until done(), max_bytes or timeout.
+
+    Reading stops there and the rest of the body is not downloaded; the connection
+    goes back to the shared session's pool only if little of the page was left.
+    A parser is no longer fed once it is done itself. A 304 is returned unread;
+    other HTTP errors and network errors are raised.
+
+    Returns (response, body, stopped_by): the bytes read if keep_body, and
+    "done", "max_bytes", "timeout" or None if the whole page was read.
+    """
+    from urllib3.exceptions import ReadTimeoutError
+
+    deadline = time.monotonic() + timeout
+    stopped_by = None
+    chunks = []
+    with get_session().get(url, stream=True, timeout=timeout, headers=headers) as response:
+        if response.status_code == 304:
+            return response, None, None
+        response.raise_for_status()
+
+        raw = response.raw
+        # read1 (urllib3 >= 2.3) returns what one socket read brings, so a page trickling in
+        # a byte at a time cannot hold a read past the deadline; read waits for a full chunk
+        read = getattr(raw, "read1", raw.read)
+        connection = getattr(raw, "connection", None)
+        sock = getattr(connection, "sock", None)
+        decoder = None
+        received = 0
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                stopped_by = "timeout"
+                break
+            if sock is not None:
+                # a stalled server is given only the time left, not a whole read timeout
+                sock.settimeout(remaining)
+            try:
+                chunk = read(FETCH_CHUNK_SIZE, decode_content=True)
+
+            except ReadTimeoutError:
+                if time.monotonic() < deadline:
+                    raise
+                stopped_by = "timeout"
+                break
+
+            if not chunk:
+                break
+            if decoder is None:
+                charset = get_charset(response.headers.get("content-type"), chunk)
+                decoder = codecs.getincrementaldecoder(charset)(errors="ignore")
+            received += len(chunk)
+            if keep_body:
+                chunks.append(chunk)
+            text = decoder.decode(chunk)
+            for parser in parsers:
+                if not parser.done:
+                    parser.feed(text)
+            if done():
+                stopped_by = "done"
+            elif received >= max_bytes:
+                stopped_by = "max_bytes"
+            if stopped_by is not None:
+                break
+        if decoder is not None:
+            text = decoder.decode(b"", final=True)
+            for parser in parsers:
+                if not parser.done:
+                    parser.feed(text)
+
+        # a timed-out server is too slow to drain
+        if stopped_by in ("done", "max_bytes"):
+            length = response.headers.get("content-length", "")
+            if length.isdigit() and int(length) - response.raw.tell() <= KEEPALIVE_DRAIN_BYTES:
+                response.raw.drain_conn()
+
+    for parser in parsers:
+        parser.close()
+    return response, b"".join(chunks) if keep_body else None, stopped_by
 
-    parser = TitleParser()
-    parser.feed(html)
 
-    if parser.title:
-        return parser.title
+def get_cached_value(entry, kind, max_chars=None):
+    """The title or text (up to max_chars) a cache entry holds, or MISS if its fetch stopped short of it."""
+    if kind == "title":
+        return entry["title"] if entry["title_known"] else MISS
+    if entry["text"] is None:
+        return MISS
+    if entry["text_max_chars"] is not None and (max_chars is None or max_chars > entry["text_max_chars"]):
+        return MISS
+    return entry["text"] if max_chars is None else entry["text"][:max_chars].rstrip()
+
+
+def store_page_values(url, entry, response, now, body, stopped_by, title_parser, text_parser, max_chars):
+    values = {
+        "charset": get_charset(response.headers.get("content-type"), body[:FETCH_CHUNK_SIZE]),
+        "body_complete": stopped_by is None,
+        "title": title_parser.title or None,
+        # past max_bytes there is nothing more to find
+        "title_known": title_parser.done or stopped_by != "done",
+        "text": text_parser.get_text() if text_parser is not None else None,
+        # None if the text is all of the page's (up to max_bytes)
+        "text_max_chars": max_chars if text_parser is not None and text_parser.done else None,
+    }
+    # a refetch of the same version keeps what an earlier fetch got further with
+    same_version = entry is not None and all(
+        entry["headers"].get(name) == response.headers.get(name) for name in ["etag", "last-modified"]
+    )
+    if same_version and entry["title_known"] and not values["title_known"]:
+        values["title"], values["title_known"] = entry["title"], True
+    if same_version and entry["text"] is not None and values["text"] is None:
+        values["text"], values["text_max_chars"] = entry["text"], entry["text_max_chars"]
+    http_cache.put(url, response.headers, now, values, body)
+
+
+def fetch_page_value(url, kind, max_chars=None):
+    """Return the title (None if the page has none) or the text of url, through the HTTP cache.
+
+    A fresh cache entry is answered without a request and a stale one is
+    revalidated with a conditional GET; either way nothing is parsed again.
+    Otherwise the page is streamed, stopping once the title is complete or
+    max_chars of text are collected, and stored with what was extracted.
+    """
+    now = time.time()
+    entry = http_cache.get(url) if http_cache.ENABLED else None
+    cached = get_cached_value(entry, kind, max_chars) if entry is not None else MISS
+    if cached is not MISS and http_cache.is_fresh(entry, now):
+        http_cache.stats["fresh"] += 1
+        return cached
+
+    title_parser = TitleParser()
+    if kind == "title":
+        text_parser = None
+        parsers = [title_parser]
+        done = lambda: title_parser.done
     else:
+        # the title usually comes first, so it is cached with the text for free
+        text_parser = TextParser(max_chars)
+        parsers = [text_parser, title_parser]
+        done = lambda: text_parser.done
+
+    headers = http_cache.conditional_headers(entry) if cached is not MISS else None
+    response, body, stopped_by = read_page(url, parsers, done, headers=headers, keep_body=http_cache.ENABLED)
+    if response.status_code == 304:
+        http_cache.stats["revalidated"] += 1
+        http_cache.update(entry, response.headers, now)
+        return cached
+
+    http_cache.stats["miss"] += 1
+    # a fetch cut off by the timeout is not what the page holds
+    if http_cache.ENABLED and stopped_by != "timeout" and http_cache.is_storable(response.status_code, response.headers):
+        store_page_values(url, entry, response, now, body, stopped_by, title_parser, text_parser, max_chars)
+
+    if kind == "title":
+        return title_parser.title or None
+    return text_parser.get_text()
+
+
+def fetch_title(url):
+    """Return the title of the webpage, reading no further than the title; raises ValueError if it has none."""
+    title = fetch_page_value(url, "title")
+    if not title:
+        raise ValueError(f"no title in {url}")
+    return title
+
+
+def fetch_text(url, max_chars=None):
+    """Return the visible text of the webpage, reading only until max_chars are collected."""
+    return fetch_page_value(url, "text", max_chars)
+
+
+def fetch_many(urls, fetch, ordered=True, max_concurrency=MAX_FETCH_CONCURRENCY, max_per_host=MAX_FETCH_PER_HOST):
+    """Run fetch(url) over urls on a thread pool, yielding a FetchResult per url.
+
+    Results come in input order if ordered, else as they complete. At most
+    max_concurrency fetches run at once and at most max_per_host against one
+    host, so a list dominated by one site neither hammers it nor starves the
+    others. A failed fetch is a result with its error, the others go on.
+    """
+    from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+    from urllib.parse import urlsplit
+
+    urls = list(urls)
+    hosts = [urlsplit(url).netloc.lower() for url in urls]
+    # sized before the threads start, so they share one adapter whose pools fit max_per_host
+    get_session(max_concurrency, max_per_host)
+
+    def run(index):
+        try:
+            return FetchResult(index, urls[index], fetch(urls[index]), None)
+        except Exception as e:
+            return FetchResult(index, urls[index], None, e)
+
+    waiting = list(range(len(urls)))
+    running = {}
+    running_per_host = Counter()
+    finished = {}
+    next_index = 0
+    with ThreadPoolExecutor(max_workers=max(1, max_concurrency)) as executor:
+        while waiting or running:
+            # start the earliest urls whose host has a free slot
+            blocked = []
+            for index in waiting:
+                if len(running) < max_concurrency and running_per_host[hosts[index]] < max_per_host:
+                    running[executor.submit(run, index)] = index
+                    running_per_host[hosts[index]] += 1
+                else:
+                    blocked.append(index)
+            waiting = blocked
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                index = running.pop(future)
+                running_per_host[hosts[index]] -= 1
+                if ordered:
+                    finished[index] = future.result()
+                else:
+                    yield future.result()
+            while next_index in finished:
+                yield finished.pop(next_index)
+                next_index += 1
+
+
+def get_titles(urls, ordered=True, max_concurrency=MAX_FETCH_CONCURRENCY, max_per_host=MAX_FETCH_PER_HOST):
+    """Fetch the titles of many webpages concurrently; see fetch_many for the results."""
+    return fetch_many(urls, fetch_title, ordered, max_concurrency, max_per_host)
+
+
+def get_texts(urls, max_chars=None, ordered=True, max_concurrency=MAX_FETCH_CONCURRENCY, max_per_host=MAX_FETCH_PER_HOST):
+    """Fetch the visible text of many webpages concurrently; see fetch_many for the results."""
+    return fetch_many(urls, lambda url: fetch_text(url, max_chars), ordered, max_concurrency, max_per_host)
+
+
+def get_title_from_url(url):
+    """Fetch the webpage and extract the title, reading no further than the title."""
+    try:
+        return fetch_title(url)
+
+    except ValueError:
         print("Error: Could not extract title from URL", file=sys.stderr)
         sys.exit(1)
 
 
 def get_text_from_url(url, max_chars=None):
+    """Fetch the webpage and extract its visible text, reading only until max_chars are collected."""
     try:
-        response = requests.get(url)
-        soup = BeautifulSoup(response.text, "html.parser")
-
-        # Extract full text
-        text = soup.get_text(separator=" ", strip=True)
+        return fetch_text(url, max_chars)
 
-        return text[:max_chars]
-    
     except Exception as e:
-        print(f"Warning: Could not get text from URL: {url}")
-        print(e)
+        print(f"Warning: Could not get text from URL: {url}", file=sys.stderr)
+        print(e, file=sys.stderr)
         return None
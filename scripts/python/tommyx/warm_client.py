@@ -0,0 +1,153 @@
+"""Client for the warm interpreter server (see warm_server.py).
+
+Run by -run-tommyx-python-script as `python3 -I -S warm_client.py <script> [args...]`
+so that it starts in a few milliseconds: standard library only, no site packages,
+nothing from tommyx. Hands argv, cwd, the environment and its stdin/stdout/stderr
+file descriptors to the server, forwards signals to the process running the
+script and exits with its exit code. Falls back to `uv run` if the server does
+not answer, or if the socket, its directory or the process listening on it is
+not this user's (the request carries the environment, API keys included).
+
+Scripts run by the server have no controlling terminal (the server runs in a
+session of its own, and a terminal cannot be made the controlling terminal of a
+second session), so /dev/tty prompts from ssh, git credential helpers or getpass
+would fail. From a terminal only TTY_FREE_MODULES are served warm; everything
+else takes the cold path. Ctrl-Z stops the script along with the client.
+"""
+
+import json
+import os
+import signal
+import socket
+import stat
+import struct
+import sys
+
+FORWARDED_SIGNALS = [signal.SIGINT, signal.SIGTERM, signal.SIGHUP, signal.SIGQUIT]
+
+# scripts that never open /dev/tty, nor run anything that does (ssh, git fetch/push, getpass);
+# served warm even when the client has a controlling terminal
+TTY_FREE_MODULES = {"prompt_history", "telemetry_report", "bench_diff", "bench_import_time"}
+
+
+def get_socket_dir():
+    # keep in sync with -run-tommyx-python-script; private (0700) to this user, see check_socket
+    return os.path.join(os.environ.get("XDG_RUNTIME_DIR") or "/tmp", f"tommyx-warm-{os.getuid()}")
+
+
+def get_socket_path():
+    return os.path.join(get_socket_dir(), "server.sock")
+
+
+def check_socket(path):
+    """Raise PermissionError unless path is a socket of ours in a directory only we can enter.
+
+    /tmp is shared, so another user could create the directory or socket first.
+    """
+    uid = os.getuid()
+    st = os.lstat(os.path.dirname(path))
+    if not stat.S_ISDIR(st.st_mode) or st.st_uid != uid or st.st_mode & 0o077:
+        raise PermissionError(f"{os.path.dirname(path)} is not a directory private to uid {uid}")
+    st = os.lstat(path)
+    if not stat.S_ISSOCK(st.st_mode) or st.st_uid != uid:
+        raise PermissionError(f"{path} is not a socket owned by uid {uid}")
+
+
+def get_peer_uid(sock):
+    """uid of the process at the other end of a connected Unix socket, None where the platform cannot tell."""
+    if hasattr(socket, "SO_PEERCRED"):
+        # Linux: struct ucred {pid, uid, gid}
+        _, uid, _ = struct.unpack("3i", sock.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i")))
+        return uid
+    if hasattr(socket, "LOCAL_PEERCRED"):
+        # macOS and BSDs: struct xucred {version, uid, ...} at level SOL_LOCAL (0)
+        _, uid = struct.unpack("2I", sock.getsockopt(0, socket.LOCAL_PEERCRED, 256)[:8])
+        return uid
+    return None
+
+
+def connect(path):
+    """Connect to the server socket at path, refusing (PermissionError) anything not run by this user."""
+    check_socket(path)
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+        if get_peer_uid(sock) != os.getuid():
+            raise PermissionError(f"{path} is not served by uid {os.getuid()}")
+    except OSError:
+        sock.close()
+        raise
+
+    return sock
+
+
+def has_controlling_terminal():
+    try:
+        fd = os.open("/dev/tty", os.O_RDWR | os.O_NOCTTY)
+    except OSError:
+        return False
+    os.close(fd)
+    return True
+
+
+def fallback(module, args):
+    os.execvp("uv", ["uv", "run", "python", "-m", f"tommyx.{module}", *args])
+
+
+def send_request(sock, request, fds):
+    data = json.dumps(request).encode()
+    data = struct.pack(">I", len(data)) + data
+    sent = socket.send_fds(sock, [data], fds)
+    if sent < len(data):
+        sock.sendall(data[sent:])
+
+
+def main():
+    module, args = sys.argv[1], sys.argv[2:]
+    if module not in TTY_FREE_MODULES and has_controlling_terminal():
+        fallback(module, args)
+
+    try:
+        sock = connect(get_socket_path())
+        send_request(sock, {"module": module, "argv": args, "cwd": os.getcwd(), "env": dict(os.environ)}, [0, 1, 2])
+        reader = sock.makefile("rb")
+        line = reader.readline()
+
+    except PermissionError as e:
+        print(f"Warning: not using the warm server: {e}", file=sys.stderr)
+        fallback(module, args)
+    except (OSError, AttributeError):
+        # no server, a stale socket, someone else's socket, or a Python without socket.send_fds
+        fallback(module, args)
+
+    if not line:
+        # the server is shutting down or restarting into a new environment
+        fallback(module, args)
+
+    pid = json.loads(line)["pid"]
+
+    def forward(signum, frame):
+        try:
+            os.kill(pid, signum)
+        except ProcessLookupError:
+            pass
+
+    def suspend(signum, frame):
+        # the script's process group is orphaned, so it would discard a SIGTSTP; SIGSTOP it instead
+        forward(signal.SIGSTOP, frame)
+        signal.signal(signal.SIGTSTP, signal.SIG_DFL)
+        os.kill(os.getpid(), signal.SIGTSTP)
+        # continued by the shell (fg/bg)
+        signal.signal(signal.SIGTSTP, suspend)
+        forward(signal.SIGCONT, frame)
+
+    for signum in FORWARDED_SIGNALS:
+        signal.signal(signum, forward)
+    signal.signal(signal.SIGTSTP, suspend)
+
+    line = reader.readline()
+    sys.exit(json.loads(line)["exit"] if line else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,402 @@
+#!/usr/bin/env python3
+"""Warm interpreter server for -run-tommyx-python-script.
+
+Keeps one interpreter with the uv environment resolved and the common modules
+imported, listening on a Unix socket. For each request (sent by warm_client.py)
+it forks, takes over the client's stdin/stdout/stderr, cwd, environment and argv,
+and runs `tommyx.<script>` as __main__. Prompts via input() work because the
+script reads and writes the client's own terminal, but the script has no
+controlling terminal, so from a terminal the client only uses the server for
+scripts that never open /dev/tty (see warm_client.py). The client forwards
+Ctrl-C, Ctrl-Z and other signals and exits with the script's exit code.
+
+The tommyx modules themselves are re-imported in every forked script, after the
+client's environment is applied, since some of them read settings from it at
+import time (TOMMYX_HTTP_CACHE, TOMMYX_TELEMETRY, the cache paths under HOME);
+the preload still pays for their third-party imports. `check` verifies that a
+per-call override reaches the script.
+
+When a file of the tommyx package changes, the server restarts itself after
+serving the request. A change to
+pyproject.toml shuts it down instead, since the environment may have to be
+resolved again; clients then fall back to `uv run` until it is started again.
+
+    -run-tommyx-python-script warm_server.py start|stop|status|check|serve
+"""
+
+import argparse
+import atexit
+import importlib
+import json
+import os
+import runpy
+import signal
+import socket
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+import traceback
+
+from tommyx.warm_client import connect, get_peer_uid, get_socket_dir, get_socket_path, send_request
+
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_FILE = os.path.join(os.path.dirname(PACKAGE_DIR), "pyproject.toml")
+LOG_FILE = os.path.expanduser("~/.cache/tommyx/warm_server.log")
+
+# imported once by the server, so forked scripts find them in sys.modules (tommyx.* only for their dependencies)
+PRELOAD_MODULES = [
+    "asyncio",
+    "concurrent.futures",
+    "pydantic",
+    "openai",
+    "rich.console",
+    "rich.panel",
+    "requests",
+    "bs4",
+    "claude_agent_sdk",
+    "tommyx.utils.ai",
+    "tommyx.utils.web",
+    "tommyx.utils.diff",
+    "tommyx.utils.git",
+    "tommyx.utils.git_status",
+    "tommyx.utils.fs_watch",
+    "tommyx.utils.llm_cache",
+]
+
+# idle seconds after which the server exits, controlled via command-line (None to never exit)
+IDLE_TIMEOUT = None
+
+
+def get_sources_fingerprint():
+    """Return (mtimes of the package's .py files, mtime of pyproject.toml)."""
+    mtimes = {}
+    stack = [PACKAGE_DIR]
+    while stack:
+        path = stack.pop()
+        with os.scandir(path) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False) and entry.name != "__pycache__":
+                    stack.append(entry.path)
+                elif entry.name.endswith(".py"):
+                    mtimes[entry.path] = entry.stat().st_mtime_ns
+
+    try:
+        project_mtime = os.stat(PROJECT_FILE).st_mtime_ns
+    except OSError:
+        project_mtime = None
+
+    return mtimes, project_mtime
+
+
+def preload():
+    for module in PRELOAD_MODULES:
+        try:
+            importlib.import_module(module)
+        except Exception as e:
+            print(f"Warning: could not preload {module}: {e}", file=sys.stderr)
+
+
+def receive_request(conn):
+    data, fds, _, _ = socket.recv_fds(conn, 65536, 3)
+    if len(data) < 4:
+        raise ValueError("truncated request")
+    length, = struct.unpack(">I", data[:4])
+    data = data[4:]
+    while len(data) < length:
+        chunk = conn.recv(length - len(data))
+        if not chunk:
+            raise ValueError("truncated request")
+        data += chunk
+
+    return json.loads(data), fds
+
+
+def send_message(conn, message):
+    conn.sendall(json.dumps(message).encode() + b"\n")
+
+
+def exit_code_of(e):
+    if e.code is None:
+        return 0
+    if isinstance(e.code, int):
+        return e.code
+    print(e.code, file=sys.stderr)
+    return 1
+
+
+def run_script(request, fds):
+    """Body of the forked process running a script; never returns."""
+    signal.signal(signal.SIGINT, signal.default_int_handler)
+    for signum in (signal.SIGTERM, signal.SIGHUP, signal.SIGQUIT, signal.SIGCHLD, signal.SIGPIPE):
+        signal.signal(signum, signal.SIG_DFL)
+
+    for target, fd in enumerate(fds):
+        os.dup2(fd, target)
+        os.close(fd)
+    # fresh stdio objects, buffered the way a normal interpreter on these fds would be
+    sys.stdin = open(0, "r", closefd=False)
+    sys.stdout = open(1, "w", buffering=1 if os.isatty(1) else -1, closefd=False)
+    sys.stderr = open(2, "w", buffering=1, closefd=False)
+
+    os.chdir(request["cwd"])
+    os.environ.clear()
+    os.environ.update(request["env"])
+    # re-imported so that settings read at import time come from the client's environment
+    for name in [name for name in sys.modules if name == "tommyx" or name.startswith("tommyx.")]:
+        del sys.modules[name]
+
+    module = f"tommyx.{request['module']}"
+    sys.argv = [module, *request["argv"]]
+    try:
+        runpy.run_module(module, run_name="__main__", alter_sys=True)
+        code = 0
+    except SystemExit as e:
+        code = exit_code_of(e)
+    except KeyboardInterrupt:
+        traceback.print_exc()
+        code = 130
+    except BaseException:
+        traceback.print_exc()
+        code = 1
+
+    # os._exit skips them, and scripts rely on them as in a normal exit (e.g. telemetry's flush)
+    atexit._run_exitfuncs()
+    for stream in (sys.stdout, sys.stderr):
+        try:
+            stream.flush()
+        except OSError:
+            pass
+    os._exit(code)
+
+
+def handle_request(conn, request, fds):
+    """Body of the forked process serving one connection; never returns.
+
+    Runs the script in a child of its own, so the exit status is reported even
+    if the script dies from a signal.
+    """
+    signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+    pid = os.fork()
+    if pid == 0:
+        conn.close()
+        run_script(request, fds)
+
+    for fd in fds:
+        os.close(fd)
+    code = 1
+    try:
+        send_message(conn, {"pid": pid})
+        _, status = os.waitpid(pid, 0)
+        code = os.waitstatus_to_exitcode(status)
+        # like a shell: 128 + signal number for scripts killed by a signal
+        send_message(conn, {"exit": 128 - code if code < 0 else code})
+
+    except OSError:
+        # the client went away
+        pass
+
+    os._exit(0)
+
+
+def make_socket_dir():
+    """Create the socket directory, private to this user; exit if someone else got there first."""
+    path = get_socket_dir()
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    st = os.lstat(path)
+    if not os.path.isdir(path) or os.path.islink(path) or st.st_uid != os.getuid():
+        print(f"Error: {path} is not a directory owned by uid {os.getuid()}, not serving", file=sys.stderr)
+        sys.exit(1)
+    if st.st_mode & 0o077:
+        os.chmod(path, 0o700)
+
+
+def serve(listen_fd=None):
+    if listen_fd is None:
+        make_socket_dir()
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        path = get_socket_path()
+        if os.path.exists(path):
+            os.remove(path)
+        # no window in which the socket is accessible to others
+        umask = os.umask(0o077)
+        try:
+            server.bind(path)
+        finally:
+            os.umask(umask)
+        os.chmod(path, 0o600)
+        server.listen(64)
+    else:
+        server = socket.socket(fileno=listen_fd)
+
+    preload()
+    fingerprint = get_sources_fingerprint()
+    # forked connection handlers are reaped automatically
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+    server.settimeout(IDLE_TIMEOUT)
+    print(f"[{time.strftime('%H:%M:%S')}] warm server {os.getpid()} listening on {get_socket_path()}", file=sys.stderr)
+
+    while True:
+        try:
+            conn, _ = server.accept()
+        except socket.timeout:
+            print(f"[{time.strftime('%H:%M:%S')}] idle for {IDLE_TIMEOUT}s, exiting", file=sys.stderr)
+            break
+
+        try:
+            if get_peer_uid(conn) not in (os.getuid(), None):
+                raise ValueError("client is another user")
+            request, fds = receive_request(conn)
+        except (OSError, ValueError) as e:
+            print(f"Warning: bad request: {e}", file=sys.stderr)
+            conn.close()
+            continue
+
+        if request.get("command") == "stop":
+            send_message(conn, {"stopped": os.getpid()})
+            conn.close()
+            break
+        if request.get("command") == "status":
+            send_message(conn, {"pid": os.getpid(), "modules": len(sys.modules)})
+            conn.close()
+            continue
+
+        current = get_sources_fingerprint()
+        if current[1] != fingerprint[1]:
+            # closing without an answer makes the client fall back to uv run
+            print(f"[{time.strftime('%H:%M:%S')}] {PROJECT_FILE} changed, exiting", file=sys.stderr)
+            for fd in fds:
+                os.close(fd)
+            conn.close()
+            break
+
+        reload_package = current != fingerprint
+        if os.fork() == 0:
+            server.close()
+            handle_request(conn, request, fds)
+        for fd in fds:
+            os.close(fd)
+        conn.close()
+
+        if reload_package:
+            print(f"[{time.strftime('%H:%M:%S')}] tommyx sources changed, restarting", file=sys.stderr)
+            os.set_inheritable(server.fileno(), True)
+            os.execv(sys.executable, [sys.executable, "-m", "tommyx.warm_server", "serve", "--listen-fd", str(server.fileno())])
+
+    try:
+        os.remove(get_socket_path())
+    except OSError:
+        pass
+
+
+def send_command(command):
+    """Send a control command to a running server; returns its reply or None if none is running."""
+    try:
+        sock = connect(get_socket_path())
+        send_request(sock, {"command": command}, [])
+        line = sock.makefile("rb").readline()
+
+    except OSError:
+        return None
+
+    return json.loads(line) if line else None
+
+
+def get_env_settings():
+    """Settings the tommyx modules read from the environment at import time."""
+    from tommyx.utils import http_cache, llm_cache, telemetry
+
+    return {
+        "TOMMYX_HTTP_CACHE": http_cache.ENABLED,
+        "TOMMYX_TELEMETRY": telemetry.ENABLED,
+        "http_cache.CACHE_DIR": http_cache.CACHE_DIR,
+        "llm_cache.CACHE_DIR": llm_cache.CACHE_DIR,
+        "telemetry.TELEMETRY_DB": telemetry.TELEMETRY_DB,
+    }
+
+
+def check():
+    """Run a script through the server with overridden env settings and compare with a cold interpreter."""
+    if send_command("status") is None:
+        print("Warm server is not running.")
+        sys.exit(1)
+
+    with tempfile.TemporaryDirectory() as home:
+        env = dict(os.environ, HOME=home, TOMMYX_HTTP_CACHE="0", TOMMYX_TELEMETRY="0")
+        expected = json.loads(subprocess.run(
+            [sys.executable, "-m", "tommyx.warm_server", "env-settings"],
+            cwd=os.path.dirname(PACKAGE_DIR), env=env, stdout=subprocess.PIPE, check=True,
+        ).stdout)
+
+        read_fd, write_fd = os.pipe()
+        with open(os.devnull) as devnull:
+            sock = connect(get_socket_path())
+            send_request(
+                sock, {"module": "warm_server", "argv": ["env-settings"], "cwd": os.getcwd(), "env": env},
+                [devnull.fileno(), write_fd, 2],
+            )
+        os.close(write_fd)
+        with open(read_fd) as output:
+            served = json.loads(output.read() or "null")
+        sock.close()
+
+    if served != expected:
+        print(f"Error: per-call environment not applied, warm: {served}, cold: {expected}", file=sys.stderr)
+        sys.exit(1)
+    print("Per-call environment overrides reach warm scripts.")
+
+
+def start():
+    reply = send_command("status")
+    if reply is not None:
+        print(f"Warm server already running (pid {reply['pid']}).")
+        return
+
+    os.makedirs(os.path.dirname(LOG_FILE), exist_ok=True)
+    with open(LOG_FILE, "a") as log:
+        args = [sys.executable, "-m", "tommyx.warm_server", "serve"]
+        if IDLE_TIMEOUT is not None:
+            args += ["--idle-timeout", str(IDLE_TIMEOUT)]
+        subprocess.Popen(
+            args, cwd=os.path.dirname(PACKAGE_DIR), stdin=subprocess.DEVNULL, stdout=log, stderr=log,
+            start_new_session=True,
+        )
+
+    # wait for the socket so the next invocation already uses it
+    for _ in range(100):
+        reply = send_command("status")
+        if reply is not None:
+            print(f"Warm server started (pid {reply['pid']}), log: {LOG_FILE}")
+            return
+        time.sleep(0.1)
+
+    print(f"Error: warm server did not come up, see {LOG_FILE}", file=sys.stderr)
+    sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Warm interpreter server for -run-tommyx-python-script")
+    parser.add_argument("command", choices=["start", "stop", "status", "check", "serve", "env-settings"],
+                        help="serve runs in the foreground, check verifies that per-call env overrides apply")
+    parser.add_argument("--idle-timeout", type=float, default=None, help="exit after this many idle seconds")
+    parser.add_argument("--listen-fd", type=int, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    # set global flags
+    IDLE_TIMEOUT = args.idle_timeout
+
+    if args.command == "serve":
+        serve(args.listen_fd)
+    elif args.command == "start":
+        start()
+    elif args.command == "check":
+        check()
+    elif args.command == "env-settings":
+        print(json.dumps(get_env_settings()))
+    elif args.command == "stop":
+        reply = send_command("stop")
+        print(f"Warm server {reply['stopped']} stopped." if reply else "Warm server is not running.")
+    else:
+        reply = send_command("status")
+        print(f"Warm server running (pid {reply['pid']}, {reply['modules']} modules loaded)." if reply else "Warm server is not running.")